@@ -9,11 +9,108 @@ if DOTENV.exists():
 
 class Settings:
     EVERYTHING_URL: str = os.environ.get("EVERYTHING_URL", "http://localhost:8989/")
+    # filename search backend: "everything" (Everything.exe HTTP API) or "local" (in-process filename index)
+    FILENAME_BACKEND: str = os.environ.get("FILENAME_BACKEND", "everything").lower()
+    # Everything HTTP client: keep-alive pool, bounded retries, circuit breaker, short response cache
+    EVERYTHING_POOL_SIZE: int = int(os.environ.get("EVERYTHING_POOL_SIZE", "8"))
+    EVERYTHING_CONNECT_TIMEOUT: float = float(os.environ.get("EVERYTHING_CONNECT_TIMEOUT", "2"))
+    EVERYTHING_READ_TIMEOUT: float = float(os.environ.get("EVERYTHING_READ_TIMEOUT", "10"))
+    EVERYTHING_RETRIES: int = int(os.environ.get("EVERYTHING_RETRIES", "2"))
+    EVERYTHING_BACKOFF_SECONDS: float = float(os.environ.get("EVERYTHING_BACKOFF_SECONDS", "0.2"))
+    EVERYTHING_BREAKER_FAILURES: int = int(os.environ.get("EVERYTHING_BREAKER_FAILURES", "5"))
+    EVERYTHING_BREAKER_RESET_SECONDS: float = float(os.environ.get("EVERYTHING_BREAKER_RESET_SECONDS", "30"))
+    EVERYTHING_CACHE_SECONDS: float = float(os.environ.get("EVERYTHING_CACHE_SECONDS", "5"))
+    # overall time budget of one /api/search request
+    SEARCH_DEADLINE_SECONDS: float = float(os.environ.get("SEARCH_DEADLINE_SECONDS", "15"))
+    # threads for the blocking parts of async searches (Whoosh scoring, local filename index)
+    SEARCH_THREADS: int = int(os.environ.get("SEARCH_THREADS", "8"))
+    # after startup, load the spellchecker, parser libraries etc. on a background thread
+    STARTUP_WARM: bool = os.environ.get("STARTUP_WARM", "true").lower() == "true"
+    # hybrid search: per-backend deadlines (a late backend leaves partial results) and the RRF constant
+    HYBRID_FILENAME_SECONDS: float = float(os.environ.get("HYBRID_FILENAME_SECONDS", "3"))
+    HYBRID_CONTENT_SECONDS: float = float(os.environ.get("HYBRID_CONTENT_SECONDS", "5"))
+    HYBRID_RRF_K: int = int(os.environ.get("HYBRID_RRF_K", "60"))
     WHOOSH_INDEX_PATH: str = os.environ.get("WHOOSH_INDEX_PATH", str(ROOT / "storage" / "whoosh_index"))
+    # optional sharded layout: "" (one index), "folder" (a shard per indexed folder) or "hash"
+    INDEX_SHARDING: str = os.environ.get("INDEX_SHARDING", "").lower()
+    INDEX_SHARDS: int = int(os.environ.get("INDEX_SHARDS", "4"))  # shard count of the "hash" layout
+    # document text kept in the index: "full" (stored, highlighted by re-analysis), "excerpt"
+    # (compressed leading INDEX_EXCERPT_CHARS only) or "none"; the latter two snippet from token offsets.
+    # "none" cuts snippets out of the extraction cache: with EXTRACT_CACHE_MAX_MB=0 they are empty
+    INDEX_CONTENT_STORE: str = os.environ.get("INDEX_CONTENT_STORE", "full").lower()
+    INDEX_EXCERPT_CHARS: int = int(os.environ.get("INDEX_EXCERPT_CHARS", "2000"))
+    # index a document per page/slide/sheet (or PASSAGE_CHARS window) and group hits by file
+    INDEX_PASSAGES: bool = os.environ.get("INDEX_PASSAGES", "false").lower() == "true"
+    PASSAGE_CHARS: int = int(os.environ.get("PASSAGE_CHARS", "4000"))
+    SHARD_SEARCH_THREADS: int = int(os.environ.get("SHARD_SEARCH_THREADS", "8"))
     ALLOWED_EXTS = [".pdf", ".docx", ".txt", ".csv", ".xlsx", ".xls", ".pptx", ".ppt"]
     ENABLE_WATCHER: bool = os.environ.get("ENABLE_WATCHER", "false").lower() == "true"
+    # watcher events are debounced per path and applied in batches by one writer thread
+    WATCHER_DEBOUNCE_SECONDS: float = float(os.environ.get("WATCHER_DEBOUNCE_SECONDS", "2"))
+    WATCHER_MAX_DELAY_SECONDS: float = float(os.environ.get("WATCHER_MAX_DELAY_SECONDS", "30"))
+    WATCHER_MAX_BATCH: int = int(os.environ.get("WATCHER_MAX_BATCH", "500"))
     ENABLE_ABBREVIATION_AI: bool = os.environ.get("ENABLE_ABBREVIATION_AI", "false").lower() == "true"
     GEMINI_API_KEY: str = os.environ.get("GEMINI_API_KEY", "")
+    GEMINI_MODEL: str = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+    # expansion looks in the CSV dictionary (default storage/abbreviations.csv) and the expansion
+    # cache first; the remote backend ("gemini" or "none") is only waited on for ABBREVIATION_TIMEOUT_MS
+    ABBREVIATION_DICT: str = os.environ.get("ABBREVIATION_DICT", "")
+    ABBREVIATION_REMOTE: str = os.environ.get("ABBREVIATION_REMOTE", "gemini").lower()
+    ABBREVIATION_TIMEOUT_MS: int = int(os.environ.get("ABBREVIATION_TIMEOUT_MS", "400"))
+    ABBREVIATION_CACHE_SIZE: int = int(os.environ.get("ABBREVIATION_CACHE_SIZE", "2048"))
+    ABBREVIATION_CACHE_DAYS: float = float(os.environ.get("ABBREVIATION_CACHE_DAYS", "30"))
+    # only single words up to this long are sent to the remote backend: abbreviations are short, and
+    # every other search word would otherwise cost a remote call (0 = no limit)
+    ABBREVIATION_MAX_CHARS: int = int(os.environ.get("ABBREVIATION_MAX_CHARS", "12"))
+
+    # bulk indexing: one long-lived writer, committed every N docs or N bytes
+    INDEX_BATCH_DOCS: int = int(os.environ.get("INDEX_BATCH_DOCS", "500"))
+    INDEX_BATCH_BYTES: int = int(os.environ.get("INDEX_BATCH_BYTES", str(64 * 1024 * 1024)))
+    INDEX_WRITER_LIMIT_MB: int = int(os.environ.get("INDEX_WRITER_LIMIT_MB", "256"))
+    INDEX_OPTIMIZE_ON_FINISH: bool = os.environ.get("INDEX_OPTIMIZE_ON_FINISH", "false").lower() == "true"
+    # /api/add-folder queues background jobs; this many folders are indexed at once
+    INDEX_JOB_CONCURRENCY: int = int(os.environ.get("INDEX_JOB_CONCURRENCY", "1"))
+    INDEX_JOB_HISTORY: int = int(os.environ.get("INDEX_JOB_HISTORY", "200"))  # finished jobs kept
+
+    # how often searchers look for commits made by other processes
+    SEARCHER_REFRESH_SECONDS: float = float(os.environ.get("SEARCHER_REFRESH_SECONDS", "1.0"))
+    # several API processes (uvicorn --workers N) on one index: the process holding a lock file next
+    # to the index writes (jobs, watcher, rebuilds); the others search read-only and take over when it exits
+    INDEX_WRITER_ELECTION: bool = os.environ.get("INDEX_WRITER_ELECTION", "true").lower() == "true"
+    # how long a read-only process waits at startup for the writer to create the index
+    WRITER_WAIT_SECONDS: float = float(os.environ.get("WRITER_WAIT_SECONDS", "60"))
+
+    # parallel text extraction (0 workers = extract in-process)
+    EXTRACT_WORKERS: int = int(os.environ.get("EXTRACT_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+    EXTRACT_WORKERS_BY_EXT: str = os.environ.get("EXTRACT_WORKERS_BY_EXT", "")  # e.g. ".pdf:2,.xlsx:1"
+    EXTRACT_MAX_INFLIGHT: int = int(os.environ.get("EXTRACT_MAX_INFLIGHT", "0"))  # 0 = 4 x workers
+    # per-file limits; a file that breaks them is quarantined until its mtime changes
+    EXTRACT_TIMEOUT_SECONDS: float = float(os.environ.get("EXTRACT_TIMEOUT_SECONDS", "120"))
+    EXTRACT_MAX_MEMORY_MB: int = int(os.environ.get("EXTRACT_MAX_MEMORY_MB", "2048"))  # 0 = unlimited
+    EXTRACT_MAX_FILE_MB: int = int(os.environ.get("EXTRACT_MAX_FILE_MB", "512"))  # 0 = unlimited
+    # extracted text of identical files is parsed once and kept compressed, keyed by content hash (0 = disabled)
+    EXTRACT_CACHE_MAX_MB: int = int(os.environ.get("EXTRACT_CACHE_MAX_MB", "1024"))
+    # folder scanning
+    SCAN_EXCLUDE: str = os.environ.get(
+        "SCAN_EXCLUDE",
+        ".git,.svn,node_modules,__pycache__,$RECYCLE.BIN,System Volume Information,~$*,.~lock.*,*.tmp,*.temp",
+    )
+    # skip re-listing directories whose mtime is unchanged (in-place edits there are left to the watcher)
+    SCAN_PRUNE_UNCHANGED_DIRS: bool = os.environ.get("SCAN_PRUNE_UNCHANGED_DIRS", "false").lower() == "true"
+    # extracted text beyond this many characters is dropped (0 = unlimited)
+    MAX_DOCUMENT_CHARS: int = int(os.environ.get("MAX_DOCUMENT_CHARS", "5000000"))
+
+    # "did you mean": SymSpell dictionary of content terms, rebuilt once per index generation
+    ENABLE_DID_YOU_MEAN: bool = os.environ.get("ENABLE_DID_YOU_MEAN", "true").lower() == "true"
+    SUGGEST_MAX_EDIT_DISTANCE: int = int(os.environ.get("SUGGEST_MAX_EDIT_DISTANCE", "2"))
+    SUGGEST_PREFIX_LENGTH: int = int(os.environ.get("SUGGEST_PREFIX_LENGTH", "7"))
+    SUGGEST_MAX_TERMS: int = int(os.environ.get("SUGGEST_MAX_TERMS", "200000"))  # most frequent terms kept (0 = all)
+
+    # search response cache (0 MB = disabled); content entries also expire on every index commit
+    QUERY_CACHE_MAX_MB: int = int(os.environ.get("QUERY_CACHE_MAX_MB", "64"))
+    QUERY_CACHE_TTL_SECONDS: float = float(os.environ.get("QUERY_CACHE_TTL_SECONDS", "300"))
+    # Everything has no change counter, so filename results are reused for at most this long
+    FILENAME_CACHE_SECONDS: float = float(os.environ.get("FILENAME_CACHE_SECONDS", "30"))
 
     LOG_FILE = str(ROOT / "logs" / "app.log")
 
@@ -1,14 +1,41 @@
+import time
+_imports_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from config.settings import settings
 from routes.indexing_routes import router as indexing_router
 from routes.search_routes import router as search_router
 from routes.content_routes import router as content_router
 from utils.logger import get_logger
 from utils.exceptions import register_exception_handlers
+from utils.index_manager import get_indexer
+from utils.job_scheduler import get_job_scheduler
+from utils.everything_api import close_async_everything_client
+from utils.startup import get_startup_report, warm_steps
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    report = get_startup_report()
+    with report.phase("open_index"):
+        get_indexer()
+    with report.phase("job_scheduler"):
+        # started here rather than at import, so spawned extraction workers never run jobs
+        get_job_scheduler()
+    report.ready()
+    if settings.STARTUP_WARM:
+        report.warm_in_background(warm_steps())
+    yield
+    await close_async_everything_client()
 
-app = FastAPI(title="Everything + Whoosh Search API")
+
+app = FastAPI(title="Everything + Whoosh Search API", lifespan=lifespan)
 logger = get_logger()
 register_exception_handlers(app, logger)
+# large show-content/search payloads are mostly text and compress well
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 app.include_router(indexing_router, prefix="/api")
 app.include_router(search_router, prefix="/api")
@@ -18,4 +45,6 @@ from utils.response_helper import success_response
 
 @app.get("/")
 def root():
-    return success_response(200, "API running", {"endpoints": ["/api/add-folder","/api/list-folders","/api/search","/api/show-content"]})
+    return success_response(200, "API running", {"endpoints": ["/api/add-folder","/api/list-folders","/api/jobs","/api/rebuild","/api/search","/api/show-content"]})
+
+get_startup_report().imported(_imports_started)
@@ -1,4 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Optional
 
 class FileContentRequest(BaseModel):
     file_path: str
+    page: Optional[int] = Field(None, ge=1)      # 1-based page/slide/sheet of paged file types
+    offset: int = Field(0, ge=0)                  # first character returned (within the page, if given)
+    length: Optional[int] = Field(None, ge=0)     # characters returned; None = to the end
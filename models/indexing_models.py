@@ -3,3 +3,7 @@ from typing import List
 
 class FolderInput(BaseModel):
     folders: List[str]
+    wait: bool = False  # index inside the request instead of queueing background jobs
+
+class RebuildInput(BaseModel):
+    source: str = "disk"  # "disk": extract every file again, "index": copy the live index's stored documents
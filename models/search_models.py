@@ -3,7 +3,7 @@ from typing import List, Optional
 
 class SearchInput(BaseModel):
     keyword: str = Field(..., example="invoice")
-    search_mode: str = Field(..., example="filename")  # filename or content
+    search_mode: str = Field(..., example="filename")  # filename, content or hybrid (both, fused)
     file_types: Optional[List[str]] = Field(default_factory=lambda: ["all"])
     date_from: Optional[str] = None  # YYYY-MM-DD or None
     date_to: Optional[str] = None
@@ -12,3 +12,5 @@ class SearchInput(BaseModel):
     case_sensitive: bool = False
     whole_word: bool = False
     max_results: int = 100
+    sort: Optional[str] = None  # name, path, size or date_modified; "-" prefix = descending
+    cursor: Optional[str] = None  # next_cursor of the previous page
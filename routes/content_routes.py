@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from models.content_models import FileContentRequest
 from utils.whoosh_extractors import EXTRACTORS
+from utils.content_reader import get_content_reader, window, etag_for
 from pathlib import Path
 from utils.logger import get_logger
 from utils.response_helper import success_response
@@ -9,20 +10,41 @@ router = APIRouter()
 logger = get_logger()
 
 @router.post("/show-content")
-def show_content(payload: FileContentRequest):
+def show_content(payload: FileContentRequest, request: Request, response: Response):
     p = Path(payload.file_path)
-    if not p.exists():
+    if not p.is_file():
         raise HTTPException(status_code=404, detail="File not found")
-    extractor = EXTRACTORS.get(p.suffix.lower())
-    if not extractor:
+    suffix = p.suffix.lower()
+    if not EXTRACTORS.get(suffix):
         raise HTTPException(status_code=400, detail="Unsupported file type")
-    text = extractor(p)
+    p = p.resolve()
+    st = p.stat()
+
+    # the text only changes with the file, so mtime + size + window identify the response
+    etag = etag_for(st, payload.page, payload.offset, payload.length)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in (t.strip() for t in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+
+    text, source = get_content_reader().text(p, st)
     if text is None:
         raise HTTPException(status_code=404, detail="Could not extract content")
+    try:
+        part = window(text, suffix, payload.page, payload.offset, payload.length)
+    except IndexError as e:
+        raise HTTPException(status_code=416, detail=str(e))
+
+    response.headers.update(headers)
+    return success_response(200, "File content extracted", {
+        "path": str(p), "filename": p.name, "filetype": suffix.lstrip('.'),
+        "size_kb": int(st.st_size / 1024), "modified": datetime_from_mtime(st.st_mtime),
+        "source": source, **part,
+    })
 
-    size_kb = int(p.stat().st_size / 1024) if p.exists() else None
-    modified = datetime_from_mtime(p.stat().st_mtime)
-    return success_response(200, "File content extracted", {"path": str(p.resolve()), "filename": p.name, "filetype": p.suffix.lower().lstrip('.'), "size_kb": size_kb, "modified": modified, "content_text": text})
+@router.get("/show-content")
+def show_content_get(request: Request, response: Response, payload: FileContentRequest = Depends()):
+    """Same as the POST form, for clients that cache by URL."""
+    return show_content(payload, request, response)
 
 # helper local to route file
 def datetime_from_mtime(mtime):
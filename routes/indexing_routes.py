@@ -1,17 +1,18 @@
 from fastapi import APIRouter, HTTPException
-from models.indexing_models import FolderInput
+from models.indexing_models import FolderInput, RebuildInput
 from utils.storage_helper import append_folders, read_indexed_folders
 from config.settings import settings
 from utils.logger import get_logger
-from utils.whoosh_indexer import WhooshIndexer
+from utils.index_manager import get_indexer, is_writer, writer_role
+from utils.job_scheduler import get_job_scheduler
+from utils.index_rebuild import get_rebuilder
+from utils.extraction_cache import get_extraction_cache
+from utils.startup import get_startup_report
 from utils.response_helper import success_response, failure_response
 
 router = APIRouter()
 logger = get_logger()
 
-# create a module-level indexer (safe to reuse)
-whoosh_indexer = WhooshIndexer(index_dir=settings.WHOOSH_INDEX_PATH)
-
 @router.get("/list-folders")
 def list_folders():
     folders = read_indexed_folders()
@@ -20,20 +21,37 @@ def list_folders():
 
 @router.post("/add-folder")
 def add_folder(payload: FolderInput):
+    """
+    Queue an indexing job per folder (202), or index them inside the
+    request with `wait`. A job's docs/s and MB/s are in its progress
+    while it runs and in its result once it completes (/api/jobs/{job_id}).
+    """
     if not payload.folders:
         raise HTTPException(status_code=400, detail="folders is required")
 
     updated = append_folders(payload.folders)
 
+    # only the writer process indexes; elsewhere `wait` still queues the jobs for it
+    if not payload.wait or not is_writer():
+        scheduler = get_job_scheduler()
+        jobs = [scheduler.submit(f) for f in payload.folders]
+        return success_response(202, "Folders added, indexing jobs queued", {
+            "jobs": [job.to_dict() for job in jobs],
+            "watcher_enabled": settings.ENABLE_WATCHER
+        })
+
     indexed = {}
+    throughput = {}
     total = 0
 
     for f in payload.folders:
         try:
-            count = whoosh_indexer.index_folder(f)
+            stats = get_indexer().index_folder(f)
+            count = stats["indexed"]
             indexed[f] = count
+            throughput[f] = stats
             total += count
-            logger.info(f"Indexed {count} files in {f}")
+            logger.info(f"Indexed {count} files in {f} ({stats['docs_per_sec']} docs/s, {stats['mb_per_sec']} MB/s)")
         except Exception as e:
             logger.error(f"Error indexing {f}: {e}")
             indexed[f] = 0
@@ -41,5 +59,92 @@ def add_folder(payload: FolderInput):
     return success_response(200, "Folders added and indexed successfully", {
         "indexed_counts": indexed,
         "total_indexed": total,
+        "throughput": throughput,
         "watcher_enabled": settings.ENABLE_WATCHER
     })
+
+
+@router.get("/index-metrics")
+def index_metrics():
+    service = get_indexer().writer_service
+    cache = get_extraction_cache()
+    return success_response(200, "Index writer metrics", {
+        "watcher_enabled": settings.ENABLE_WATCHER,
+        "writer": service.metrics() if service else None,
+        "extract_cache": cache.stats() if cache else None,
+        "startup": get_startup_report().to_dict(),
+        "role": writer_role(),
+    })
+
+
+# ---------------------------
+# Background indexing jobs
+# ---------------------------
+@router.get("/jobs")
+def list_jobs():
+    scheduler = get_job_scheduler()
+    return success_response(200, "Indexing jobs retrieved", {
+        "jobs": [job.to_dict() for job in reversed(scheduler.list())],
+        "scheduler": scheduler.stats(),
+    })
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = get_job_scheduler().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return success_response(200, "Indexing job retrieved", job.to_dict())
+
+
+def _control_job(job_id: str, action: str, message: str):
+    try:
+        job = getattr(get_job_scheduler(), action)(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return success_response(200, message, job.to_dict())
+
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    return _control_job(job_id, "cancel", "Cancellation requested")
+
+
+@router.post("/jobs/{job_id}/pause")
+def pause_job(job_id: str):
+    return _control_job(job_id, "pause", "Pause requested")
+
+
+@router.post("/jobs/{job_id}/resume")
+def resume_job(job_id: str):
+    return _control_job(job_id, "resume", "Job resumed")
+
+
+# ---------------------------
+# Full rebuild (shadow index + swap)
+# ---------------------------
+@router.post("/rebuild")
+def start_rebuild(payload: RebuildInput):
+    try:
+        rebuild = get_rebuilder().start(payload.source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return success_response(202, "Rebuild started", rebuild.to_dict())
+
+
+@router.get("/rebuild")
+def rebuild_status():
+    return success_response(200, "Rebuild status", get_rebuilder().stats())
+
+
+@router.post("/rebuild/cancel")
+def cancel_rebuild():
+    try:
+        rebuild = get_rebuilder().cancel()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return success_response(200, "Cancellation requested", rebuild.to_dict())
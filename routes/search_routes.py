@@ -1,51 +1,60 @@
+import time
 from fastapi import APIRouter, HTTPException
 from models.search_models import SearchInput
-from utils.query_builder import build_everything_query
-from utils.search_engine import SearchEngine
+from utils.search_engine import get_search_engine
+from utils.abbreviation_ai import get_expander
 from config.settings import settings
 from utils.logger import get_logger
-from utils.whoosh_indexer import WhooshIndexer
+from utils.sharded_indexer import ShardedIndexer
 from utils.storage_helper import read_indexed_folders
 from utils.response_helper import success_response, failure_response
 
 router = APIRouter()
 logger = get_logger()
 
-# create whoosh instance and search engine
-whoosh_indexer = WhooshIndexer(index_dir=settings.WHOOSH_INDEX_PATH)
-search_engine = SearchEngine(whoosh_indexer=whoosh_indexer)
 
 @router.post("/search")
-def search(payload: SearchInput):
+async def search(payload: SearchInput):
     if not payload.keyword:
         raise HTTPException(status_code=400, detail="keyword is required")
+    deadline = time.monotonic() + settings.SEARCH_DEADLINE_SECONDS
 
     # always use stored folders (do not accept folders in payload)
     folders = read_indexed_folders()
     if not folders:
         return failure_response(400, "No folders indexed. Use /api/add-folder first.", {"indexed_folders": []})
 
+    search_engine = get_search_engine()
     if payload.search_mode == "filename":
-        query = build_everything_query(payload, folders)
-        try:
-            data = search_engine.search_filename(query, payload)
-            return success_response(200, "Filename search completed", data)
-        except HTTPException as http_err:
-            raise http_err
-        except Exception as e:
-            logger.error(str(e))
-            raise HTTPException(status_code=500, detail=str(e))
-
+        run, message = search_engine.search_filename_async(payload, deadline=deadline), "Filename search completed"
     elif payload.search_mode == "content":
-        try:
-            data = search_engine.search_content(payload)
-            return success_response(200, "Content search completed", data)
-        except HTTPException as http_err:
-            raise http_err
-        except Exception as e:
-            logger.error(str(e))
-            raise HTTPException(status_code=500, detail=str(e))
-
-
+        run, message = search_engine.search_content_async(payload, deadline=deadline), "Content search completed"
+    elif payload.search_mode == "hybrid":
+        run, message = search_engine.search_hybrid(payload, deadline=deadline), "Hybrid search completed"
     else:
-        raise HTTPException(status_code=400, detail="Invalid search_mode. Allowed: filename, content")
+        raise HTTPException(status_code=400, detail="Invalid search_mode. Allowed: filename, content, hybrid")
+
+    try:
+        data = await run
+        return success_response(200, message, data)
+    except HTTPException as http_err:
+        raise http_err
+    except Exception as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/search-metrics")
+def search_metrics():
+    search_engine = get_search_engine()
+    whoosh_indexer = search_engine.whoosh
+    data = {
+        "cache": search_engine.cache_stats(),
+        "searchers": whoosh_indexer.searchers.stats(),
+        "filename_backend": search_engine.filename_backend_stats(),
+    }
+    if settings.ENABLE_ABBREVIATION_AI:
+        data["abbreviations"] = get_expander().stats()
+    if isinstance(whoosh_indexer, ShardedIndexer):
+        data["shards"] = whoosh_indexer.shard_stats()
+    return success_response(200, "Search metrics", data)
@@ -0,0 +1,122 @@
+"""
+The abbreviation layer offline: CSV dictionary, expansion cache and a
+StubBackend standing in for the remote model.
+"""
+import time
+
+import pytest
+
+import utils.search_engine as search_engine
+from models.search_models import SearchInput
+from utils.abbreviation_ai import (
+    AbbreviationExpander, DictionaryBackend, ExpansionCache, StubBackend,
+)
+
+
+def wait_until(condition, timeout=2.0):
+    limit = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < limit, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def dictionary(tmp_path):
+    path = tmp_path / "abbreviations.csv"
+    path.write_text("# abbreviation,expansion...\n"
+                    "HGB,Hemoglobin,Haemoglobin\n"
+                    "hgb,HB\n"
+                    "ECG,Electrocardiogram\n", encoding="utf-8")
+    return path
+
+
+def test_dictionary_lookups(dictionary):
+    backend = DictionaryBackend(dictionary)
+    assert backend.expand("hgb") == ["Hemoglobin", "Haemoglobin", "HB"]
+    assert backend.expand(" ECG ") == ["Electrocardiogram"]
+    assert backend.expand("xyz") is None
+    assert len(backend) == 2
+
+    expander = AbbreviationExpander(local=[backend])
+    assert expander.expand("HGB, invoice") == "HGB, invoice, Hemoglobin, Haemoglobin, HB"
+
+
+def test_dictionary_is_reread_when_it_changes(dictionary):
+    backend = DictionaryBackend(dictionary)
+    assert backend.expand("mri") is None
+    dictionary.write_text("MRI,Magnetic resonance imaging\n", encoding="utf-8")
+    assert backend.expand("mri") == ["Magnetic resonance imaging"]
+    assert backend.expand("hgb") is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ExpansionCache(None, max_entries=2, ttl=60)
+    cache.put("a", ["1"])
+    cache.put("b", ["2"])
+    assert cache.get("a") == ["1"]
+    cache.put("c", ["3"])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["1"] and cache.get("c") == ["3"]
+    assert cache.stats() == {"memory_entries": 2, "hits": 3, "misses": 1}
+
+
+def test_cache_survives_a_restart_on_disk(tmp_path):
+    db = tmp_path / "abbreviations.db"
+    cache = ExpansionCache(db, max_entries=8, ttl=60)
+    cache.put("HGB", ["Hemoglobin"])
+    cache.put("ECG", [], ttl=-1)   # already expired
+    cache.close()
+
+    reopened = ExpansionCache(db, max_entries=8, ttl=60)
+    assert reopened.get("hgb") == ["Hemoglobin"]
+    assert reopened.get("ecg") is None
+    reopened.close()
+
+
+def test_remote_answer_after_the_deadline_warms_the_cache():
+    remote = StubBackend({"HGB": ["Hemoglobin"]}, delay=0.3)
+    expander = AbbreviationExpander(remote=remote, timeout=0.05)
+    started = time.monotonic()
+    assert expander.expand("HGB") == "HGB"
+    assert time.monotonic() - started < 0.2
+    assert expander.late == 1
+
+    wait_until(lambda: expander.stats()["inflight"] == 0)
+    assert expander.expand("HGB") == "HGB, Hemoglobin"
+    assert remote.calls == 1
+    expander.close()
+
+
+def test_search_deadline_bounds_the_remote_wait():
+    expander = AbbreviationExpander(remote=StubBackend({"HGB": ["Hemoglobin"]}, delay=0.3), timeout=5)
+    started = time.monotonic()
+    assert expander.expand("HGB", deadline=time.monotonic() + 0.05) == "HGB"
+    assert time.monotonic() - started < 0.2
+    expander.close()
+
+
+def test_only_short_single_words_go_to_the_remote_backend():
+    remote = StubBackend({"HGB": ["Hemoglobin"]})
+    expander = AbbreviationExpander(remote=remote, max_chars=5)
+    assert expander.expand("HGB, invoices, blood count") == "HGB, invoices, blood count, Hemoglobin"
+    assert remote.calls == 1
+
+    unlimited = AbbreviationExpander(remote=remote, max_chars=0)
+    unlimited.expand("invoices")
+    assert remote.calls == 2
+    expander.close()
+    unlimited.close()
+
+
+def test_results_are_cached_under_the_expanded_keyword(monkeypatch):
+    answers = iter(["HGB", "HGB, Hemoglobin"])   # the remote answer misses the first search only
+    monkeypatch.setattr(search_engine.settings, "ENABLE_ABBREVIATION_AI", True)
+    monkeypatch.setattr(search_engine, "expand_abbreviations", lambda keyword, deadline=None: next(answers))
+    engine = search_engine.SearchEngine(whoosh_indexer=None)
+    payload = SearchInput(keyword="HGB", search_mode="content")
+
+    first = engine._expanded(payload)
+    second = engine._expanded(payload)
+    assert payload.keyword == "HGB"
+    assert engine._cache_key(first) != engine._cache_key(second)
+    assert second.keyword == "HGB, Hemoglobin"
@@ -0,0 +1,66 @@
+"""
+show-content text: windows of a document, and when the stored index
+text may stand in for extracting the file again.
+"""
+import os
+
+import pytest
+
+import utils.content_reader as content_reader_module
+from utils.content_reader import EXTRACTED, INDEX, ContentReader, window
+from utils.state_store import INDEXED, StateStore
+from utils.whoosh_extractors import PAGE_BREAK
+from utils.whoosh_indexer import WhooshIndexer
+
+
+def test_window_pages_and_offsets():
+    text = PAGE_BREAK.join(["first page", "\nsecond page\n", "third"])
+    part = window(text, ".pdf", 2, 7, 3)
+    assert part["content_text"] == "pag" and part["pages"] == 3 and part["has_more"]
+    assert window(text, ".pdf", 2, 7, None)["has_more"] is False
+    assert window("", ".txt", None, 0, None)["content_text"] == ""
+
+    with pytest.raises(IndexError, match="page 4"):
+        window(text, ".pdf", 4, 0, None)
+    with pytest.raises(IndexError, match="offset 11"):
+        window(text, ".pdf", 2, 11, 5)   # past the end of the page, not an empty 200
+    with pytest.raises(IndexError, match="offset 9"):
+        window("some text", ".txt", None, 9, None)
+
+
+@pytest.fixture
+def reader(tmp_path, monkeypatch):
+    monkeypatch.setattr(content_reader_module, "get_extraction_cache", lambda: None)
+    store = StateStore(tmp_path / "state.db")
+    indexer = WhooshIndexer(str(tmp_path / "index"))
+    yield ContentReader(indexer, store=store), indexer, store
+    indexer.close()
+    store.close()
+
+
+def index(indexer, store, path, text):
+    indexer.add_or_update(path, text)
+    st = path.stat()
+    store.upsert_many([(str(path), st.st_mtime_ns, st.st_size, None, INDEXED, None)])
+
+
+def test_index_text_is_used_for_the_indexed_version_only(reader, tmp_path):
+    content_reader, indexer, store = reader
+    path = tmp_path / "notes.txt"
+    path.write_text("version one", encoding="utf-8")
+    index(indexer, store, path, "version one")
+    assert content_reader._from_index(path, path.stat()) == "version one"
+
+    # same size, same second: only mtime_ns tells the versions apart
+    st = path.stat()
+    path.write_text("version two", encoding="utf-8")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert content_reader._from_index(path, path.stat()) is None
+    text, source = content_reader.text(path, path.stat())
+    assert (text, source) == ("version two", EXTRACTED)
+
+    index(indexer, store, path, "version two")
+    other = tmp_path / "other.txt"
+    other.write_text("never indexed", encoding="utf-8")
+    assert content_reader._from_index(other, other.stat()) is None
+    assert ContentReader(indexer, store=store).text(path, path.stat()) == ("version two", INDEX)
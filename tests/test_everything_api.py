@@ -0,0 +1,212 @@
+"""
+EverythingClient / AsyncEverythingClient against a local stub of
+Everything's HTTP interface (http.server on a free port).
+"""
+import json
+import time
+import socket
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from utils.everything_api import (
+    AsyncEverythingClient, CircuitBreaker, EverythingClient, EverythingUnavailable,
+)
+
+RESULT = {"totalResults": 1, "results": [{"name": "a.txt", "path": "/x", "size": "10"}]}
+
+
+class StubEverything:
+    """Answers every GET with RESULT; `mode` switches to "slow" or "error" answers."""
+
+    def __init__(self):
+        self.mode = "ok"
+        self.hits = 0
+        self.client_ports = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.hits += 1
+                stub.client_ports.add(self.client_address[1])
+                if stub.mode == "slow":
+                    time.sleep(2)
+                if stub.mode == "error":
+                    self.send_response(500)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = json.dumps(RESULT).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        # clients that gave up on a slow answer close the socket before it is written
+        self.server.handle_error = lambda request, client_address: None
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubEverything()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def silent_url():
+    """A server that accepts connections and never answers."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(16)
+    accepted = []
+
+    def accept():
+        while True:
+            try:
+                accepted.append(sock.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}/"
+    sock.close()
+    for conn in accepted:
+        conn.close()
+
+
+def client(url, **kwargs):
+    kwargs.setdefault("cache_ttl", 0)
+    kwargs.setdefault("backoff", 0.01)
+    return EverythingClient(url, **kwargs)
+
+
+def test_connections_are_reused(stub):
+    c = client(stub.url)
+    for i in range(5):
+        assert c.search(f"q{i}") == RESULT
+    assert stub.hits == 5
+    assert len(stub.client_ports) == 1
+    c.close()
+
+
+def test_deadline_bounds_the_request(stub):
+    stub.mode = "slow"
+    c = client(stub.url, retries=2)
+    started = time.monotonic()
+    with pytest.raises(EverythingUnavailable):
+        c.search("q", deadline=time.monotonic() + 0.3)
+    assert time.monotonic() - started < 1.0
+
+
+def test_breaker_opens_after_consecutive_failures(stub):
+    stub.mode = "error"
+    c = client(stub.url, retries=0, breaker=CircuitBreaker(3, 30.0))
+    for _ in range(3):
+        with pytest.raises(EverythingUnavailable):
+            c.search("q")
+    assert c.breaker.state == CircuitBreaker.OPEN
+    hits = stub.hits
+    with pytest.raises(EverythingUnavailable, match="unavailable"):
+        c.search("q")
+    assert stub.hits == hits
+    assert c.breaker.rejected == 1
+
+
+def test_half_open_trial_closes_the_breaker(stub):
+    stub.mode = "error"
+    c = client(stub.url, retries=0, breaker=CircuitBreaker(1, 0.2))
+    with pytest.raises(EverythingUnavailable):
+        c.search("q")
+    assert c.breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.25)
+    assert c.breaker.state == CircuitBreaker.HALF_OPEN
+    stub.mode = "ok"
+    assert c.search("q") == RESULT
+    assert c.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_half_open_trial_opens_the_breaker_again(stub):
+    stub.mode = "error"
+    c = client(stub.url, retries=0, breaker=CircuitBreaker(1, 0.2))
+    with pytest.raises(EverythingUnavailable):
+        c.search("q")
+    time.sleep(0.25)
+    with pytest.raises(EverythingUnavailable):
+        c.search("q")
+    assert c.breaker.state == CircuitBreaker.OPEN
+
+
+def test_cancelled_half_open_trial_does_not_wedge_the_breaker(silent_url):
+    breaker = CircuitBreaker(1, 0.2)
+    breaker.record_failure()
+    time.sleep(0.25)
+
+    async def run():
+        async_client = AsyncEverythingClient(client(silent_url, breaker=breaker))
+        try:
+            # what a hybrid search's per-backend deadline does to a late Everything call
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(async_client.search("q"), 0.2)
+        finally:
+            await async_client.aclose()
+
+    asyncio.run(run())
+    # a cancelled request says nothing about Everything: the next one is the trial
+    assert breaker.allow() == CircuitBreaker.HALF_OPEN
+
+
+def test_cancelled_requests_do_not_open_the_breaker(stub):
+    stub.mode = "slow"
+    breaker = CircuitBreaker(2, 30.0)
+
+    async def run():
+        async_client = AsyncEverythingClient(client(stub.url, breaker=breaker))
+        try:
+            for _ in range(3):
+                with pytest.raises(asyncio.TimeoutError):
+                    await asyncio.wait_for(async_client.search("q"), 0.1)
+        finally:
+            await async_client.aclose()
+
+    asyncio.run(run())
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.rejected == 0
+
+
+def test_spent_deadline_is_not_a_failure(stub):
+    c = client(stub.url, breaker=CircuitBreaker(1, 30.0))
+    with pytest.raises(EverythingUnavailable, match="deadline"):
+        c.search("q", deadline=time.monotonic() - 1)
+    assert stub.hits == 0
+    assert c.failures == 0
+    assert c.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_responses_are_cached_for_the_ttl(stub):
+    c = client(stub.url, cache_ttl=0.3)
+    assert c.search("q") == RESULT
+    assert c.search("q") == RESULT
+    assert stub.hits == 1
+    assert c.cache_hits == 1
+    c.search("other")
+    assert stub.hits == 2
+    time.sleep(0.35)
+    c.search("q")
+    assert stub.hits == 3
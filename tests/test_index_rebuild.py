@@ -0,0 +1,96 @@
+"""
+IndexRebuilder over a live WhooshIndexer: rebuild from the stored
+documents, catch-up of writes made meanwhile, and the swap.
+"""
+from pathlib import Path
+
+import pytest
+
+import utils.index_manager as index_manager
+from utils.index_manager import active_index_dir
+from utils.index_rebuild import COMPLETED, FAILED, IndexRebuild, IndexRebuilder
+from utils.whoosh_indexer import WhooshIndexer
+
+
+@pytest.fixture
+def live(tmp_path, monkeypatch):
+    root = tmp_path / "whoosh_index"
+    monkeypatch.setattr(index_manager.settings, "WHOOSH_INDEX_PATH", str(root))
+    monkeypatch.setattr(index_manager.settings, "INDEX_WRITER_ELECTION", False)
+    monkeypatch.setattr(IndexRebuilder, "DRAIN_SECONDS", 0.0)
+    indexer = WhooshIndexer(str(root))
+    for n in range(5):
+        write(indexer, tmp_path / f"note{n}.txt", f"budget report {n}")
+    yield indexer
+    indexer.close()
+
+
+def write(indexer, path: Path, text: str):
+    path.write_text(text, encoding="utf-8")
+    indexer.add_or_update(path, text)
+    return str(path.resolve())
+
+
+def stored_paths(indexer):
+    with indexer.reader() as reader:
+        return sorted(doc["path"] for _, doc in reader.iter_docs())
+
+
+def rebuild(indexer, during=None) -> IndexRebuild:
+    """Run a rebuild from the index to the end in this thread; `during` runs once the shadow is full."""
+    rebuilder = IndexRebuilder(indexer)
+    build = rebuilder._build_from_index
+
+    def build_then_write(shadow, rb):
+        build(shadow, rb)
+        if during:
+            during()
+
+    rebuilder._build_from_index = build_then_write
+    rb = IndexRebuild("index")
+    rebuilder._run(rb)
+    return rb
+
+
+def test_rebuild_swaps_in_a_copy_of_the_index(live):
+    old_dir = Path(live.index_dir)
+    before = stored_paths(live)
+    rb = rebuild(live)
+
+    assert rb.status == COMPLETED, rb.error
+    assert str(live.index_dir) == rb.shadow_dir != str(old_dir)
+    assert active_index_dir() == rb.shadow_dir
+    assert stored_paths(live) == before
+    assert len(live.search("budget", limit=10)) == 5
+
+
+def test_writes_made_during_the_rebuild_are_replayed(live, tmp_path):
+    deleted = stored_paths(live)[0]
+    added = []
+
+    def during():
+        added.append(write(live, tmp_path / "late.txt", "budget late addition"))
+        write(live, tmp_path / "note1.txt", "budget rewritten")
+        live.delete_paths([deleted])
+
+    rb = rebuild(live, during)
+    assert rb.status == COMPLETED, rb.error
+    assert rb.replayed == 3
+    paths = stored_paths(live)
+    assert added[0] in paths and deleted not in paths
+    assert [h["path"] for h in live.search("rewritten", limit=10)] == [str((tmp_path / "note1.txt").resolve())]
+
+
+def test_failed_pointer_write_keeps_the_live_index(live, monkeypatch):
+    old_dir = live.index_dir
+
+    def fail(index_dir, root=None):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(index_manager, "set_active_index_dir", fail)
+    rb = rebuild(live)
+
+    assert rb.status == FAILED and "disk full" in rb.error
+    assert str(live.index_dir) == rb.shadow_dir
+    assert Path(rb.shadow_dir).is_dir() and Path(old_dir).is_dir()
+    assert len(live.search("budget", limit=10)) == 5
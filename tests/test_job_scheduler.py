@@ -0,0 +1,182 @@
+"""
+JobScheduler state transitions over a fake indexer whose files are
+indexed one checkpoint at a time, with the job state in a throwaway
+state store.
+"""
+import threading
+import time
+
+import pytest
+
+import utils.job_scheduler as job_scheduler
+from utils.job_scheduler import (
+    CANCELLED, COMPLETED, PAUSED, QUEUED, RUNNING, IndexJob, JobScheduler,
+)
+from utils.state_store import StateStore
+
+FILES = 5
+
+
+class FakeIndexer:
+    """
+    index_folder over FILES fake files of 1 MB. Files finished by an
+    earlier run are skipped, as the state store makes the real one do;
+    `gate` holds each file until it is set.
+    """
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.done = {}
+
+    def index_folder(self, folder, progress):
+        start = self.done.get(folder, 0)
+        for n in range(start, FILES):
+            progress.checkpoint()
+            self.gate.wait()
+            progress.extracted += 1
+            progress.bytes += 1024 * 1024
+            self.done[folder] = n + 1
+        return {"indexed": FILES - start, "docs_per_sec": 1.0, "mb_per_sec": 1.0}
+
+
+def wait_for(job, status, timeout=5.0):
+    limit = time.monotonic() + timeout
+    while job.status != status:
+        assert time.monotonic() < limit, f"job is {job.status}, expected {status}"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def make_scheduler(store, monkeypatch):
+    monkeypatch.setattr(job_scheduler, "get_state_store", lambda: store)
+    monkeypatch.setattr(JobScheduler, "POLL_SECONDS", 0.05)
+    monkeypatch.setattr(job_scheduler.IndexJob, "PERSIST_INTERVAL", 0.0)
+    made = []
+
+    def make(indexer, start=True):
+        scheduler = JobScheduler(indexer)
+        if start:
+            scheduler.start()
+        made.append((scheduler, indexer))
+        return scheduler
+
+    yield make
+    for scheduler, indexer in made:
+        indexer.gate.set()
+        scheduler.stop()
+    time.sleep(2 * JobScheduler.POLL_SECONDS)   # pollers notice the stop before the store closes
+
+
+def test_pause_and_resume_continue_where_the_job_stopped(make_scheduler):
+    indexer = FakeIndexer()
+    scheduler = make_scheduler(indexer)
+    indexer.gate.clear()
+    job = scheduler.submit("/docs")
+    wait_for(job, RUNNING)
+
+    assert scheduler.pause(job.id) is job
+    assert job.status == RUNNING   # stops at the next file boundary
+    indexer.gate.set()
+    wait_for(job, PAUSED)
+    assert indexer.done["/docs"] == 1
+    assert job.finished_at is None
+    progress = job.to_dict()["progress"]
+    assert progress["files_extracted"] == 1 and progress["mb_per_sec"] > 0
+
+    with pytest.raises(ValueError):
+        scheduler.pause(job.id)
+    scheduler.resume(job.id)
+    wait_for(job, COMPLETED)
+    assert job.runs == 2
+    assert job.result["indexed"] == FILES - 1
+    assert job.to_dict()["progress"]["docs_per_sec"] > 0
+
+
+def test_cancel_from_every_state(make_scheduler):
+    indexer = FakeIndexer()
+    scheduler = make_scheduler(indexer)
+    indexer.gate.clear()
+    running = scheduler.submit("/a")
+    wait_for(running, RUNNING)
+    queued = scheduler.submit("/b")   # concurrency 1: waits behind /a
+    assert scheduler.submit("/b") is queued
+
+    scheduler.cancel(queued.id)
+    assert queued.status == CANCELLED and queued.finished_at
+    scheduler.cancel(running.id)
+    indexer.gate.set()
+    wait_for(running, CANCELLED)
+    assert indexer.done["/a"] == 1
+    assert "/b" not in indexer.done
+
+    indexer.gate.clear()
+    wait_for(scheduler.submit("/blocker"), RUNNING)
+    paused = scheduler.submit("/c")
+    scheduler.pause(paused.id)   # still queued: paused right away
+    assert paused.status == PAUSED
+    scheduler.cancel(paused.id)
+    assert paused.status == CANCELLED
+
+    for action in (scheduler.cancel, scheduler.pause, scheduler.resume):
+        with pytest.raises(ValueError):
+            action(running.id)
+    with pytest.raises(KeyError):
+        scheduler.cancel("missing")
+
+
+def test_interrupted_jobs_resume_after_a_restart(make_scheduler, store):
+    # what a process that died mid-run (and one that paused a job) left in the store
+    interrupted = IndexJob("interrupted", "/docs", RUNNING, store=store)
+    interrupted.runs = 1
+    interrupted.persist()
+    IndexJob("paused", "/other", PAUSED, store=store).persist()
+    indexer = FakeIndexer()
+    indexer.done["/docs"] = 3   # files committed before the process stopped
+
+    scheduler = make_scheduler(indexer)
+    job = scheduler.get("interrupted")
+    wait_for(job, COMPLETED)
+    assert job.runs == 2
+    assert job.result["indexed"] == FILES - 3
+    assert scheduler.get("paused").status == PAUSED
+    assert "/other" not in indexer.done
+
+
+def test_read_only_process_relays_jobs_and_controls(make_scheduler):
+    indexer = FakeIndexer()
+    writer = make_scheduler(indexer)
+    reader = make_scheduler(FakeIndexer(), start=False)
+
+    indexer.gate.clear()
+    job = reader.submit("/docs")
+    assert job.status == QUEUED
+    running = writer.get(job.id)
+    for _ in range(500):
+        running = writer.get(job.id)
+        if running is not None and running.status == RUNNING:
+            break
+        time.sleep(0.01)
+    assert running.status == RUNNING
+
+    reader.pause(job.id)
+    limit = time.monotonic() + 5
+    while running._stop != PAUSED:   # the writer applies stored requests every POLL_SECONDS
+        assert time.monotonic() < limit
+        time.sleep(0.01)
+    indexer.gate.set()
+    wait_for(running, PAUSED)
+    assert reader.get(job.id).status == PAUSED
+
+    reader.resume(job.id)
+    wait_for(running, COMPLETED)
+    assert reader.get(job.id).status == COMPLETED
+    with pytest.raises(ValueError):
+        reader.cancel(job.id)
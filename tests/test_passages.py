@@ -0,0 +1,60 @@
+"""
+Passage-level index (INDEX_PASSAGES=true): hits collapse to one result
+per file, and paging through them neither repeats nor drops a file.
+"""
+import random
+from datetime import datetime
+
+import pytest
+
+from config.settings import settings
+from utils.passages import PAGES_PER_HIT, index_docs
+from utils.whoosh_extractors import PAGE_BREAK
+from utils.whoosh_indexer import WhooshIndexer
+
+FILES = 14
+QUERY = "budget OR invoice"
+
+
+@pytest.fixture(scope="module")
+def indexer(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(settings, "INDEX_PASSAGES", True)
+        indexer = WhooshIndexer(str(tmp_path_factory.mktemp("passages") / "index"))
+    rng = random.Random(11)
+    bulk = indexer.bulk_writer()
+    for n in range(FILES):
+        path = f"/docs/report{n:02d}.pdf"
+        # up to twice PAGES_PER_HIT matching pages, so collapsing drops some of them
+        pages = [" ".join(rng.choice(["budget", "invoice", "alpha", "beta", "gamma"]) for _ in range(30))
+                 for _ in range(rng.randint(1, 2 * PAGES_PER_HIT))]
+        base = dict(path=path, filename=path.rsplit("/", 1)[1], filetype="pdf",
+                    modified="2024-01-01 00:00:00", modified_at=datetime(2024, 1, 1 + n),
+                    size_bytes=(n * 7 % FILES + 1) * 1024)
+        bulk.replace(path, index_docs(indexer.schema, base, PAGE_BREAK.join(pages)))
+    bulk.close()
+    yield indexer
+    indexer.close()
+
+
+def paths(docs):
+    return [d["path"] for d in docs]
+
+
+@pytest.mark.parametrize("sort", [None, ("size_bytes", False), ("size_bytes", True), ("modified_at", True)])
+@pytest.mark.parametrize("limit", [1, 3, 4])
+def test_pages_neither_repeat_nor_drop_files(indexer, sort, limit):
+    sortedby, reverse = sort or (None, False)
+    everything = indexer.search(QUERY, limit=100, sortedby=sortedby, reverse=reverse)
+    assert len(everything) == FILES == len(set(paths(everything)))
+
+    pages = [indexer.search(QUERY, limit=limit, offset=offset, sortedby=sortedby, reverse=reverse)
+             for offset in range(0, FILES + limit, limit)]
+    assert paths([d for page in pages for d in page]) == paths(everything)
+    assert pages[-1] == []
+
+
+def test_results_report_the_matching_pages(indexer):
+    for doc in indexer.search(QUERY, limit=100):
+        assert 1 <= len(doc["pages"]) <= PAGES_PER_HIT
+        assert doc["page"] in doc["pages"] and doc["pages"] == sorted(set(doc["pages"]))
@@ -0,0 +1,65 @@
+"""
+QueryCache: invalidation by tag, eviction by response size, counters.
+"""
+import pytest
+
+from utils.query_cache import QueryCache
+
+
+def response(n: int, chars: int = 100) -> dict:
+    return {"results_count": 1, "results": [{"path": f"/docs/{n}", "text": "x" * chars}]}
+
+
+def test_new_generation_drops_older_entries_of_its_namespace():
+    cache = QueryCache(max_bytes=100_000, ttl=60)
+    cache.put("content", "a", 1, response(1))
+    cache.put("content", "b", 1, response(2))
+    cache.put("filename", "a", "bucket", response(3))
+    assert cache.get("content", "a", 1) == response(1)
+
+    assert cache.get("content", "a", 2) is None   # the index committed
+    assert cache.stats()["invalidations"] == 2
+    assert cache.get("content", "b", 1) is None   # never served for an older tag either
+    assert cache.get("filename", "a", "bucket") == response(3)
+
+
+def test_eviction_is_bounded_by_size_least_recently_used_first():
+    size = QueryCache._size_of(response(0))
+    cache = QueryCache(max_bytes=size * 4 + size // 2, ttl=60)
+    for n in range(4):
+        cache.put("content", n, 1, response(n))
+    assert cache.get("content", 0, 1) is not None   # now the most recently used
+    cache.put("content", 4, 1, response(4))
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 4
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert cache.get("content", 1, 1) is None
+    assert cache.get("content", 0, 1) is not None
+
+    cache.put("content", "huge", 1, response(5, chars=size * 4))   # over a quarter of the budget
+    assert cache.get("content", "huge", 1) is None
+    assert cache.stats()["entries"] == 4
+
+
+def test_counters_and_expiry(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("utils.query_cache.time.monotonic", lambda: clock[0])
+    cache = QueryCache(max_bytes=100_000, ttl=30)
+    assert cache.get("content", "a", 1) is None
+    cache.put("content", "a", 1, response(1))
+    assert cache.get("content", "a", 1) == response(1)
+    assert cache.get("content", "a", 1) == response(1)
+    clock[0] += 31
+    assert cache.get("content", "a", 1) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 0)
+    assert stats["hit_ratio"] == pytest.approx(0.5)
+
+
+def test_disabled_cache_stores_nothing():
+    cache = QueryCache(max_bytes=0, ttl=60)
+    cache.put("content", "a", 1, response(1))
+    assert cache.get("content", "a", 1) is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["misses"] == 0
@@ -0,0 +1,68 @@
+"""
+An index with the original schema (no modified_at column, unsortable
+size_bytes) is refused at startup and migrated offline by the CLI.
+"""
+from datetime import datetime
+
+import pytest
+from whoosh import index as whoosh_index
+from whoosh.analysis import StemmingAnalyzer
+from whoosh.fields import ID, NUMERIC, TEXT, Schema
+
+from utils import schema_migration
+from utils.whoosh_indexer import SchemaOutdated, WhooshIndexer
+
+OLD_SCHEMA = Schema(
+    path=ID(stored=True, unique=True),
+    filename=TEXT(stored=True, analyzer=StemmingAnalyzer()),
+    filetype=ID(stored=True),
+    modified=ID(stored=True),
+    size_bytes=NUMERIC(stored=True),
+    content=TEXT(stored=True, analyzer=StemmingAnalyzer()),
+)
+
+
+@pytest.fixture
+def old_index(tmp_path):
+    index_dir = tmp_path / "whoosh_index"
+    index_dir.mkdir()
+    ix = whoosh_index.create_in(str(index_dir), OLD_SCHEMA)
+    writer = ix.writer()
+    for n in range(6):
+        writer.add_document(path=f"/docs/report{n}.{'pdf' if n % 2 else 'txt'}",
+                            filename=f"report{n}", filetype="pdf" if n % 2 else "txt",
+                            modified=f"2024-0{n + 1}-15 10:00:00", size_bytes=(n + 1) * 10240,
+                            content=f"quarterly budget report number{n}")
+    writer.commit()
+    ix.close()
+    return index_dir
+
+
+def test_startup_refuses_an_outdated_index(old_index):
+    with pytest.raises(SchemaOutdated, match="schema_migration"):
+        WhooshIndexer(str(old_index))
+    # left untouched for the offline migration
+    assert "modified_at" not in whoosh_index.open_dir(str(old_index)).schema
+
+
+def test_cli_migrates_and_keeps_documents_and_filters(old_index):
+    schema_migration.main([str(old_index)])
+    assert not old_index.with_name(old_index.name + ".pre-migration").exists()
+
+    indexer = WhooshIndexer(str(old_index))
+    try:
+        with indexer.searchers.searcher() as s:
+            assert s.doc_count() == 6
+        hits = indexer.search("budget", limit=10)
+        assert len(hits) == 6
+        by_size = indexer.search("budget", limit=10, size_from_b=30 * 1024, file_types=["pdf"],
+                                 sortedby="size_bytes", reverse=True)
+        assert [h["path"] for h in by_size] == ["/docs/report5.pdf", "/docs/report3.pdf"]
+        by_date = indexer.search("budget", limit=10, date_from=datetime(2024, 4, 1))
+        assert sorted(h["path"] for h in by_date) == ["/docs/report3.pdf", "/docs/report4.txt",
+                                                      "/docs/report5.pdf"]
+    finally:
+        indexer.close()
+
+    # a second run finds nothing to do
+    schema_migration.main([str(old_index)])
@@ -0,0 +1,88 @@
+"""
+A 2-shard ShardedIndexer against a single WhooshIndexer holding the same
+documents: the merged pages must match, for relevance (corpus-wide BM25),
+both sort directions, filters and paging.
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.passages import index_docs
+from utils.sharded_indexer import ShardedIndexer
+from utils.whoosh_indexer import WhooshIndexer
+
+WORDS = ["alpha", "beta", "gamma", "delta", "report", "budget", "invoice", "zebra"]
+MISSING = {"/docs/nosize0.txt", "/docs/nosize1.txt"}   # no size or date column values
+
+
+def corpus():
+    rng = random.Random(7)
+    docs = []
+    for n in range(24):
+        path = f"/docs/file{n:02d}.{'pdf' if n % 3 == 0 else 'txt'}"
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60)))
+        docs.append((path, text, (n + 1) * 4096, datetime(2024, 1, 1) + timedelta(days=n)))
+    for path in sorted(MISSING):
+        docs.append((path, "alpha report zebra", None, None))
+    return docs
+
+
+def fill(indexer):
+    bulk = indexer.bulk_writer()
+    for path, text, size, modified in corpus():
+        base = dict(path=path, filename=path.rsplit("/", 1)[1], filetype=path.rsplit(".", 1)[1],
+                    modified=modified.strftime("%Y-%m-%d %H:%M:%S") if modified else "")
+        if size is not None:
+            base.update(size_bytes=size, modified_at=modified)
+        bulk.replace(path, index_docs(indexer.schema, base, text))
+    bulk.close()
+    return indexer
+
+
+@pytest.fixture(scope="module")
+def indexes(tmp_path_factory):
+    root = tmp_path_factory.mktemp("shards")
+    single = fill(WhooshIndexer(str(root / "single")))
+    sharded = fill(ShardedIndexer(str(root / "sharded"), mode="hash", count=2))
+    assert all(s.ix.doc_count() for s in sharded.shard_list())   # both shards hold documents
+    yield single, sharded
+    single.close()
+    sharded.close()
+
+
+def paths(docs):
+    return [d["path"] for d in docs]
+
+
+def test_relevance_matches_a_single_index(indexes):
+    single, sharded = indexes
+    for query in ("alpha", "budget OR zebra", "report invoice"):
+        expected = single.search(query, limit=10)
+        got = sharded.search(query, limit=10)
+        assert paths(got) == paths(expected)
+        assert [d["score"] for d in got] == pytest.approx([d["score"] for d in expected])
+
+
+@pytest.mark.parametrize("field", ["size_bytes", "modified_at"])
+@pytest.mark.parametrize("reverse", [False, True])
+def test_sorted_merge_puts_missing_values_last(indexes, field, reverse):
+    single, sharded = indexes
+    expected = single.search("alpha OR report", limit=100, sortedby=field, reverse=reverse)
+    got = sharded.search("alpha OR report", limit=100, sortedby=field, reverse=reverse)
+    assert set(paths(got[-2:])) == MISSING
+    assert set(paths(expected[-2:])) == MISSING
+    assert paths(got[:-2]) == paths(expected[:-2])
+
+    sizes = [d["size_kb"] for d in got[:-2]]
+    assert sizes == sorted(sizes, reverse=reverse)
+
+
+def test_filters_and_paging_match_a_single_index(indexes):
+    single, sharded = indexes
+    kwargs = dict(size_from_b=20 * 4096, file_types=["txt"], sortedby="size_bytes", reverse=True)
+    expected = single.search("alpha OR beta OR gamma", limit=100, **kwargs)
+    pages = [sharded.search("alpha OR beta OR gamma", limit=3, offset=offset, **kwargs)
+             for offset in range(0, len(expected), 3)]
+    assert paths([d for page in pages for d in page]) == paths(expected)
+    assert all(d["filetype"] == "txt" and d["size_kb"] >= 80 for d in expected)
@@ -0,0 +1,52 @@
+"""
+Snippets made from token offsets (INDEX_CONTENT_STORE=excerpt|none).
+"""
+import pytest
+
+import utils.extraction_cache as extraction_cache
+from config.settings import settings
+from utils.whoosh_indexer import WhooshIndexer
+
+FILLER = "lorem ipsum dolor sit amet " * 40
+
+
+@pytest.fixture
+def make_indexer(tmp_path, monkeypatch):
+    made = []
+
+    def make(content_store):
+        monkeypatch.setattr(settings, "INDEX_CONTENT_STORE", content_store)
+        monkeypatch.setattr(settings, "INDEX_EXCERPT_CHARS", 2000)
+        indexer = WhooshIndexer(str(tmp_path / content_store))
+        for n, text in enumerate([f"budget {FILLER} zebra crossing", f"zebra stripes {FILLER}",
+                                  "nothing to see here"]):
+            path = tmp_path / f"doc{n}.txt"
+            path.write_text(text, encoding="utf-8")
+            indexer.add_or_update(path, text)
+        made.append(indexer)
+        return indexer
+
+    yield make
+    for indexer in made:
+        indexer.close()
+
+
+def snippets(indexer, query):
+    return {d["filename"]: d["snippet"] for d in indexer.search(query, limit=10)}
+
+
+def test_excerpt_snippets_surround_every_matched_term(make_indexer):
+    indexer = make_indexer("excerpt")
+    found = snippets(indexer, "zebr* OR budget")
+    assert "zebra crossing" in found["doc0.txt"] and found["doc0.txt"].startswith("budget")
+    assert found["doc1.txt"].startswith("zebra stripes")
+    # the terms are expanded per search, not remembered from the previous one
+    assert "dolor" in snippets(indexer, "dolor")["doc0.txt"]
+
+
+def test_none_without_the_extraction_cache_has_empty_snippets(make_indexer, monkeypatch):
+    monkeypatch.setattr(extraction_cache, "get_extraction_cache", lambda: None)
+    indexer = make_indexer("none")
+    found = snippets(indexer, "zebra")
+    assert set(found) == {"doc0.txt", "doc1.txt"}
+    assert set(found.values()) == {""}
@@ -0,0 +1,22 @@
+"""
+collect_text: the character cap and what a parse error leaves behind.
+"""
+from utils.whoosh_extractors import collect_text
+
+
+def chunks(*parts, fail=False):
+    yield from parts
+    if fail:
+        raise ValueError("corrupt page")
+
+
+def test_cap_truncates_and_closes_the_stream():
+    stream = chunks("abcd", "efgh", "ijkl")
+    assert collect_text(stream, max_chars=7, sep="") == "abcdefg"
+    assert next(stream, None) is None   # closed, the rest is never read
+    assert collect_text(chunks("ab", "cd"), max_chars=0) == "ab\ncd"
+
+
+def test_parse_error_discards_partial_text():
+    assert collect_text(chunks("page one", "page two", fail=True), max_chars=0) is None
+    assert collect_text(chunks(fail=True), max_chars=0) is None
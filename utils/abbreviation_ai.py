@@ -1,83 +1,355 @@
-# import google.generativeai as genai
-# from config.settings import settings
+"""
+Abbreviation expansion for search keywords.
 
-# def expand_abbreviations(keyword: str) -> str:
-#     """
-#     Uses Gemini 2.5 Flash to expand abbreviations.
-#     Example: HB → hemoglobin, ECG → electrocardiogram
-#     """
-#     try:
-#         genai.configure(api_key=settings.GEMINI_API_KEY)
+`expand_abbreviations("HGB, ECG")` returns the keywords followed by their
+expansions as one comma-separated string ("HGB, ECG, Hemoglobin, ...").
+This is the format the search engine splits into terms.
 
-#         prompt = f"""
-#         The user typed this medical/technical abbreviation: "{keyword}".
-#         Expand it into full possible words. 
-#         Only return keywords separated by commas, no sentences.
-#         """
+Each term is looked up in this order, stopping at the first answer:
 
-#         model = genai.GenerativeModel("gemini-2.5-flash")
-#         response = model.generate_content(prompt)
+  1. Local backends: a CSV dictionary of domain abbreviations held in a
+     dict. A lookup costs a hash probe.
+  2. The expansion cache: an in-memory LRU in front of an SQLite table,
+     so answers survive restarts.
+  3. The remote backend (Gemini). It runs on a small thread pool and is
+     waited on only until the search's deadline (at most
+     ABBREVIATION_TIMEOUT_MS). A late answer still lands in the cache and
+     is used by the next search for that term. Only single words of at
+     most ABBREVIATION_MAX_CHARS characters are asked about: abbreviations
+     are short, and each ordinary search word would cost a remote call.
 
-#         expanded = response.text.strip()
+Backends only need `name` and `expand(term) -> list of expansions`.
+StubBackend answers from a fixed mapping, so the whole layer can run
+offline.
+"""
+import csv
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
 
-#         print(f"[AI-EXPAND] expanded '{keyword}' → '{expanded}'")
+from config.settings import settings
+from utils.lazy_imports import lazy_import
 
-#         return expanded
-#     except Exception as e:
-#         print(f"[AI-EXPAND-ERROR] {e}")
-#         return keyword
+RETRY_SECONDS = 60.0    # a failed remote lookup is not repeated for this long
+
+
+def _norm(term: str) -> str:
+    return " ".join(term.split()).casefold()
 
-import google.generativeai as genai
-from config.settings import settings
 
-def expand_abbreviations(keyword: str) -> str:
+# -------------------------------
+# Backends
+# -------------------------------
+class DictionaryBackend:
     """
-    Expand abbreviations using Gemini 2.5 Flash.
-    OUTPUT → always a comma-separated STRING.
-    
-    Example:
-        Input: "HGB"
-        Output: "HGB, Hemoglobin, Haemoglobin, HB"
-    
-    This preserves compatibility with your existing
-    multi-keyword processing, which expects a string.
+    Abbreviations from a CSV file, one `abbreviation,expansion[,expansion...]`
+    row each. Repeated abbreviations add up; lines starting with '#' are
+    comments. The file is read again when it changes.
     """
 
-    try:
-        api_key = settings.GEMINI_API_KEY
-        if not api_key:
-            #print("[AI-EXPAND-ERROR] Gemini API key missing")
-            return keyword  # return original safely
+    name = "dictionary"
+
+    def __init__(self, csv_path: Path):
+        self.csv_path = Path(csv_path)
+        self._entries: Dict[str, List[str]] = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            mtime = self.csv_path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        entries: Dict[str, List[str]] = {}
+        if mtime is not None:
+            with open(self.csv_path, newline="", encoding="utf-8-sig") as f:
+                for row in csv.reader(f):
+                    if not row or row[0].lstrip().startswith("#"):
+                        continue
+                    known = entries.setdefault(_norm(row[0]), [])
+                    known.extend(c.strip() for c in row[1:] if c.strip() and c.strip() not in known)
+            print(f"[abbrev] loaded {len(entries)} abbreviations from {self.csv_path}")
+        self._entries, self._mtime = entries, mtime
+
+    def expand(self, term: str) -> Optional[List[str]]:
+        with self._lock:
+            self._load()
+            return self._entries.get(_norm(term))
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._entries)
+
 
+class GeminiBackend:
+    """Expansions from a Gemini model. Blocking; the expander calls it from worker threads."""
+
+    name = "gemini"
+
+    PROMPT = (
+        'The user entered this abbreviation: "{term}".\n'
+        "Return ALL related expansions (full terms, variants, plural forms).\n"
+        "Output format MUST be:\n    word1, word2, word3, ...\n"
+        "NO sentences. NO explanations."
+    )
+
+    def __init__(self, api_key: str, model: str, timeout: float = 20.0):
+        genai = lazy_import("google.generativeai")
         genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model)
+        self.timeout = timeout
+
+    def expand(self, term: str) -> Optional[List[str]]:
+        response = self._model.generate_content(self.PROMPT.format(term=term),
+                                                request_options={"timeout": self.timeout})
+        return [p.strip() for p in response.text.strip().split(",") if p.strip()]
+
+
+class StubBackend:
+    """Fixed answers, optionally after `delay` seconds; for running the expander offline."""
 
-        prompt = f"""
-        The user entered this abbreviation: "{keyword}".
-        Return ALL related expansions (full terms, variants, plural forms).
-        Output format MUST be:
-            word1, word2, word3, ...
-        NO sentences. NO explanations.
+    name = "stub"
+
+    def __init__(self, mapping: Optional[Dict[str, List[str]]] = None, delay: float = 0.0):
+        self.mapping = {_norm(k): list(v) for k, v in (mapping or {}).items()}
+        self.delay = delay
+        self.calls = 0
+
+    def expand(self, term: str) -> Optional[List[str]]:
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return self.mapping.get(_norm(term), [])
+
+
+# -------------------------------
+# Cache
+# -------------------------------
+class ExpansionCache:
+    """
+    Remote answers by normalized term: an LRU of `max_entries` in memory in
+    front of an SQLite table (`db_path`, optional). Entries expire after
+    `ttl` seconds. An empty answer is cached too, so unknown terms are not
+    asked about on every search.
+    """
+
+    def __init__(self, db_path: Optional[Path], max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[List[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path is not None:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS expansions "
+                               "(term TEXT PRIMARY KEY, expansions TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def get(self, term: str) -> Optional[List[str]]:
+        key = _norm(term)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._conn is not None:
+                try:
+                    row = self._conn.execute("SELECT expansions, expires_at FROM expansions WHERE term = ?",
+                                             (key,)).fetchone()
+                except sqlite3.Error as e:
+                    print(f"[abbrev] cache read failed: {e}")
+                    row = None
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+                    self._remember(key, entry)
+            if entry is None or entry[1] < now:
+                self.misses += 1
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, term: str, expansions: List[str], ttl: Optional[float] = None, persist: bool = True):
+        key = _norm(term)
+        entry = (list(expansions), time.time() + (self.ttl if ttl is None else ttl))
+        with self._lock:
+            self._remember(key, entry)
+            if persist and self._conn is not None:
+                try:
+                    self._conn.execute("INSERT OR REPLACE INTO expansions (term, expansions, expires_at) "
+                                       "VALUES (?, ?, ?)", (key, json.dumps(entry[0]), entry[1]))
+                except sqlite3.Error as e:
+                    print(f"[abbrev] cache write failed: {e}")
+
+    def _remember(self, key: str, entry):
+        """Caller holds the lock."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"memory_entries": len(self._memory), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# -------------------------------
+# Expander
+# -------------------------------
+class AbbreviationExpander:
+    def __init__(self, local: Iterable = (), remote=None, cache: Optional[ExpansionCache] = None,
+                 timeout: float = 0.4, workers: int = 2, max_chars: int = 12):
+        self.local = list(local)
+        self.remote = remote
+        self.cache = cache or ExpansionCache(None, 1024, 30 * 86400)
+        self.timeout = timeout
+        self.max_chars = max_chars   # longer terms (or phrases) are not sent to the remote backend
+        self.late = 0        # remote answers that missed their search
+        self.failures = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="abbrev") if remote else None
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def expand(self, keyword: str, deadline: Optional[float] = None) -> str:
         """
+        `keyword`'s comma-separated terms followed by their expansions.
+        `deadline` (time.monotonic()) bounds the wait for remote answers.
+        """
+        terms = [t.strip() for t in keyword.split(",") if t.strip()]
+        found: Dict[str, List[str]] = {}
+        waiting: Dict[str, Future] = {}
+        for term in terms:
+            expansions = self._lookup(term)
+            if expansions is not None:
+                found[term] = expansions
+            elif self.remote is not None and self._askable(term):
+                waiting[term] = self._ask(term)
+
+        if waiting:
+            limit = time.monotonic() + self.timeout
+            if deadline is not None:
+                limit = min(limit, deadline)
+            done, not_done = wait(waiting.values(), timeout=max(0.0, limit - time.monotonic()))
+            self.late += len(not_done)
+            for term, future in waiting.items():
+                if future in done and future.exception() is None:
+                    found[term] = future.result()
+
+        out, seen = [], set()
+        for word in terms + [e for t in terms for e in found.get(t, ())]:
+            if _norm(word) not in seen:
+                seen.add(_norm(word))
+                out.append(word)
+        return ", ".join(out)
 
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(prompt)
+    def _lookup(self, term: str) -> Optional[List[str]]:
+        for backend in self.local:
+            expansions = backend.expand(term)
+            if expansions:
+                return expansions
+        if self.remote is None:
+            return None
+        return self.cache.get(term)
 
-        raw = response.text.strip()
-        #print(f"[AI-EXPAND] raw='{raw}'")
+    def _askable(self, term: str) -> bool:
+        return " " not in term and (not self.max_chars or len(term) <= self.max_chars)
 
-        # Convert the output to a clean list
-        parts = [p.strip() for p in raw.split(",") if p.strip()]
+    def _ask(self, term: str) -> Future:
+        """The remote lookup of `term`; concurrent searches for one term share a request."""
+        key = _norm(term)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self._pool.submit(self.remote.expand, term)
+            self._inflight[key] = future
+        # outside the lock: a future that is already done runs the callback right here
+        future.add_done_callback(lambda f: self._answered(term, f))
+        return future
 
-        # Guarantee original term is included
-        if keyword not in parts:
-            parts.insert(0, keyword)
+    def _answered(self, term: str, future: Future):
+        with self._lock:
+            self._inflight.pop(_norm(term), None)
+        if future.exception() is not None:
+            self.failures += 1
+            print(f"[abbrev] {self.remote.name} failed for '{term}': {future.exception()}")
+            self.cache.put(term, [], ttl=RETRY_SECONDS, persist=False)
+            return
+        self.cache.put(term, future.result() or [])
 
-        # Convert list → comma-separated string (expected by search engine)
-        final_string = ", ".join(parts)
+    def stats(self) -> dict:
+        with self._lock:
+            inflight = len(self._inflight)
+        return {
+            "local": {b.name: len(b) if hasattr(b, "__len__") else None for b in self.local},
+            "remote": self.remote.name if self.remote else None,
+            "inflight": inflight,
+            "late": self.late,
+            "failures": self.failures,
+            "cache": self.cache.stats(),
+        }
 
-        print(f"[AI-EXPAND] cleaned='{final_string}'")
-        return final_string
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self.cache.close()
 
+
+_expander: Optional[AbbreviationExpander] = None
+_expander_lock = threading.Lock()
+
+
+def get_expander() -> AbbreviationExpander:
+    global _expander
+    with _expander_lock:
+        if _expander is None:
+            from utils.storage_helper import ABBREVIATIONS_CACHE_FILE, ABBREVIATIONS_FILE
+            remote = None
+            if settings.ABBREVIATION_REMOTE == "gemini":
+                if settings.GEMINI_API_KEY:
+                    try:
+                        remote = GeminiBackend(settings.GEMINI_API_KEY, settings.GEMINI_MODEL)
+                    except Exception as e:   # package missing or misconfigured: dictionary only
+                        print(f"[abbrev] Gemini backend unavailable: {e}")
+                else:
+                    print("[abbrev] GEMINI_API_KEY missing, using the dictionary only")
+            _expander = AbbreviationExpander(
+                local=[DictionaryBackend(Path(settings.ABBREVIATION_DICT or ABBREVIATIONS_FILE))],
+                remote=remote,
+                cache=ExpansionCache(ABBREVIATIONS_CACHE_FILE, settings.ABBREVIATION_CACHE_SIZE,
+                                     settings.ABBREVIATION_CACHE_DAYS * 86400),
+                timeout=settings.ABBREVIATION_TIMEOUT_MS / 1000,
+                max_chars=settings.ABBREVIATION_MAX_CHARS,
+            )
+        return _expander
+
+
+def expand_abbreviations(keyword: str, deadline: Optional[float] = None) -> str:
+    """
+    Expand abbreviations in `keyword`.
+    OUTPUT → always a comma-separated STRING, the original terms first.
+
+    Example:
+        Input: "HGB"
+        Output: "HGB, Hemoglobin, Haemoglobin, HB"
+    """
+    try:
+        return get_expander().expand(keyword, deadline)
     except Exception as e:
-        print(f"[AI-EXPAND-ERROR] {e}")
+        print(f"[abbrev] expansion failed: {e}")
         return keyword
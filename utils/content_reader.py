@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from utils.extraction_cache import get_extraction_cache
+from utils.extraction_pool import extract_cached
+from utils.state_store import get_state_store, INDEXED
+from utils.whoosh_extractors import PAGE_BREAK, PAGED_TYPES
+
+# where the text of a show-content response came from
+MEMORY = "memory"
+INDEX = "index"
+EXTRACTED = "extracted"
+
+
+def etag_for(st, *parts) -> str:
+    """Weak ETag of a file version (mtime + size) and the requested window."""
+    tag = "-".join([format(st.st_mtime_ns, "x"), format(st.st_size, "x")] + [str(p) for p in parts])
+    return f'W/"{tag}"'
+
+
+class ContentReader:
+    """
+    Extracted text of single files for /api/show-content, without parsing
+    the file again whenever possible: the last few documents are kept in
+    memory (paging through one document hits the same text), then the
+    stored `content` field of the index is used if the state store says
+    it was indexed from the file's current version, then the extraction
+    cache.
+    """
+
+    def __init__(self, indexer, max_docs: int = 8, max_chars: int = 64 * 1024 * 1024, store=None):
+        self.indexer = indexer
+        self.store = store   # the process-wide state store unless given
+        self.max_docs = max_docs
+        self.max_chars = max_chars
+        self._recent: "OrderedDict[tuple, str]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def text(self, path: Path, st) -> Tuple[Optional[str], str]:
+        """(text, source) of `path` as of stat result `st`; text is None if it cannot be extracted."""
+        key = (str(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            text = self._recent.get(key)
+            if text is not None:
+                self._recent.move_to_end(key)
+                return text, MEMORY
+
+        text, source = self._from_index(path, st), INDEX
+        if text is None:
+            # extract_cached reads the extraction cache before parsing
+            text, _ = extract_cached(str(path), get_extraction_cache())
+            source = EXTRACTED
+        if text is not None:
+            self._remember(key, text)
+        return text, source
+
+    def _from_index(self, path: Path, st) -> Optional[str]:
+        # the state row is written once the file's batch is committed, with the stat it was extracted at
+        state = (self.store or get_state_store()).get(str(path))
+        if state is None or state.status != INDEXED or (state.mtime_ns, state.size) != (st.st_mtime_ns, st.st_size):
+            return None   # not indexed, or indexed text is of another version of the file
+        doc = self.indexer._stored_doc(str(path))
+        if not doc or doc.get("content") is None or "page" in doc:
+            return None   # no text stored, or only one passage of it
+        return doc["content"]
+
+    def _remember(self, key: tuple, text: str):
+        if len(text) > self.max_chars:
+            return
+        with self._lock:
+            if key in self._recent:
+                return
+            self._recent[key] = text
+            self._chars += len(text)
+            while len(self._recent) > self.max_docs or self._chars > self.max_chars:
+                _, old = self._recent.popitem(last=False)
+                self._chars -= len(old)
+
+
+def window(text: str, suffix: str, page: Optional[int], offset: int, length: Optional[int]) -> dict:
+    """
+    The part of `text` a show-content request asked for: page `page`
+    (1-based, paged file types only) or the whole text, then `length`
+    characters from `offset` within it. An `offset` past the end is an
+    IndexError, like a page past the last one.
+    """
+    pages = None
+    scope = text
+    if suffix in PAGED_TYPES:
+        parts = text.split(PAGE_BREAK)
+        pages = len(parts)
+        if page is not None:
+            if page > pages:
+                raise IndexError(f"page {page} out of range (document has {pages})")
+            scope = parts[page - 1].strip("\n")
+    elif page not in (None, 1):
+        raise IndexError(f"{suffix or 'this file type'} has no pages")
+
+    if offset and offset >= len(scope):
+        raise IndexError(f"offset {offset} out of range ({'page' if page else 'document'} has {len(scope)} characters)")
+
+    end = len(scope) if length is None else min(len(scope), offset + length)
+    return {
+        "page": page,
+        "pages": pages,
+        "offset": offset,
+        "length": max(0, end - offset),
+        "total_chars": len(scope),
+        "has_more": end < len(scope),
+        "content_text": scope[offset:end],
+    }
+
+
+_reader: Optional[ContentReader] = None
+_reader_lock = threading.Lock()
+
+
+def get_content_reader() -> ContentReader:
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            from utils.index_manager import get_indexer
+            _reader = ContentReader(get_indexer())
+        return _reader
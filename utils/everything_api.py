@@ -1,27 +1,375 @@
 import time
+import random
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Optional
+
 import requests
+from requests.adapters import HTTPAdapter
 from config.settings import settings
 from requests.utils import requote_uri
+from utils.lazy_imports import lazy_import
+
+
+class EverythingUnavailable(Exception):
+    """Everything did not answer in time, or the circuit breaker is open."""
+
+
+# ============================================================
+# CIRCUIT BREAKER
+# ============================================================
+class CircuitBreaker:
+    """
+    Fails fast after `failure_threshold` consecutive failures. Once
+    `reset_timeout` seconds have passed one trial request is let through
+    (half-open); its outcome closes the breaker or opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> Optional[str]:
+        """The state a request is let through in (CLOSED, or HALF_OPEN for the trial); None = rejected."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return self.CLOSED
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_running:
+                self._state = self.HALF_OPEN
+                self._trial_running = True
+                return self.HALF_OPEN
+            self.rejected += 1
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def release(self, trial: bool):
+        """
+        End a request that says nothing about Everything's health (cancelled
+        by the caller, or never sent); a trial's slot goes to the next request.
+        """
+        if trial:
+            with self._lock:
+                self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"[everything] circuit opened after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+
+# ============================================================
+# EVERYTHING CLIENT
+# ============================================================
+class EverythingClient:
+    """
+    HTTP client for Everything's JSON search interface.
+
+    Requests go through one keep-alive Session. Connection errors,
+    timeouts and 5xx answers are retried with exponential backoff and full
+    jitter, but never past the caller's deadline. Responses are cached
+    for `cache_ttl` seconds, keyed by the request URL (query + page).
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 8,
+                 connect_timeout: float = 2.0, read_timeout: float = 10.0,
+                 retries: int = 2, backoff: float = 0.2, backoff_max: float = 2.0,
+                 cache_ttl: float = 5.0, cache_entries: int = 256,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.cache_ttl = cache_ttl
+        self.cache_entries = cache_entries
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+        self.cache_hits = 0
+
+    def _url(self, query: str, offset: int = 0, count: Optional[int] = None,
+             sort: Optional[str] = None, ascending: bool = True) -> str:
+        params = (
+            f"json=1"
+            f"&path_column=1"
+            f"&fullpath=1"
+            f"&size_column=1"
+            f"&date_modified_column=1"
+            f"&s={requote_uri(query)}"
+        )
+        if offset:
+            params += f"&offset={int(offset)}"
+        if count:
+            params += f"&count={int(count)}"
+        if sort:
+            params += f"&sort={sort}&ascending={1 if ascending else 0}"
+        return self.base_url + "?" + params
+
+    # -------------------------------
+    # Response cache
+    # -------------------------------
+    def _cached(self, url: str) -> Optional[dict]:
+        with self._cache_lock:
+            entry = self._cache.get(url)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at <= time.monotonic():
+                del self._cache[url]
+                return None
+            self._cache.move_to_end(url)
+            self.cache_hits += 1
+            return data
+
+    def _store(self, url: str, data: dict):
+        if self.cache_ttl <= 0:
+            return
+        with self._cache_lock:
+            self._cache[url] = (time.monotonic() + self.cache_ttl, data)
+            self._cache.move_to_end(url)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    # -------------------------------
+    # Search
+    # -------------------------------
+    def _request(self, url: str, deadline: Optional[float]):
+        """
+        One search request with its cache lookup, retries, backoff and
+        breaker bookkeeping, shared by the sync and async clients: a
+        generator that yields ("get", (connect timeout, read timeout)) and
+        ("sleep", seconds) steps, is sent each get's response (or the
+        transport exception) and returns Everything's JSON answer.
 
-def call_everything(query: str, timeout: int = 60):
-    base = settings.EVERYTHING_URL.rstrip("/") + "/"
-    params = (
-        f"json=1"
-        f"&path_column=1"
-        f"&fullpath=1"
-        f"&size_column=1"
-        f"&date_modified_column=1"
-        f"&s={requote_uri(query)}"
-    )
-    url = base + "?" + params
-
-    last_exc = None
-    for attempt in range(3):
+        Only transport errors and 5xx answers count as failures. A request
+        the caller gives up on (closing the generator, e.g. on a hybrid
+        search's deadline) or whose deadline passed before the first
+        attempt leaves the breaker as it was, apart from freeing its
+        half-open trial.
+        """
+        cached = self._cached(url)
+        if cached is not None:
+            return cached
+
+        admitted = self.breaker.allow()
+        if not admitted:
+            raise EverythingUnavailable(
+                f"Everything is unavailable (retry in {self.breaker.retry_after():.0f}s)")
+
+        last_exc = None
+        settled = False
+        try:
+            for attempt in range(self.retries + 1):
+                remaining = (deadline - time.monotonic()) if deadline is not None else self.read_timeout
+                if remaining <= 0:
+                    break
+                self.requests += 1
+                r = yield "get", (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+                if isinstance(r, Exception):
+                    last_exc = r
+                elif r.status_code < 500:
+                    # the server answered: 4xx is the caller's problem, not an outage
+                    settled = True
+                    self.breaker.record_success()
+                    r.raise_for_status()
+                    data = r.json()
+                    self._store(url, data)
+                    return data
+                else:
+                    last_exc = EverythingUnavailable(f"Everything returned HTTP {r.status_code}")
+
+                if attempt < self.retries:
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+                    if deadline is not None:
+                        delay = min(delay, max(0.0, deadline - time.monotonic()))
+                    self.retried += 1
+                    yield "sleep", delay
+        finally:
+            if not settled and last_exc is not None:
+                self.failures += 1
+                self.breaker.record_failure()
+            elif not settled:
+                self.breaker.release(trial=admitted == CircuitBreaker.HALF_OPEN)
+
+        if last_exc is None:
+            raise EverythingUnavailable("deadline exceeded before Everything could be queried")
+        # httpx timeouts carry no message
+        raise EverythingUnavailable(
+            f"Everything request failed: {str(last_exc) or type(last_exc).__name__}") from last_exc
+
+    def search(self, query: str, deadline: Optional[float] = None, offset: int = 0,
+               count: Optional[int] = None, sort: Optional[str] = None, ascending: bool = True) -> dict:
+        """
+        Run `query` and return Everything's JSON answer (one page of
+        `count` rows from `offset` when given, in `sort` order). `deadline`
+        is a time.monotonic() value; raises EverythingUnavailable when it
+        passes, retries run out, or the breaker is open.
+        """
+        url = self._url(query, offset, count, sort, ascending)
+        plan = self._request(url, deadline)
+        try:
+            step, arg = next(plan)
+            while True:
+                outcome = None
+                if step == "sleep":
+                    time.sleep(arg)
+                else:
+                    try:
+                        outcome = self.session.get(url, timeout=arg)
+                    except requests.RequestException as e:
+                        outcome = e
+                step, arg = plan.send(outcome)
+        except StopIteration as done:
+            return done.value
+        finally:
+            plan.close()
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.state,
+            "breaker_rejected": self.breaker.rejected,
+            "requests": self.requests,
+            "retried": self.retried,
+            "failures": self.failures,
+            "cache_hits": self.cache_hits,
+            "cache_entries": len(self._cache),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+# ============================================================
+# ASYNC CLIENT
+# ============================================================
+class AsyncEverythingClient:
+    """
+    asyncio counterpart of EverythingClient over httpx, for the async
+    search routes. It shares the sync client's response cache, circuit
+    breaker and counters, so both paths see the same Everything state.
+    """
+
+    def __init__(self, base: EverythingClient, pool_size: int = 8):
+        httpx = lazy_import("httpx")
+        self.base = base
+        self.client = httpx.AsyncClient(limits=httpx.Limits(max_connections=pool_size,
+                                                            max_keepalive_connections=pool_size))
+
+    async def search(self, query: str, deadline: Optional[float] = None, offset: int = 0,
+                     count: Optional[int] = None, sort: Optional[str] = None, ascending: bool = True) -> dict:
+        """Same contract as EverythingClient.search, without blocking the event loop."""
+        httpx = lazy_import("httpx")
+        url = self.base._url(query, offset, count, sort, ascending)
+        plan = self.base._request(url, deadline)
         try:
-            r = requests.get(url, timeout=timeout)
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            last_exc = e
-            time.sleep(1)
-    raise last_exc
+            step, arg = next(plan)
+            while True:
+                outcome = None
+                if step == "sleep":
+                    await asyncio.sleep(arg)
+                else:
+                    connect, read = arg
+                    try:
+                        outcome = await self.client.get(url, timeout=httpx.Timeout(read, connect=connect))
+                    except httpx.HTTPError as e:
+                        outcome = e
+                step, arg = plan.send(outcome)
+        except StopIteration as done:
+            return done.value
+        finally:
+            # also when a hybrid search's deadline cancels this task (asyncio.CancelledError)
+            plan.close()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client: Optional[EverythingClient] = None
+_client_lock = threading.Lock()
+_async_client: Optional[AsyncEverythingClient] = None
+
+
+def get_everything_client() -> EverythingClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = EverythingClient(
+                settings.EVERYTHING_URL,
+                pool_size=settings.EVERYTHING_POOL_SIZE,
+                connect_timeout=settings.EVERYTHING_CONNECT_TIMEOUT,
+                read_timeout=settings.EVERYTHING_READ_TIMEOUT,
+                retries=settings.EVERYTHING_RETRIES,
+                backoff=settings.EVERYTHING_BACKOFF_SECONDS,
+                cache_ttl=settings.EVERYTHING_CACHE_SECONDS,
+                breaker=CircuitBreaker(settings.EVERYTHING_BREAKER_FAILURES,
+                                       settings.EVERYTHING_BREAKER_RESET_SECONDS),
+            )
+        return _client
+
+
+def call_everything(query: str, timeout: Optional[float] = None, deadline: Optional[float] = None,
+                    offset: int = 0, count: Optional[int] = None,
+                    sort: Optional[str] = None, ascending: bool = True):
+    if deadline is None and timeout is not None:
+        deadline = time.monotonic() + timeout
+    return get_everything_client().search(query, deadline=deadline, offset=offset, count=count,
+                                          sort=sort, ascending=ascending)
+
+
+def get_async_everything_client() -> AsyncEverythingClient:
+    global _async_client
+    base = get_everything_client()
+    with _client_lock:
+        if _async_client is None:
+            _async_client = AsyncEverythingClient(base, pool_size=settings.EVERYTHING_POOL_SIZE)
+        return _async_client
+
+
+async def close_async_everything_client():
+    """Close the async client's connections (its pool belongs to the running event loop)."""
+    global _async_client
+    with _client_lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
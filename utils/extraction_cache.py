@@ -0,0 +1,139 @@
+import time
+import zlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key         TEXT PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    accessed_at REAL NOT NULL,
+    data        BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+"""
+
+
+def cache_key(content_hash: str, suffix: str) -> str:
+    """
+    Identical bytes with the same extension always extract to the same
+    text, as long as the extractors and the character cap are unchanged.
+    """
+    from config.settings import settings
+    from utils.whoosh_extractors import EXTRACTOR_VERSION
+    return f"{content_hash}:{suffix.lower()}:v{EXTRACTOR_VERSION}:{settings.MAX_DOCUMENT_CHARS}"
+
+
+class ExtractionCache:
+    """
+    Extracted text keyed by content hash, zlib-compressed in an SQLite
+    database shared by the API process and the extraction workers.
+
+    Once the stored (compressed) size passes `max_bytes`, the least
+    recently read entries are dropped down to `LOW_WATER` of the cap.
+    The cache is best-effort: database errors count as misses.
+    """
+
+    LOW_WATER = 0.9
+    TOUCH_SECONDS = 60.0   # reads refresh accessed_at at most this often
+
+    def __init__(self, db_path: Path, max_bytes: int):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._written = 0   # bytes stored since the last eviction check
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT data, accessed_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                now = time.time()
+                if now - row[1] > self.TOUCH_SECONDS:
+                    self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                self.hits += 1
+            return zlib.decompress(row[0]).decode("utf-8")
+        except (sqlite3.Error, zlib.error, UnicodeDecodeError) as e:
+            print(f"[extract-cache] read failed: {e}")
+            return None
+
+    def put(self, key: str, text: str):
+        data = zlib.compress(text.encode("utf-8"), 6)
+        if len(data) > self.max_bytes * (1 - self.LOW_WATER):
+            return   # one entry would push out a large part of the cache
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, size, accessed_at, data) VALUES (?, ?, ?, ?)",
+                    (key, len(data), time.time(), data),
+                )
+                self._written += len(data)
+                if self._written * 16 >= self.max_bytes:
+                    self._written = 0
+                    self._evict()
+        except sqlite3.Error as e:
+            print(f"[extract-cache] write failed: {e}")
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * self.LOW_WATER)
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        print(f"[extract-cache] evicted {len(doomed)} entries")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,      # this process only; workers keep their own counts
+            "misses": self.misses,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[ExtractionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Process-wide extraction cache; None when EXTRACT_CACHE_MAX_MB is 0."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from config.settings import settings
+            from utils.storage_helper import EXTRACT_CACHE_FILE
+            if settings.EXTRACT_CACHE_MAX_MB <= 0:
+                return None
+            _cache = ExtractionCache(EXTRACT_CACHE_FILE, settings.EXTRACT_CACHE_MAX_MB * 1024 * 1024)
+        return _cache
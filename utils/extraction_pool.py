@@ -0,0 +1,370 @@
+import time
+import atexit
+import hashlib
+import threading
+import multiprocessing
+from multiprocessing.connection import wait as wait_connections
+from collections import deque, namedtuple
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Any
+
+from .whoosh_extractors import EXTRACTORS
+from .extraction_cache import cache_key, get_extraction_cache
+
+# failure reasons that put a file into quarantine
+TIMEOUT = "timeout"
+MEMORY = "memory"
+CRASHED = "crashed"
+TOO_LARGE = "too_large"
+
+# `reason` is None unless the file broke one of the limits above
+ExtractResult = namedtuple("ExtractResult", "path meta text reason content_hash")
+
+
+def hash_file(path_str: str) -> Optional[str]:
+    """Content hash used to recognise identical files (blake2b, 128 bit)."""
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path_str, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def extract_path(path_str: str) -> Optional[str]:
+    """Run the extractor for one file."""
+    path = Path(path_str)
+    extractor = EXTRACTORS.get(path.suffix.lower())
+    if not extractor:
+        return None
+    try:
+        return extractor(path)
+    except MemoryError:
+        raise
+    except Exception:
+        return None
+
+
+def extract_cached(path_str: str, cache) -> Tuple[Optional[str], Optional[str]]:
+    """(text, content_hash) of one file, from `cache` when identical bytes were extracted before."""
+    content_hash = hash_file(path_str)
+    if cache is None or content_hash is None:
+        return extract_path(path_str), content_hash
+    key = cache_key(content_hash, Path(path_str).suffix)
+    text = cache.get(key)
+    if text is None:
+        text = extract_path(path_str)
+        if text is not None:
+            cache.put(key, text)
+    return text, content_hash
+
+
+def _worker_main(conn, max_memory_mb: int, use_cache: bool):
+    """Entry point of an extraction process: receive paths, send back (status, text, hash)."""
+    if max_memory_mb > 0:
+        try:
+            import resource
+            limit = max_memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass  # no address-space limits on this platform
+    cache = get_extraction_cache() if use_cache else None
+
+    while True:
+        try:
+            path_str = conn.recv()
+        except (EOFError, OSError):
+            return
+        if path_str is None:
+            return
+        try:
+            conn.send(("ok", *extract_cached(path_str, cache)))
+        except MemoryError:
+            conn.send((MEMORY, None, None))
+
+
+def parse_worker_map(spec: str) -> Dict[str, int]:
+    """
+    Parse EXTRACT_WORKERS_BY_EXT, e.g. ".pdf:2,.xlsx:1" → {".pdf": 2, ".xlsx": 1}
+    """
+    lanes = {}
+    for part in (spec or "").split(","):
+        if ":" not in part:
+            continue
+        ext, _, n = part.partition(":")
+        ext = ext.strip().lower()
+        if not ext:
+            continue
+        if not ext.startswith("."):
+            ext = "." + ext
+        try:
+            lanes[ext] = max(1, int(n))
+        except ValueError:
+            continue
+    return lanes
+
+
+class _Worker:
+    """One isolated extraction process, fed through a pipe."""
+
+    def __init__(self, ctx, max_memory_mb: int, use_cache: bool):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child, max_memory_mb, use_cache), daemon=True)
+        self.proc.start()
+        child.close()
+
+    def kill(self):
+        try:
+            self.proc.kill()
+            self.proc.join(timeout=5)
+        except Exception:
+            pass
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.proc.join(timeout=1)
+        except Exception:
+            pass
+        if self.proc.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class _Lane:
+    """A fixed number of worker slots; dead workers are respawned on the next acquire."""
+
+    def __init__(self, name: str, workers: int, ctx, max_memory_mb: int, use_cache: bool):
+        self.name = name
+        self.workers = workers
+        self._ctx = ctx
+        self._max_memory_mb = max_memory_mb
+        self._use_cache = use_cache
+        self._idle: List[_Worker] = []
+        self._spawned = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Optional[_Worker]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            if self._spawned >= self.workers:
+                return None
+            self._spawned += 1
+        try:
+            return _Worker(self._ctx, self._max_memory_mb, self._use_cache)
+        except Exception:
+            with self._lock:
+                self._spawned -= 1
+            raise
+
+    def release(self, worker: _Worker):
+        with self._lock:
+            self._idle.append(worker)
+
+    def discard(self, worker: _Worker):
+        worker.kill()
+        with self._lock:
+            self._spawned -= 1
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._spawned -= len(idle)
+        for worker in idle:
+            worker.stop()
+
+
+class ExtractionPool:
+    """
+    Isolated worker processes for CPU-bound text extraction.
+
+    Extensions listed in `per_ext` get their own lane of workers so a few
+    huge PDFs cannot starve small .txt/.csv files; everything else shares
+    the default lane. Every extraction runs under a wall-clock `timeout`
+    and an address-space cap; a worker that overruns, runs out of memory
+    or dies is killed and replaced, and the file is reported with a
+    failure reason so the caller can quarantine it. Files above
+    `max_file_bytes` are never handed to a worker. With `use_cache`, text
+    already extracted from identical bytes is read from the extraction
+    cache instead of parsing the file again.
+
+    At most `max_inflight` extractions are outstanding, and results are
+    yielded as they complete so the caller (the single index writer) only
+    ever holds a bounded amount of text.
+    """
+
+    def __init__(self, workers: int, per_ext: Optional[Dict[str, int]] = None,
+                 max_inflight: Optional[int] = None, timeout: float = 120.0,
+                 max_memory_mb: int = 0, max_file_bytes: int = 0, use_cache: bool = False):
+        self.workers = max(0, workers)
+        self.per_ext = per_ext or {}
+        self.max_inflight = max(1, max_inflight or max(1, self.workers) * 4)
+        self.timeout = timeout
+        self.max_memory_mb = max_memory_mb
+        self.max_file_bytes = max_file_bytes
+        self.use_cache = use_cache
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lanes: Dict[str, _Lane] = {}
+        self._lock = threading.Lock()
+
+    def _lane_for(self, suffix: str) -> _Lane:
+        key = suffix if suffix in self.per_ext else "*"
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = _Lane(key, self.per_ext.get(key, self.workers), self._ctx,
+                             self.max_memory_mb, self.use_cache)
+                self._lanes[key] = lane
+            return lane
+
+    def _too_large(self, path: Path) -> bool:
+        if not self.max_file_bytes:
+            return False
+        try:
+            return path.stat().st_size > self.max_file_bytes
+        except OSError:
+            return False
+
+    def extract(self, path: Path) -> ExtractResult:
+        """Extract a single file (used by the watcher)."""
+        for result in self.map([(path, None)]):
+            return result
+        return ExtractResult(path, None, None, None, None)
+
+    def map(self, items: Iterable[Tuple[Path, Any]]) -> Iterator[ExtractResult]:
+        """
+        Extract `(path, meta)` items in parallel, yielding an ExtractResult
+        per item in completion order. `meta` is passed through untouched;
+        `reason` is None unless the file hit the size cap, the timeout, the
+        memory cap or crashed its worker.
+        """
+        if self.workers == 0:
+            # in-process: no isolation, timeouts are not enforced
+            cache = get_extraction_cache() if self.use_cache else None
+            for path, meta in items:
+                if self._too_large(path):
+                    yield ExtractResult(path, meta, None, TOO_LARGE, None)
+                    continue
+                try:
+                    text, content_hash = extract_cached(str(path), cache)
+                except MemoryError:
+                    yield ExtractResult(path, meta, None, MEMORY, None)
+                    continue
+                yield ExtractResult(path, meta, text, None, content_hash)
+            return
+
+        source = iter(items)
+        exhausted = False
+        queues: Dict[_Lane, deque] = {}
+        buffered = 0
+        busy = {}   # conn -> (lane, worker, path, meta, deadline)
+        # Every lane queues at most this many paths, so a run of slow files
+        # (say PDFs) cannot use up the read-ahead of the other lanes. Items
+        # come in scan order, so reading stops only when the next item's
+        # own lane is full; that item waits in `parked` until it has room.
+        lane_limit = self.max_inflight * 16
+        parked = None   # (lane, path, meta)
+
+        try:
+            while True:
+                ready = []
+
+                while not exhausted:
+                    if parked is None:
+                        try:
+                            path, meta = next(source)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                        if self._too_large(path):
+                            ready.append(ExtractResult(path, meta, None, TOO_LARGE, None))
+                            continue
+                        parked = (self._lane_for(path.suffix.lower()), path, meta)
+                    lane, path, meta = parked
+                    queue = queues.setdefault(lane, deque())
+                    if len(queue) >= lane_limit:
+                        break
+                    queue.append((path, meta))
+                    buffered += 1
+                    parked = None
+
+                for lane, queue in queues.items():
+                    while queue and len(busy) < self.max_inflight:
+                        worker = lane.acquire()
+                        if worker is None:
+                            break
+                        path, meta = queue.popleft()
+                        buffered -= 1
+                        try:
+                            worker.conn.send(str(path))
+                        except Exception:
+                            lane.discard(worker)
+                            ready.append(ExtractResult(path, meta, None, CRASHED, None))
+                            continue
+                        busy[worker.conn] = (lane, worker, path, meta, time.monotonic() + self.timeout)
+
+                yield from ready
+
+                if not busy:
+                    if exhausted and buffered == 0:
+                        return
+                    if buffered:
+                        # every worker is held by another caller; retry shortly
+                        time.sleep(0.05)
+                    continue
+
+                next_deadline = min(entry[4] for entry in busy.values())
+                for conn in wait_connections(list(busy), timeout=max(0.0, next_deadline - time.monotonic())):
+                    lane, worker, path, meta, _ = busy.pop(conn)
+                    try:
+                        status, text, content_hash = conn.recv()
+                    except (EOFError, OSError):
+                        lane.discard(worker)
+                        print(f"[extract] worker died on {path}")
+                        yield ExtractResult(path, meta, None, CRASHED, None)
+                        continue
+                    lane.release(worker)
+                    yield ExtractResult(path, meta, text, None if status == "ok" else status, content_hash)
+
+                now = time.monotonic()
+                for conn in [c for c, entry in busy.items() if entry[4] <= now]:
+                    lane, worker, path, meta, _ = busy.pop(conn)
+                    lane.discard(worker)
+                    print(f"[extract] timed out after {self.timeout}s: {path}")
+                    yield ExtractResult(path, meta, None, TIMEOUT, None)
+        finally:
+            # results of abandoned work must not leak to the next caller
+            for lane, worker, *_ in busy.values():
+                lane.discard(worker)
+
+    def shutdown(self):
+        with self._lock:
+            for lane in self._lanes.values():
+                lane.shutdown()
+            self._lanes.clear()
+
+
+_pool: Optional[ExtractionPool] = None
+
+
+def get_extraction_pool() -> ExtractionPool:
+    """Process-wide extraction pool, created on first use."""
+    global _pool
+    if _pool is None:
+        from config.settings import settings
+        _pool = ExtractionPool(
+            workers=settings.EXTRACT_WORKERS,
+            per_ext=parse_worker_map(settings.EXTRACT_WORKERS_BY_EXT),
+            max_inflight=settings.EXTRACT_MAX_INFLIGHT,
+            timeout=settings.EXTRACT_TIMEOUT_SECONDS,
+            max_memory_mb=settings.EXTRACT_MAX_MEMORY_MB,
+            max_file_bytes=settings.EXTRACT_MAX_FILE_MB * 1024 * 1024,
+            use_cache=settings.EXTRACT_CACHE_MAX_MB > 0,
+        )
+        atexit.register(_pool.shutdown)
+    return _pool
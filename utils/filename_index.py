@@ -0,0 +1,348 @@
+import os
+import re
+import atexit
+import pickle
+import threading
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_EMPTY = array("I")
+
+
+def _grams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class FilenameIndex:
+    """
+    In-process filename index, a local stand-in for Everything.
+
+    Files are stored column-wise: a directory table plus parallel arrays
+    of directory id, name, size and mtime, with a tombstone flag per slot.
+    Lower-cased name trigrams map to array-backed posting lists, so a
+    substring lookup only verifies the files of the needle's rarest
+    trigram instead of scanning every name. Deleted slots are reclaimed by
+    compaction once they make up a quarter of the table.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self._lock = threading.RLock()
+        self._reset()
+        self.version = 0
+        self._saved_version = 0
+        self._file_mtime = None   # of `path` when last loaded/saved
+
+    def _reset(self):
+        self.dirs: List[str] = []
+        self._dir_ids: Dict[str, int] = {}
+        self.dir_of = array("I")
+        self.names: List[str] = []
+        self.sizes = array("q")
+        self.mtimes = array("d")
+        self.alive = bytearray()
+        self.grams: Dict[str, array] = {}
+        self.dead = 0
+
+    def __len__(self) -> int:
+        return len(self.names) - self.dead
+
+    # -------------------------------
+    # Persistence
+    # -------------------------------
+    _FIELDS = ("dirs", "dir_of", "names", "sizes", "mtimes", "alive", "grams", "dead")
+
+    def load(self) -> bool:
+        if not self.path or not self.path.exists():
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f"[filenames] cannot load {self.path}: {e}")
+            return False
+        with self._lock:
+            for name in self._FIELDS:
+                setattr(self, name, state[name])
+            self._dir_ids = {d: i for i, d in enumerate(self.dirs)}
+            self.version += 1
+            self._saved_version = self.version
+            self._file_mtime = self._stat_mtime()
+        return True
+
+    def _stat_mtime(self) -> Optional[int]:
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def reload_if_changed(self) -> bool:
+        """Load `path` again if another process (the index writer) saved it since."""
+        if not self.path or self._stat_mtime() == self._file_mtime:
+            return False
+        return self.load()
+
+    def save(self):
+        """Write the index to `path` if it changed since the last load/save."""
+        if not self.path or self.version == self._saved_version:
+            return
+        with self._lock:
+            self._saved_version = self.version
+            if self.dead * 4 > len(self.names):
+                self._compact()
+            state = {name: getattr(self, name) for name in self._FIELDS}
+            tmp = self.path.with_suffix(".tmp")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp.replace(self.path)
+            self._file_mtime = self._stat_mtime()
+
+    # -------------------------------
+    # Mutation
+    # -------------------------------
+    def _dir_id(self, d: str) -> int:
+        i = self._dir_ids.get(d)
+        if i is None:
+            i = self._dir_ids[d] = len(self.dirs)
+            self.dirs.append(d)
+        return i
+
+    def _find(self, d: str, name: str) -> Optional[int]:
+        dir_id = self._dir_ids.get(d)
+        if dir_id is None:
+            return None
+        lname = name.lower()
+        grams = _grams(lname)
+        candidates = min((self.grams.get(g, _EMPTY) for g in grams), key=len) if grams else range(len(self.names))
+        for i in candidates:
+            if self.alive[i] and self.dir_of[i] == dir_id and self.names[i] == name:
+                return i
+        return None
+
+    def _add(self, d: str, name: str, size: int, mtime: float):
+        i = len(self.names)
+        self.dir_of.append(self._dir_id(d))
+        self.names.append(name)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.alive.append(1)
+        for g in _grams(name.lower()):
+            posting = self.grams.get(g)
+            if posting is None:
+                posting = self.grams[g] = array("I")
+            posting.append(i)
+
+    def _kill(self, i: int):
+        self.alive[i] = 0
+        self.dead += 1
+
+    def upsert(self, path: str, size: int, mtime: float):
+        d, name = os.path.split(path)
+        with self._lock:
+            i = self._find(d, name)
+            if i is None:
+                self._add(d, name, size, mtime)
+            else:
+                self.sizes[i] = size
+                self.mtimes[i] = mtime
+            self.version += 1
+
+    def upsert_path(self, path: str):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        self.upsert(path, st.st_size, st.st_mtime)
+
+    def remove(self, path: str):
+        d, name = os.path.split(path)
+        with self._lock:
+            i = self._find(d, name)
+            if i is not None:
+                self._kill(i)
+                self.version += 1
+
+    def _dir_ids_under(self, root: str) -> Set[int]:
+        prefix = root.rstrip("\\/") + os.sep
+        return {i for i, d in enumerate(self.dirs) if d == root or d.startswith(prefix)}
+
+    def remove_dir(self, root: str):
+        with self._lock:
+            gone = self._dir_ids_under(root)
+            for i in range(len(self.names)):
+                if self.alive[i] and self.dir_of[i] in gone:
+                    self._kill(i)
+            self.version += 1
+
+    def move_dir(self, src: str, dest: str):
+        """Rename a directory subtree in place (only the directory table changes)."""
+        with self._lock:
+            for i in self._dir_ids_under(src):
+                new = dest + self.dirs[i][len(src):]
+                del self._dir_ids[self.dirs[i]]
+                self.dirs[i] = new
+                self._dir_ids[new] = i
+            self.version += 1
+
+    def sync_folder(self, root: str, files: Dict[str, Tuple[int, float]],
+                    scanned_dirs: Iterable[str], pruned_dirs: Iterable[str] = ()):
+        """
+        Make the entries under `root` match one scan of it. `files` maps
+        path → (size, mtime) for every file listed; files of `pruned_dirs`
+        and of directories that could not be listed are kept as they are.
+        """
+        files = dict(files)
+        scanned_dirs = set(scanned_dirs)
+        keep_dirs = set(pruned_dirs)
+        exists = {}
+        with self._lock:
+            under = self._dir_ids_under(root)
+            for i in range(len(self.names)):
+                if not self.alive[i] or self.dir_of[i] not in under:
+                    continue
+                d = self.dirs[self.dir_of[i]]
+                if d in keep_dirs:
+                    continue
+                if d not in scanned_dirs:
+                    # not listed: either gone, or unreadable this time (then keep it)
+                    if d not in exists:
+                        exists[d] = os.path.isdir(d)
+                    if exists[d]:
+                        continue
+                path = os.path.join(d, self.names[i])
+                stat = files.pop(path, None)
+                if stat is None:
+                    self._kill(i)
+                else:
+                    self.sizes[i], self.mtimes[i] = stat
+            for path, (size, mtime) in files.items():
+                d, name = os.path.split(path)
+                self._add(d, name, size, mtime)
+            self.version += 1
+
+    def _compact(self):
+        live = [i for i in range(len(self.names)) if self.alive[i]]
+        old = (self.dirs, self.dir_of, self.names, self.sizes, self.mtimes)
+        self._reset()
+        dirs, dir_of, names, sizes, mtimes = old
+        for i in live:
+            self._add(dirs[dir_of[i]], names[i], sizes[i], mtimes[i])
+
+    # -------------------------------
+    # Search
+    # -------------------------------
+    def _matches(self, term: str, case_sensitive: bool, whole_word: bool):
+        lterm = term.lower()
+        grams = _grams(lterm)
+        candidates = min((self.grams.get(g, _EMPTY) for g in grams), key=len) if grams else range(len(self.names))
+        if whole_word:
+            flags = 0 if case_sensitive else re.IGNORECASE
+            rx = re.compile(r"(?<!\w)" + re.escape(term) + r"(?!\w)", flags)
+            return (i for i in candidates if rx.search(self.names[i]))
+        if case_sensitive:
+            return (i for i in candidates if term in self.names[i])
+        return (i for i in candidates if lterm in self.names[i].lower())
+
+    def search(self, terms: List[str], case_sensitive: bool = False, whole_word: bool = False,
+               exts: Optional[Iterable[str]] = None,
+               date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+               size_from: Optional[int] = None, size_to: Optional[int] = None,
+               sort: Optional[str] = None, ascending: bool = True,
+               offset: int = 0, limit: int = 100) -> Tuple[List[dict], bool]:
+        """
+        Files whose name contains any of `terms`, filtered like filename
+        search. Returns one page of rows and whether more rows follow.
+        Without `sort`, rows come in index order and matching stops as
+        soon as the page is full.
+        """
+        exts = {"." + e.lower().lstrip(".") for e in exts} if exts else None
+        t_from = date_from.timestamp() if date_from else None
+        t_to = date_to.timestamp() if date_to else None
+        want = offset + limit + 1
+
+        with self._lock:
+            def ok(i):
+                if not self.alive[i]:
+                    return False
+                if size_from is not None and self.sizes[i] < size_from:
+                    return False
+                if size_to is not None and self.sizes[i] > size_to:
+                    return False
+                if t_from is not None and self.mtimes[i] < t_from:
+                    return False
+                if t_to is not None and self.mtimes[i] > t_to:
+                    return False
+                if exts and os.path.splitext(self.names[i])[1].lower() not in exts:
+                    return False
+                return True
+
+            if len(terms) == 1 and sort is None:
+                ids = []
+                for i in self._matches(terms[0], case_sensitive, whole_word):
+                    if ok(i):
+                        ids.append(i)
+                        if len(ids) >= want:
+                            break
+            else:
+                found = set()
+                for term in terms:
+                    found.update(i for i in self._matches(term, case_sensitive, whole_word) if ok(i))
+                ids = sorted(found, key=self._sort_key(sort), reverse=not ascending) if sort else sorted(found)
+
+            page = ids[offset:offset + limit]
+            rows = [self._row(i) for i in page]
+            return rows, len(ids) > offset + limit
+
+    def _sort_key(self, sort: str):
+        if sort == "size":
+            return lambda i: self.sizes[i]
+        if sort == "date_modified":
+            return lambda i: self.mtimes[i]
+        if sort == "path":
+            return lambda i: (self.dirs[self.dir_of[i]].lower(), self.names[i].lower())
+        return lambda i: self.names[i].lower()
+
+    def _row(self, i: int) -> dict:
+        size = self.sizes[i]
+        return {
+            "file_name": self.names[i],
+            "path": os.path.join(self.dirs[self.dir_of[i]], self.names[i]),
+            "size_kb": int(size / 1024) if size else None,
+            "modified": datetime.fromtimestamp(self.mtimes[i]).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self),
+            "dead_slots": self.dead,
+            "dirs": len(self.dirs),
+            "trigrams": len(self.grams),
+            "version": self.version,
+        }
+
+
+_index: Optional[FilenameIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_filename_index() -> FilenameIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            from utils.storage_helper import FILENAME_INDEX_FILE
+            _index = FilenameIndex(FILENAME_INDEX_FILE)
+            _index.load()
+            # watcher updates since the last folder scan are written on shutdown
+            atexit.register(_index.save)
+        return _index
+
+
+def reload_filename_index():
+    """Read-only processes: pick up the index the writer saved, if this process has loaded one."""
+    with _index_lock:
+        index = _index
+    if index is not None:
+        index.reload_if_changed()
@@ -0,0 +1,119 @@
+import os
+from collections import defaultdict, namedtuple
+from fnmatch import fnmatch
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+ScanEntry = namedtuple("ScanEntry", "path ext stat")
+
+
+def parse_excludes(spec: str) -> List[str]:
+    return [p.strip() for p in (spec or "").split(",") if p.strip()]
+
+
+class FolderScanner:
+    """
+    Single-pass os.scandir walk of an indexed folder.
+
+    Yields a ScanEntry for every file with one of the wanted extensions
+    (every file when `exts` is None), reusing the DirEntry stat result,
+    and records every visited directory's st_mtime_ns in `dirs`. Names matching an exclude glob (".git",
+    "node_modules", "~$*", ...) are skipped together with their subtree.
+
+    With `prune_unchanged_dirs`, a directory whose mtime equals the stored
+    one is not listed again: its known files are taken from the state store
+    and only its known subdirectories are visited. A directory mtime only
+    changes when entries are added, removed or renamed, so in-place edits
+    inside a pruned directory are left to the watcher.
+    """
+
+    def __init__(self, excludes: Optional[Iterable[str]] = None, prune_unchanged_dirs: bool = False):
+        self.excludes = list(excludes or [])
+        self.prune_unchanged_dirs = prune_unchanged_dirs
+        self.seen: Set[str] = set()
+        self.dirs: Dict[str, int] = {}
+        self.pruned = 0
+        self.pruned_dirs: Set[str] = set()
+
+    def _excluded(self, name: str) -> bool:
+        return any(fnmatch(name, pattern) for pattern in self.excludes)
+
+    def scan(self, root: str, exts: Optional[Set[str]],
+             known_files: Optional[Iterable[str]] = None,
+             known_dirs: Optional[Dict[str, int]] = None) -> Iterator[ScanEntry]:
+        """
+        Walk `root`. `known_files` / `known_dirs` (path → mtime_ns) come from
+        the state store and are only consulted when pruning. After the
+        generator is exhausted, `seen` holds every matching file path under
+        `root`, including files of pruned directories.
+        """
+        self.seen = set()
+        self.dirs = {}
+        self.pruned = 0
+        self.pruned_dirs = set()
+        known_files = list(known_files or [])
+        known_dirs = known_dirs or {}
+
+        files_by_dir = defaultdict(list)
+        children = defaultdict(list)
+        if self.prune_unchanged_dirs:
+            for path in known_files:
+                files_by_dir[os.path.dirname(path)].append(path)
+            for path in known_dirs:
+                children[os.path.dirname(path)].append(path)
+
+        try:
+            stack = [(root, os.stat(root).st_mtime_ns)]
+        except OSError:
+            return
+
+        while stack:
+            d, mtime_ns = stack.pop()
+            self.dirs[d] = mtime_ns
+
+            if self.prune_unchanged_dirs and known_dirs.get(d) == mtime_ns:
+                self.pruned += 1
+                self.pruned_dirs.add(d)
+                self.seen.update(files_by_dir.get(d, ()))
+                for child in children.get(d, ()):
+                    if self._excluded(os.path.basename(child)):
+                        continue
+                    try:
+                        stack.append((child, os.stat(child).st_mtime_ns))
+                    except OSError:
+                        continue
+                continue
+
+            try:
+                it = os.scandir(d)
+            except OSError as e:
+                # keep what we knew about an unreadable directory instead of deleting it
+                print(f"[scan] cannot list {d}: {e}")
+                prefix = d.rstrip("\\/") + os.sep
+                self.seen.update(p for p in known_files if p.startswith(prefix))
+                self.dirs.pop(d, None)
+                continue
+
+            with it:
+                for entry in it:
+                    name = entry.name
+                    if self._excluded(name):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, entry.stat(follow_symlinks=False).st_mtime_ns))
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+
+                    ext = os.path.splitext(name)[1].lower()
+                    if exts is not None and ext not in exts:
+                        continue
+                    self.seen.add(entry.path)
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        self.dirs.pop(d, None)  # list this directory again next time
+                        continue
+                    yield ScanEntry(entry.path, ext, st)
@@ -0,0 +1,171 @@
+import os
+import time
+import threading
+from pathlib import Path
+from typing import Optional
+
+from config.settings import settings
+from utils.writer_lease import WriterLease
+
+_indexer = None
+_lease: Optional[WriterLease] = None
+_lock = threading.Lock()
+
+
+def _pointer_file(root: str) -> Path:
+    return Path(root).with_name(Path(root).name + ".active")
+
+
+def active_index_dir(root: str = None) -> str:
+    """
+    The directory currently serving as the index for `root`
+    (settings.WHOOSH_INDEX_PATH). A rebuild fills a sibling directory and
+    then points `<root>.active` at it; without that file it is `root`.
+    """
+    root = root or settings.WHOOSH_INDEX_PATH
+    pointer = _pointer_file(root)
+    if pointer.exists():
+        target = pointer.read_text(encoding="utf-8").strip()
+        if target and Path(target).is_dir():
+            return target
+    return root
+
+
+def set_active_index_dir(index_dir: str, root: str = None):
+    """Atomically repoint `root` at `index_dir`."""
+    pointer = _pointer_file(root or settings.WHOOSH_INDEX_PATH)
+    tmp = pointer.with_name(pointer.name + ".tmp")
+    tmp.write_text(str(index_dir), encoding="utf-8")
+    os.replace(tmp, pointer)
+
+
+def _open_indexer(index_dir: str, read_only: bool):
+    from utils.sharded_indexer import ShardedIndexer, is_sharded
+    if settings.INDEX_SHARDING or is_sharded(index_dir):
+        return ShardedIndexer(index_dir=index_dir, read_only=read_only)
+    from utils.whoosh_indexer import WhooshIndexer
+    return WhooshIndexer(index_dir=index_dir, read_only=read_only)
+
+
+def _writer_lease() -> Optional[WriterLease]:
+    """The lock electing the writer among processes sharing the index (None without INDEX_WRITER_ELECTION)."""
+    global _lease
+    if _lease is None and settings.INDEX_WRITER_ELECTION:
+        root = Path(settings.WHOOSH_INDEX_PATH)
+        _lease = WriterLease(root.with_name(root.name + ".writer.lock"))
+    return _lease
+
+
+def get_indexer():
+    """
+    The process-wide WhooshIndexer for the active index directory (a
+    ShardedIndexer when INDEX_SHARDING is set or the index is already sharded).
+
+    Indexing and search routes share this one instance, so they share its
+    write lock, writer service and warm searchers, and searches see
+    commits from the indexing side as soon as they land.
+
+    With INDEX_WRITER_ELECTION, only the process holding the writer lease
+    opens it for writing. Others open it read-only and follow the writer
+    from a background thread (see _follow).
+    """
+    global _indexer
+    with _lock:
+        if _indexer is None:
+            lease = _writer_lease()
+            read_only = lease is not None and not lease.try_acquire()
+            if read_only:
+                print(f"[writer] {lease.describe_holder()} writes the index;"
+                      f" pid {os.getpid()} searches it read-only")
+            elif lease is not None:
+                print(f"[writer] pid {os.getpid()} is the index writer")
+            _indexer = _open_indexer(active_index_dir(), read_only)
+            if read_only:
+                threading.Thread(target=_follow, args=(_indexer, lease),
+                                 name="index-follower", daemon=True).start()
+        return _indexer
+
+
+def is_writer() -> bool:
+    """True unless this process searches an index another process writes."""
+    return not get_indexer().read_only
+
+
+def writer_role() -> dict:
+    lease = _writer_lease()
+    return {
+        "election": lease is not None,
+        "writer": is_writer(),
+        "pid": os.getpid(),
+        "holder": lease.holder() if lease else None,
+    }
+
+
+# -------------------------------
+# Read-only processes
+# -------------------------------
+def _follow(indexer, lease: WriterLease):
+    """
+    Keep a read-only indexer up with the writer: reopen after a rebuild
+    moved the index to another directory, pick up new shards, schemas and
+    spelling dictionaries, and reload the local filename index when the
+    writer saves it. Searchers see new generations by themselves (see
+    SearcherManager). Once the writer's lock is free, this process takes
+    over as the writer.
+    """
+    while True:
+        time.sleep(settings.SEARCHER_REFRESH_SECONDS)
+        try:
+            if lease.try_acquire():
+                _promote(indexer)
+                return
+            if Path(active_index_dir()).resolve() != Path(indexer.index_dir).resolve():
+                print(f"[writer] the writer now serves {active_index_dir()}, reopening")
+                _reopen(indexer, read_only=True)
+            indexer.follow_writer()
+            if settings.FILENAME_BACKEND == "local":
+                from utils.filename_index import reload_filename_index
+                reload_filename_index()
+        except Exception as e:
+            print(f"[writer] following the writer failed: {e}")
+
+
+def _promote(indexer):
+    """Become the writer: reopen the index for writing and start what only the writer runs."""
+    print(f"[writer] pid {os.getpid()} took over as the index writer")
+    _reopen(indexer, read_only=False)
+    from utils.job_scheduler import get_job_scheduler
+    get_job_scheduler().start()
+    if settings.ENABLE_WATCHER:
+        from utils.storage_helper import read_indexed_folders
+        # every indexed folder, as indexing them at startup does
+        for folder in read_indexed_folders():
+            if Path(folder).is_dir():
+                indexer.start_watching(str(Path(folder).resolve()))
+
+
+def _reopen(indexer, read_only: bool):
+    """Serve a freshly opened index of the active directory; the old one closes once idle."""
+    fresh = _open_indexer(active_index_dir(), read_only)
+    with indexer.frozen_writes():
+        retired = indexer.adopt(fresh)
+        indexer.schema = fresh.schema
+        indexer.read_only = read_only
+    threading.Thread(target=_close_retired, args=(retired,), name="index-drain", daemon=True).start()
+
+
+def _close_retired(retired: list, timeout: float = 60.0):
+    for searchers, _ in retired:
+        searchers.retire()
+    for searchers, ix in retired:
+        searchers.drain(timeout)
+        searchers.close()
+        ix.close()
+
+
+def close_indexer():
+    global _indexer
+    with _lock:
+        if _indexer is not None:
+            _indexer.close()
+            _indexer = None
@@ -0,0 +1,321 @@
+import time
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.extraction_pool import get_extraction_pool
+from utils.fs_scanner import FolderScanner, parse_excludes
+from utils.schema_migration import file_docs, iter_stored_files
+from utils.state_store import get_state_store, QUARANTINED
+from utils.storage_helper import read_indexed_folders
+from utils.whoosh_extractors import EXTRACTORS
+from utils.whoosh_indexer import IndexProgress, IndexCancelled, ReadOnlyIndex
+
+SOURCES = ("disk", "index")
+
+RUNNING = "running"
+SWAPPING = "swapping"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class IndexRebuild(IndexProgress):
+    """Progress and outcome of one rebuild; cancel() stops it at the next file."""
+
+    def __init__(self, source: str):
+        super().__init__()
+        self.source = source
+        self.status = RUNNING
+        self.shadow_dir: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.replayed = 0
+        self.error: Optional[str] = None
+        self._cancel = False
+
+    def checkpoint(self):
+        if self._cancel:
+            raise IndexCancelled(CANCELLED)
+
+    def cancel(self):
+        self._cancel = True
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "source": self.source,
+            "status": self.status,
+            "shadow_dir": self.shadow_dir,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(end - self.started_at, 3),
+            "progress": {
+                "files_scanned": self.scanned,
+                "files_extracted": self.extracted,
+                "docs_written": self.committed,
+                "bytes": self.bytes,
+                "errors": self.errors,
+                "scan_complete": self.scan_complete,
+                "replayed": self.replayed,
+            },
+            "error": self.error,
+        }
+
+
+class _DeferredQuarantine:
+    """Stands in for the state store in _apply_result: quarantines wait for the swap like every other row."""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def quarantine(self, path: str, mtime_ns: int, size: int, reason: str):
+        print(f"[quarantine] {reason}: {path}")
+        self.rows.append((path, mtime_ns, size, None, QUARANTINED, reason))
+
+
+class IndexRebuilder:
+    """
+    Rebuilds the whole index without taking search offline.
+
+    A shadow index of the same layout is filled in a sibling directory,
+    either by extracting every file of the indexed folders again
+    ("disk", also the way out of a corrupted index) or by copying the
+    stored documents of the live index ("index", enough for analyzer or
+    schema changes). The live index keeps serving and taking writes
+    meanwhile; every path it commits is journaled and copied over from it
+    afterwards. The final catch-up and the swap run with in-process
+    writers held off between batches; `<index>.active` is then pointed at
+    the new directory. Searches already running finish on the old index,
+    whose directory is deleted once its searchers have drained.
+    """
+
+    CATCH_UP_ROUNDS = 5
+    CATCH_UP_SMALL = 200       # journal size that is replayed with writers held off
+    DRAIN_SECONDS = 60.0
+
+    def __init__(self, indexer):
+        self.indexer = indexer
+        self.current: Optional[IndexRebuild] = None
+        self._lock = threading.Lock()
+
+    def start(self, source: str = "disk") -> IndexRebuild:
+        if source not in SOURCES:
+            raise ValueError(f"unknown rebuild source {source!r} (expected one of {', '.join(SOURCES)})")
+        if source == "index" and not self.indexer.stores_content():
+            raise ValueError("the index stores no document text (INDEX_CONTENT_STORE); rebuild from disk")
+        if self.indexer.read_only:
+            from utils.index_manager import writer_role
+            holder = writer_role()["holder"] or {}
+            raise ReadOnlyIndex(f"rebuilds run in the index writer process (pid {holder.get('pid')})")
+        with self._lock:
+            if self.current and self.current.status in (RUNNING, SWAPPING):
+                raise RuntimeError("a rebuild is already running")
+            self.current = IndexRebuild(source)
+        threading.Thread(target=self._run, args=(self.current,), name="index-rebuild", daemon=True).start()
+        return self.current
+
+    def cancel(self) -> IndexRebuild:
+        rb = self.current
+        if rb is None or rb.status != RUNNING:
+            raise RuntimeError("no rebuild is running")
+        rb.cancel()
+        return rb
+
+    # -------------------------------
+    # Run
+    # -------------------------------
+    def _shadow_dir(self) -> Path:
+        from utils.index_manager import active_index_dir
+        from config.settings import settings
+        root = Path(settings.WHOOSH_INDEX_PATH)
+        active = Path(active_index_dir()).resolve()
+        # leftovers of rebuilds that did not finish
+        for old in root.parent.glob(root.name + ".r*"):
+            if old.is_dir() and old.resolve() != active:
+                shutil.rmtree(old, ignore_errors=True)
+        return root.with_name(f"{root.name}.r{time.strftime('%Y%m%d-%H%M%S')}")
+
+    def _run(self, rb: IndexRebuild):
+        from utils.index_manager import set_active_index_dir
+        indexer = self.indexer
+        shadow = None
+        swapped = False
+        replayed_paths: Set[str] = set()
+        print(f"[rebuild] started from {rb.source}")
+        try:
+            shadow_dir = self._shadow_dir()
+            rb.shadow_dir = str(shadow_dir)
+            indexer.start_journal()
+            shadow = indexer.shadow(str(shadow_dir))
+
+            if rb.source == "disk":
+                rows, scans = self._build_from_disk(shadow, rb)
+            else:
+                rows, scans = [], {}
+                self._build_from_index(shadow, rb)
+
+            # catch up with the live index until what is left is small
+            for _ in range(self.CATCH_UP_ROUNDS):
+                paths = indexer.take_journal()
+                replayed_paths |= paths
+                self._replay(shadow, paths, rb)
+                if len(paths) <= self.CATCH_UP_SMALL:
+                    break
+            shadow.suggester.schedule_rebuild()
+            shadow.suggester.wait()
+
+            rb.status = SWAPPING
+            with indexer.frozen_writes():
+                paths = indexer.take_journal()
+                replayed_paths |= paths
+                self._replay(shadow, paths, rb)
+                indexer.stop_journal()
+                old_dir = indexer.index_dir
+                retired = indexer.adopt(shadow)
+                swapped = True   # the shadow is the live index now: never delete it below
+                set_active_index_dir(str(shadow_dir))
+            indexer.searchers.mark_stale()
+            indexer.suggester.schedule_rebuild()
+            print(f"[rebuild] now serving {shadow_dir}")
+            threading.Thread(target=self._drain, args=(retired, old_dir), name="index-drain", daemon=True).start()
+
+            if rb.source == "disk":
+                self._store_state(rows, scans, replayed_paths)
+            rb.status = COMPLETED
+        except IndexCancelled:
+            rb.status = CANCELLED
+        except Exception as e:
+            rb.status = FAILED
+            rb.error = str(e)
+            if swapped:
+                # `.active` still names the old directory, so both are kept
+                rb.error = f"now serving {rb.shadow_dir}, but {e}; the old index at {old_dir} was kept"
+            print(f"[rebuild] failed: {rb.error}")
+        finally:
+            if not swapped:
+                indexer.stop_journal()
+                if shadow is not None:
+                    shadow.close()
+                if rb.shadow_dir:
+                    shutil.rmtree(rb.shadow_dir, ignore_errors=True)
+            rb.finished_at = time.time()
+        print(f"[rebuild] {rb.status} after {rb.finished_at - rb.started_at:.1f}s")
+
+    def _build_from_disk(self, shadow, rb: IndexRebuild) -> Tuple[list, Dict[str, tuple]]:
+        from config.settings import settings
+        rows: List[tuple] = []
+        sink = _DeferredQuarantine(rows)
+        scans: Dict[str, tuple] = {}
+        bulk = shadow.bulk_writer()
+        try:
+            for folder in read_indexed_folders():
+                p = Path(folder)
+                if not p.is_dir():
+                    continue
+                p = p.resolve()
+                shadow.register_folder(str(p))
+                scanner = FolderScanner(excludes=parse_excludes(settings.SCAN_EXCLUDE))
+
+                def files():
+                    for entry in scanner.scan(str(p), set(EXTRACTORS.keys())):
+                        if not EXTRACTORS.get(entry.ext):
+                            continue
+                        rb.scanned += 1
+                        rb.changed += 1
+                        rb.checkpoint()
+                        yield Path(entry.path), (entry.stat, None)
+
+                for result in get_extraction_pool().map(files()):
+                    status = shadow._apply_result(bulk, sink, result, rows)
+                    rb.extracted += 1
+                    rb.committed = bulk.docs
+                    rb.bytes = bulk.bytes
+                    if status in ("failed", QUARANTINED):
+                        rb.errors += 1
+                    rb.checkpoint()
+                scans[str(p)] = (set(scanner.seen), dict(scanner.dirs))
+            rb.scan_complete = True
+            bulk.close()
+        except BaseException:
+            bulk.cancel()
+            raise
+        return rows, scans
+
+    def _build_from_index(self, shadow, rb: IndexRebuild):
+        bulk = shadow.bulk_writer()
+        try:
+            with self.indexer.reader() as reader:
+                for stored in iter_stored_files(reader):
+                    docs = file_docs(stored, shadow.schema)
+                    if docs:
+                        bulk.replace(docs[0]["path"], docs)
+                    rb.scanned += 1
+                    rb.committed = bulk.docs
+                    rb.checkpoint()
+            rb.scan_complete = True
+            bulk.close()
+        except BaseException:
+            bulk.cancel()
+            raise
+
+    def _replay(self, shadow, paths: Set[str], rb: IndexRebuild):
+        """Make `paths` in the shadow match the live index."""
+        if not paths:
+            return
+        bulk = shadow.bulk_writer()
+        try:
+            for path in paths:
+                stored = self.indexer._stored_docs(path)
+                docs = file_docs(stored, shadow.schema) if stored else None
+                if docs:
+                    bulk.replace(path, docs)
+                else:
+                    bulk.delete(path)
+                rb.replayed += 1
+            bulk.close()
+        except BaseException:
+            bulk.cancel()
+            raise
+
+    @staticmethod
+    def _store_state(rows: list, scans: Dict[str, tuple], replayed: Set[str]):
+        """Per-file state for what the rebuild extracted; journaled paths already have newer rows."""
+        store = get_state_store()
+        store.upsert_many(r for r in rows if r[0] not in replayed)
+        for folder, (seen, dirs) in scans.items():
+            stale = [path for path in store.snapshot(folder) if path not in seen and path not in replayed]
+            store.delete_many(stale)
+            store.replace_dirs(folder, dirs)
+
+    def _drain(self, retired: list, old_dir: Path):
+        for searchers, _ in retired:
+            searchers.retire()
+        for searchers, ix in retired:
+            if not searchers.drain(self.DRAIN_SECONDS):
+                print(f"[rebuild] {searchers.leased} searchers still busy on the old index, closing anyway")
+            searchers.close()
+            ix.close()
+        from config.settings import settings
+        if settings.INDEX_WRITER_ELECTION:
+            # read-only processes notice the new directory within a refresh, then drain like this one
+            time.sleep(settings.SEARCHER_REFRESH_SECONDS * 2 + self.DRAIN_SECONDS)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        print(f"[rebuild] removed old index {old_dir}")
+
+    def stats(self) -> Optional[dict]:
+        return self.current.to_dict() if self.current else None
+
+
+_rebuilder: Optional[IndexRebuilder] = None
+_rebuilder_lock = threading.Lock()
+
+
+def get_rebuilder() -> IndexRebuilder:
+    global _rebuilder
+    with _rebuilder_lock:
+        if _rebuilder is None:
+            from utils.index_manager import get_indexer
+            _rebuilder = IndexRebuilder(get_indexer())
+        return _rebuilder
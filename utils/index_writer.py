@@ -0,0 +1,200 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.extraction_pool import get_extraction_pool
+from utils.state_store import get_state_store, INDEXED
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+class _Pending:
+    __slots__ = ("op", "first_seen", "last_seen")
+
+    def __init__(self, op: str, now: float):
+        self.op = op
+        self.first_seen = now
+        self.last_seen = now
+
+
+class IndexWriterService:
+    """
+    Single background thread that owns watcher-driven index writes.
+
+    Events are queued per path. A burst of events for the same path
+    collapses into one pending operation (the last one wins: created →
+    modified → deleted is a delete, deleted → created is an upsert). A path
+    becomes due once it has been quiet for `debounce` seconds, or after
+    `max_delay` seconds at the latest; due paths are extracted through the
+    extraction pool and applied in one batched commit of up to `max_batch`
+    files.
+    """
+
+    def __init__(self, indexer, debounce: float = 2.0, max_delay: float = 30.0, max_batch: int = 500):
+        self.indexer = indexer
+        self.debounce = debounce
+        self.max_delay = max(max_delay, debounce)
+        self.max_batch = max(1, max_batch)
+
+        self._pending: "OrderedDict[str, _Pending]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.events_received = 0
+        self.events_coalesced = 0
+        self.batches = 0
+        self.docs_indexed = 0
+        self.docs_deleted = 0
+        self.errors = 0
+        self.last_batch_seconds = 0.0
+        self.last_batch_lag_seconds = 0.0
+
+    # -------------------------------
+    # Lifecycle
+    # -------------------------------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    # -------------------------------
+    # Queue
+    # -------------------------------
+    def submit(self, op: str, path: str):
+        now = time.monotonic()
+        with self._cond:
+            self.events_received += 1
+            entry = self._pending.get(path)
+            if entry:
+                self.events_coalesced += 1
+                entry.op = op
+                entry.last_seen = now
+            else:
+                self._pending[path] = _Pending(op, now)
+            self._cond.notify()
+
+    def _take_due(self) -> Dict[str, _Pending]:
+        """Wait until at least one path is due and pop up to max_batch due paths."""
+        with self._cond:
+            while not self._stopping:
+                now = time.monotonic()
+                due = {}
+                next_due = None
+                for path, entry in self._pending.items():
+                    ready_at = min(entry.last_seen + self.debounce, entry.first_seen + self.max_delay)
+                    if ready_at <= now:
+                        due[path] = entry
+                        if len(due) >= self.max_batch:
+                            break
+                    elif next_due is None or ready_at < next_due:
+                        next_due = ready_at
+                if due:
+                    for path in due:
+                        del self._pending[path]
+                    return due
+                self._cond.wait(None if next_due is None else next_due - now)
+            return {}
+
+    # -------------------------------
+    # Writer loop
+    # -------------------------------
+    def _run(self):
+        while True:
+            due = self._take_due()
+            if not due:
+                return
+            started = time.perf_counter()
+            oldest = min(entry.first_seen for entry in due.values())
+            try:
+                self._apply(due)
+            except Exception as e:
+                self.errors += 1
+                print(f"[writer] batch of {len(due)} failed: {e}")
+            self.batches += 1
+            self.last_batch_seconds = round(time.perf_counter() - started, 3)
+            self.last_batch_lag_seconds = round(time.monotonic() - oldest, 3)
+
+    def _apply(self, due: Dict[str, _Pending]):
+        store = get_state_store()
+        pending_rows: List[tuple] = []
+        pending_deletes: List[str] = []
+
+        def flush_state():
+            if pending_rows:
+                store.upsert_many(pending_rows)
+                pending_rows.clear()
+            if pending_deletes:
+                store.delete_many(pending_deletes)
+                pending_deletes.clear()
+
+        def changed():
+            for path, entry in due.items():
+                if entry.op != UPSERT:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # gone again before we got to it; a delete event follows
+                state = store.get(path)
+                if state and state.mtime_ns == st.st_mtime_ns and state.size == st.st_size:
+                    continue
+                yield Path(path), (st, state)
+
+        bulk = self.indexer.bulk_writer(on_commit=flush_state)
+        try:
+            for result in get_extraction_pool().map(changed()):
+                if self.indexer._apply_result(bulk, store, result, pending_rows) == INDEXED:
+                    self.docs_indexed += 1
+
+            for path, entry in due.items():
+                if entry.op != DELETE:
+                    continue
+                pending_deletes.append(path)
+                # a file removed before it was ever indexed needs no index write
+                if self.indexer._stored_doc(path) is not None:
+                    bulk.delete(path)
+                    self.docs_deleted += 1
+
+            bulk.close()
+        except Exception:
+            bulk.cancel()
+            raise
+        # bookkeeping of a batch that left the index untouched (no commit ran it)
+        flush_state()
+
+        if bulk.commits:
+            self.indexer.suggester.schedule_rebuild()
+
+    # -------------------------------
+    # Metrics
+    # -------------------------------
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            depth = len(self._pending)
+            lag = now - min(e.first_seen for e in self._pending.values()) if depth else 0.0
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "queue_depth": depth,
+            "queue_lag_seconds": round(lag, 3),
+            "events_received": self.events_received,
+            "events_coalesced": self.events_coalesced,
+            "batches": self.batches,
+            "docs_indexed": self.docs_indexed,
+            "docs_deleted": self.docs_deleted,
+            "errors": self.errors,
+            "last_batch_seconds": self.last_batch_seconds,
+            "last_batch_lag_seconds": self.last_batch_lag_seconds,
+        }
@@ -0,0 +1,385 @@
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+from typing import List, Optional
+
+from utils.state_store import get_state_store
+from utils.whoosh_indexer import IndexProgress, IndexCancelled
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+COMPLETED = "completed"
+FAILED = "failed"
+
+FINISHED = (CANCELLED, COMPLETED, FAILED)
+
+
+class IndexJob(IndexProgress):
+    """
+    One queued/running index_folder run. Pausing and cancelling both stop
+    the run at the next file boundary with the finished files committed;
+    a paused job is queued again on resume and skips what is already
+    recorded in the state store.
+
+    Throughput (docs/s, MB/s) is part of the progress payload while the
+    job runs, and of `result` (index_folder's run stats) once it completes;
+    /api/add-folder only reports it inline with `wait`.
+    """
+
+    PERSIST_INTERVAL = 2.0
+
+    def __init__(self, job_id: str, folder: str, status: str = QUEUED,
+                 created_at: Optional[float] = None, store=None):
+        super().__init__()
+        self.id = job_id
+        self.folder = folder
+        self.status = status
+        self.created_at = created_at or time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None   # end of the last run, also when paused
+        self.runs = 0
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.store = store
+        self._stop: Optional[str] = None   # PAUSED or CANCELLED once requested
+        self._persisted_at = 0.0
+
+    # -------------------------------
+    # IndexProgress hooks
+    # -------------------------------
+    def checkpoint(self):
+        if self._stop:
+            raise IndexCancelled(self._stop)
+        if time.monotonic() - self._persisted_at >= self.PERSIST_INTERVAL:
+            self.persist()
+
+    def request_stop(self, status: str):
+        self._stop = status
+
+    # -------------------------------
+    # Reporting / persistence
+    # -------------------------------
+    def eta_seconds(self) -> Optional[float]:
+        """Remaining extraction time, known once the scan has finished."""
+        if self.status != RUNNING or not self.scan_complete or not self.started_at or not self.extracted:
+            return None
+        rate = self.extracted / max(time.time() - self.started_at, 1e-6)
+        return round((self.changed - self.extracted) / rate, 1)
+
+    def run_seconds(self) -> Optional[float]:
+        """Length of the current (or last) run."""
+        if not self.started_at:
+            return None
+        return max((self.stopped_at or time.time()) - self.started_at, 1e-6)
+
+    def throughput(self) -> dict:
+        secs = self.run_seconds()
+        if secs is None:
+            return {"docs_per_sec": None, "mb_per_sec": None}
+        return {
+            "docs_per_sec": round(self.extracted / secs, 2),
+            "mb_per_sec": round(self.bytes / (1024 * 1024) / secs, 2),
+        }
+
+    def to_dict(self) -> dict:
+        secs = self.run_seconds()
+        return {
+            "job_id": self.id,
+            "folder": self.folder,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stopped_at": self.stopped_at,
+            "elapsed_seconds": round(secs, 3) if secs is not None else None,
+            "eta_seconds": self.eta_seconds(),
+            "runs": self.runs,
+            "progress": {
+                "files_scanned": self.scanned,
+                "files_changed": self.changed,
+                "files_extracted": self.extracted,
+                "files_committed": self.committed,
+                "files_removed": self.removed,
+                "bytes": self.bytes,
+                "errors": self.errors,
+                "scan_complete": self.scan_complete,
+                **self.throughput(),
+            },
+            "result": self.result,
+            "error": self.error,
+        }
+
+    def persist(self):
+        self._persisted_at = time.monotonic()
+        if self.store is None:
+            return
+        data = self.to_dict()
+        self.store.save_job(self.id, self.folder, self.status, self.created_at,
+                            json.dumps({k: data[k] for k in ("progress", "result", "runs", "started_at",
+                                                             "finished_at", "stopped_at")}),
+                            self.error)
+
+    @classmethod
+    def from_row(cls, row, store) -> "IndexJob":
+        job_id, folder, status, created_at, _, progress, error = row
+        job = cls(job_id, folder, status, created_at, store)
+        job.error = error
+        saved = json.loads(progress) if progress else {}
+        job.result = saved.get("result")
+        job.runs = saved.get("runs", 0)
+        job.started_at = saved.get("started_at")
+        job.finished_at = saved.get("finished_at")
+        job.stopped_at = saved.get("stopped_at")
+        counters = saved.get("progress") or {}
+        job.scanned = counters.get("files_scanned", 0)
+        job.changed = counters.get("files_changed", 0)
+        job.extracted = counters.get("files_extracted", 0)
+        job.committed = counters.get("files_committed", 0)
+        job.removed = counters.get("files_removed", 0)
+        job.bytes = counters.get("bytes", 0)
+        job.errors = counters.get("errors", 0)
+        job.scan_complete = counters.get("scan_complete", False)
+        return job
+
+
+class JobScheduler:
+    """
+    Runs add-folder indexing in background threads, `concurrency` folders
+    at a time, with job state persisted in the state store. On start,
+    jobs that were queued or running when the process stopped are queued
+    again; because per-file state is committed batch by batch, the re-run
+    only extracts files that were not finished.
+
+    Only the index writer process starts its scheduler (see
+    index_manager). In the other processes the scheduler is not started:
+    it lists jobs from the state store, stores new jobs as queued and
+    records pause/resume/cancel requests there, and the writer's
+    scheduler picks both up within POLL_SECONDS.
+    """
+
+    POLL_SECONDS = 1.0
+
+    def __init__(self, indexer, concurrency: int = 1, history: int = 200):
+        self.indexer = indexer
+        self.concurrency = max(1, concurrency)
+        self.history = history
+        self.store = get_state_store()
+        self.jobs: "OrderedDict[str, IndexJob]" = OrderedDict()
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self.running = False
+
+    # -------------------------------
+    # Lifecycle
+    # -------------------------------
+    def start(self):
+        with self._cond:
+            if self.running:
+                return
+            self.running = True
+        self.store.prune_jobs(FINISHED, self.history)
+        for row in self.store.load_jobs():
+            job = IndexJob.from_row(row, self.store)
+            self.jobs[job.id] = job
+            if job.status in (QUEUED, RUNNING):
+                if job.status == RUNNING:
+                    print(f"[jobs] resuming interrupted job {job.id} for {job.folder}")
+                job.status = QUEUED
+                job.persist()
+                self._queue.append(job)
+
+        for n in range(self.concurrency):
+            t = threading.Thread(target=self._worker, name=f"index-job-{n}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+        from config.settings import settings
+        if settings.INDEX_WRITER_ELECTION:
+            threading.Thread(target=self._poll, name="index-job-poll", daemon=True).start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            for job in self.jobs.values():
+                if job.status == RUNNING:
+                    job.request_stop(QUEUED)   # picked up again on next start
+            self._cond.notify_all()
+
+    # -------------------------------
+    # Submission / control
+    # -------------------------------
+    def submit(self, folder: str) -> IndexJob:
+        """Queue `folder`, or return the job already queued/running for it."""
+        with self._cond:
+            if not self.running:
+                self._sync()
+            for job in self.jobs.values():
+                if job.folder == folder and job.status in (QUEUED, RUNNING):
+                    return job
+            job = IndexJob(uuid.uuid4().hex[:12], folder, store=self.store)
+            self.jobs[job.id] = job
+            job.persist()
+            if self.running:
+                self._queue.append(job)
+                self._cond.notify()
+            return job
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        if not self.running:
+            self._sync()
+        return self.jobs.get(job_id)
+
+    def list(self) -> List[IndexJob]:
+        if not self.running:
+            self._sync()
+        return list(self.jobs.values())
+
+    def _sync(self):
+        """Not started: the jobs as the writer process last persisted them."""
+        self.jobs = OrderedDict((row[0], IndexJob.from_row(row, self.store)) for row in self.store.load_jobs())
+
+    def _request(self, job_id: str, action: str, allowed: tuple) -> IndexJob:
+        """Not started: record `action` for the writer process to apply to `job_id`."""
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job.status not in allowed:
+            raise ValueError(f"job {job_id} is {job.status}")
+        self.store.request_job(job_id, action)
+        return job
+
+    def _control(self, job_id: str, target: str) -> IndexJob:
+        if not self.running:
+            action = "cancel" if target == CANCELLED else "pause"
+            allowed = (QUEUED, RUNNING, PAUSED) if target == CANCELLED else (QUEUED, RUNNING)
+            return self._request(job_id, action, allowed)
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job.status == RUNNING:
+                job.request_stop(target)
+            elif job.status == QUEUED or (job.status == PAUSED and target == CANCELLED):
+                if job in self._queue:
+                    self._queue.remove(job)
+                job.status = target
+                if target == CANCELLED:
+                    job.finished_at = time.time()
+                job.persist()
+            else:
+                raise ValueError(f"job {job_id} is {job.status}")
+            return job
+
+    def cancel(self, job_id: str) -> IndexJob:
+        return self._control(job_id, CANCELLED)
+
+    def pause(self, job_id: str) -> IndexJob:
+        return self._control(job_id, PAUSED)
+
+    def resume(self, job_id: str) -> IndexJob:
+        if not self.running:
+            return self._request(job_id, "resume", (PAUSED,))
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job.status != PAUSED:
+                raise ValueError(f"job {job_id} is {job.status}")
+            job.status = QUEUED
+            job.persist()
+            self._queue.append(job)
+            self._cond.notify()
+            return job
+
+    # -------------------------------
+    # Workers
+    # -------------------------------
+    def _poll(self):
+        """Queue the jobs other processes stored and apply the controls they requested."""
+        while not self._stopping:
+            time.sleep(self.POLL_SECONDS)
+            try:
+                with self._cond:
+                    for row in self.store.load_jobs(QUEUED):
+                        if row[0] not in self.jobs:
+                            job = IndexJob.from_row(row, self.store)
+                            self.jobs[job.id] = job
+                            self._queue.append(job)
+                            self._cond.notify()
+                for job_id, action in self.store.take_job_requests():
+                    try:
+                        getattr(self, action)(job_id)
+                    except (KeyError, ValueError) as e:
+                        print(f"[jobs] cannot {action} {job_id}: {e}")
+            except Exception as e:
+                print(f"[jobs] polling the state store failed: {e}")
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                job = self._queue.popleft()
+                job._stop = None
+                job.status = RUNNING
+            self._run(job)
+
+    def _run(self, job: IndexJob):
+        job.reset()
+        job.runs += 1
+        job.started_at = time.time()
+        job.finished_at = job.stopped_at = None
+        job.error = None
+        job.persist()
+        print(f"[jobs] {job.id} started: {job.folder}")
+        try:
+            job.result = self.indexer.index_folder(job.folder, progress=job)
+            job.status = COMPLETED
+        except IndexCancelled:
+            job.status = job._stop
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            print(f"[jobs] {job.id} failed: {e}")
+        job.stopped_at = time.time()
+        if job.status in FINISHED:
+            job.finished_at = job.stopped_at
+        job.persist()
+        print(f"[jobs] {job.id} {job.status}: {job.folder}")
+
+    def stats(self) -> dict:
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        queue_depth = len(self._queue) if self.running else counts.get(QUEUED, 0)
+        return {"concurrency": self.concurrency, "queue_depth": queue_depth, "jobs": counts}
+
+
+_scheduler: Optional[JobScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_job_scheduler() -> JobScheduler:
+    """
+    Process-wide scheduler for the shared indexer, started on first use in
+    the index writer process (read-only processes hand jobs to it).
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from config.settings import settings
+            from utils.index_manager import get_indexer, is_writer
+            _scheduler = JobScheduler(get_indexer(), concurrency=settings.INDEX_JOB_CONCURRENCY,
+                                      history=settings.INDEX_JOB_HISTORY)
+            if is_writer():
+                _scheduler.start()
+        return _scheduler
@@ -0,0 +1,38 @@
+"""
+Heavy optional libraries (document parsers, AI clients) imported on first
+use instead of at module load, so the API process starts without them.
+
+    fitz = lazy_import("fitz")
+
+The first call imports the module and records how long that took;
+`loaded()` reports those timings for the startup report.
+"""
+import time
+import importlib
+import threading
+from types import ModuleType
+from typing import Dict
+
+_modules: Dict[str, ModuleType] = {}
+_timings: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def lazy_import(name: str) -> ModuleType:
+    module = _modules.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        module = _modules.get(name)
+        if module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(name)
+            _timings[name] = round((time.perf_counter() - started) * 1000, 1)
+            _modules[name] = module
+    return module
+
+
+def loaded() -> Dict[str, float]:
+    """Milliseconds each lazily imported module took, in import order."""
+    with _lock:
+        return dict(_timings)
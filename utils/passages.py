@@ -0,0 +1,71 @@
+"""
+Passage-level documents (INDEX_PASSAGES=true).
+
+A file is indexed as one document per passage instead of one document:
+per page of a PDF, per slide, per sheet, or fixed-size windows of about
+PASSAGE_CHARS characters for unpaged types. Every passage carries the
+file's fields plus `page` (1-based) and a unique `passage` key; `path`
+is shared, so deleting a path removes all of its passages. Scores and
+snippets then depend on the passage, not on the length of the file;
+search collapses the hits by path and reports the matching pages.
+"""
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from utils.snippets import OFFSETS_FIELD, content_fields
+from utils.whoosh_extractors import PAGE_BREAK, PAGED_TYPES
+
+PAGES_PER_HIT = 5   # matching passages kept per file in a result
+
+# fields that belong to one passage rather than to the file
+PASSAGE_FIELDS = {"content", "passage", "page", "excerpt", OFFSETS_FIELD}
+
+
+def is_passage_schema(schema) -> bool:
+    return "page" in schema
+
+
+def split_passages(text: str, suffix: str, max_chars: int) -> List[Tuple[int, str]]:
+    """(page, text) passages of a document; blank pages are left out but keep their number."""
+    if suffix in PAGED_TYPES:
+        return [(n, page) for n, page in enumerate(text.split(PAGE_BREAK), 1) if page.strip()]
+
+    windows = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + max_chars)
+        if end < len(text):
+            # cut after whitespace; windows join back into the text without a separator
+            cut = max(text.rfind(" ", start + max_chars // 2, end), text.rfind("\n", start + max_chars // 2, end))
+            if cut != -1:
+                end = cut + 1
+        windows.append((len(windows) + 1, text[start:end]))
+        start = end
+    return windows
+
+
+def join_passages(passages: List[dict]) -> str:
+    """The document text back from its stored passages."""
+    suffix = Path(passages[0]["path"]).suffix.lower()
+    by_page: Dict[int, str] = {int(p.get("page") or 1): p.get("content") or "" for p in passages}
+    if suffix in PAGED_TYPES:
+        return PAGE_BREAK.join(by_page.get(n, "") for n in range(1, max(by_page) + 1))
+    return "".join(by_page[n] for n in sorted(by_page))
+
+
+def index_docs(schema, base: dict, text: str) -> List[dict]:
+    """
+    The documents that index one file with `text` under `schema`: a single
+    document, or one per passage when the schema is passage-level. `base`
+    holds the file's own fields (path, filename, dates, size).
+    """
+    if not is_passage_schema(schema):
+        return [dict(base, content=text, **content_fields(schema, text))]
+
+    from config.settings import settings
+    suffix = Path(base["path"]).suffix.lower()
+    return [
+        dict(base, passage=f"{base['path']}#{page}", page=page, content=passage,
+             **content_fields(schema, passage))
+        for page, passage in split_passages(text, suffix, settings.PASSAGE_CHARS)
+    ]
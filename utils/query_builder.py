@@ -15,11 +15,13 @@ def normalize_extensions(exts: List[str]):
 def build_everything_query(data: SearchInput, folders: Optional[List[str]] = None) -> str:
     """
     IMPORTANT:
-    Everything.exe MUST NOT receive date filters or size filters,
+    Everything.exe MUST NOT receive date filters,
     because it treats all date-only values as 00:00:00 (midnight)
     and will exclude same-day files.
 
-    Date + size filters are handled COMPLETELY in Python-side SearchEngine.
+    Date filters are handled COMPLETELY in Python-side SearchEngine.
+    Size filters are exact byte comparisons, so they are pushed down
+    (along with count/offset/sort, see EverythingClient.search).
     """
 
     parts = []
@@ -66,4 +68,12 @@ def build_everything_query(data: SearchInput, folders: Optional[List[str]] = Non
             ext_filters = " | ".join([f"ext:{ext}" for ext in normalized])
             parts.append(ext_filters)
 
+    # -------------------------------------------------------------------
+    # SIZE (KB in SearchInput, bytes for Everything)
+    # -------------------------------------------------------------------
+    if data.size_from is not None:
+        parts.append(f"size:>={int(float(data.size_from) * 1024)}")
+    if data.size_to is not None:
+        parts.append(f"size:<={int(float(data.size_to) * 1024)}")
+
     return " ".join(parts).strip()
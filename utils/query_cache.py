@@ -0,0 +1,117 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "tag")
+
+    def __init__(self, value, size: int, expires_at: float, tag):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.tag = tag
+
+
+class QueryCache:
+    """
+    In-process LRU cache for search responses, bounded by approximate
+    response size and a TTL.
+
+    Every entry belongs to a namespace ("content", "filename") and carries
+    the tag its result was computed for (the index generation, or a TTL
+    bucket for Everything). The first lookup that sees a new tag for a
+    namespace drops that namespace's older entries, so a commit
+    invalidates cached results without waiting for the TTL.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._tags = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def _size_of(value) -> int:
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return 1024
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _retag(self, namespace: str, tag):
+        """Forget `namespace` entries computed for an older tag. Caller holds the lock."""
+        if self._tags.get(namespace, tag) != tag:
+            stale = [k for k, e in self._entries.items() if k[0] == namespace and e.tag != tag]
+            for k in stale:
+                self._drop(k)
+            self.invalidations += len(stale)
+        self._tags[namespace] = tag
+
+    def get(self, namespace: str, key: Hashable, tag) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        full_key = (namespace, key)
+        with self._lock:
+            self._retag(namespace, tag)
+            entry = self._entries.get(full_key)
+            if entry is None or entry.tag != tag or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    self._drop(full_key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(full_key)
+            self.hits += 1
+            return entry.value
+
+    def put(self, namespace: str, key: Hashable, tag, value):
+        if not self.enabled:
+            return
+        size = self._size_of(value)
+        if size > self.max_bytes // 4:
+            return  # one oversized response must not flush the whole cache
+        full_key = (namespace, key)
+        with self._lock:
+            self._retag(namespace, tag)
+            if full_key in self._entries:
+                self._drop(full_key)
+            self._entries[full_key] = _Entry(value, size, time.monotonic() + self.ttl, tag)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,182 @@
+"""
+Schema migration for existing Whoosh indexes.
+
+Whoosh keeps the schema an index was created with, so new fields (or a
+field whose type changed) only appear after the documents are rewritten.
+`migrate_index` copies every stored document into a fresh index built
+with the current schema, deriving the new fields from the stored ones,
+and swaps it into place. Indexes that do not store the document text
+(INDEX_CONTENT_STORE=excerpt|none) have every file extracted again;
+passage-level documents (INDEX_PASSAGES) are joined back per file and
+split again the way the new schema wants.
+
+Run it while the API is stopped (an API process refuses to open an
+outdated index, see WhooshIndexer.open_or_create):
+
+    python -m utils.schema_migration [index_dir]
+
+For a sharded index, every shard is migrated.
+"""
+import os
+import sys
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+from whoosh import index as whoosh_index
+
+
+def _field_signature(field):
+    return (
+        type(field).__name__,
+        bool(field.stored),
+        bool(getattr(field, "unique", False)),
+        field.column_type is not None,
+        getattr(field, "bits", None),
+    )
+
+
+def needs_migration(current, target) -> bool:
+    """True when the stored schema differs from `target` in field names or field types."""
+    if set(current.names()) != set(target.names()):
+        return True
+    return any(_field_signature(current[name]) != _field_signature(target[name]) for name in target.names())
+
+
+def derive_fields(stored: dict) -> dict:
+    """Fill fields added to the schema from the stored fields of an older document."""
+    doc = dict(stored)
+    if doc.get("modified_at") is None and doc.get("modified"):
+        try:
+            doc["modified_at"] = datetime.strptime(doc["modified"], "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    if doc.get("size_bytes") is not None:
+        doc["size_bytes"] = int(doc["size_bytes"])
+    return doc
+
+
+def iter_stored_files(reader) -> Iterator[List[dict]]:
+    """
+    The stored documents of an index grouped per file: one document each,
+    or all passages of a file when the index is passage-level.
+    """
+    from utils.passages import is_passage_schema
+    if not is_passage_schema(reader.schema):
+        for _, stored in reader.iter_docs():
+            yield [stored]
+        return
+    for path in reader.lexicon("path"):
+        docs = [reader.stored_fields(n) for n in reader.postings("path", path).all_ids()
+                if not reader.is_deleted(n)]
+        if docs:
+            yield docs
+
+
+def file_docs(stored: List[dict], schema, derive: Callable[[dict], dict] = derive_fields) -> Optional[List[dict]]:
+    """
+    Documents that add one file again to an index with `schema`, from its
+    stored documents. The text is taken from the stored `content` (joined
+    back from passages) or, when the index keeps none, extracted from the
+    file again. None when that file is gone or yields no text.
+    """
+    from utils.passages import PASSAGE_FIELDS, index_docs, join_passages
+    if any(doc.get("content") is None for doc in stored):
+        path = stored[0].get("path")
+        if not path or not os.path.isfile(path):
+            return None
+        from utils.extraction_pool import get_extraction_pool
+        text = get_extraction_pool().extract(Path(path)).text
+    elif "page" in stored[0]:
+        text = join_passages(stored)
+    else:
+        text = stored[0]["content"]
+    if not text:
+        return None
+
+    names = set(schema.names())
+    base = {k: v for k, v in derive(stored[0]).items()
+            if k in names and k not in PASSAGE_FIELDS and v is not None}
+    return index_docs(schema, base, text) or None
+
+
+def migrate_index(index_dir: str, schema, derive: Callable[[dict], dict] = derive_fields,
+                  limitmb: int = 256) -> int:
+    """
+    Rewrite the index at `index_dir` with `schema`. Returns the number of
+    files copied. The old index is kept as `<index_dir>.pre-migration`
+    until the new one is in place.
+    """
+    index_dir = Path(index_dir)
+    target = index_dir.with_name(index_dir.name + ".migrating")
+    backup = index_dir.with_name(index_dir.name + ".pre-migration")
+    for leftover in (target, backup):
+        if leftover.exists():
+            shutil.rmtree(leftover)
+
+    src = whoosh_index.open_dir(str(index_dir))
+    target.mkdir(parents=True)
+    dst = whoosh_index.create_in(str(target), schema)
+
+    refill = "content" in schema and "content" in src.schema and not src.schema["content"].stored
+    if refill:
+        print(f"[migrate] {index_dir} stores no document text, extracting every file again")
+    copied = skipped = 0
+    writer = dst.writer(limitmb=limitmb)
+    try:
+        with src.reader() as reader:
+            for stored in iter_stored_files(reader):
+                docs = file_docs(stored, schema, derive)
+                if docs is None:
+                    skipped += 1
+                    continue
+                for doc in docs:
+                    writer.add_document(**doc)
+                copied += 1
+        writer.commit()
+    except Exception:
+        writer.cancel()
+        shutil.rmtree(target, ignore_errors=True)
+        raise
+    finally:
+        src.close()
+        dst.close()
+
+    index_dir.rename(backup)
+    target.rename(index_dir)
+    shutil.rmtree(backup, ignore_errors=True)
+    print(f"[migrate] rewrote {copied} files in {index_dir}"
+          + (f", dropped {skipped} whose file is gone" if skipped else ""))
+    return copied
+
+
+def main(argv: Optional[list] = None):
+    from utils.index_manager import active_index_dir
+    from utils.whoosh_indexer import WhooshIndexer
+
+    argv = sys.argv[1:] if argv is None else argv
+    index_dir = Path(argv[0] if argv else active_index_dir())
+    if whoosh_index.exists_in(str(index_dir)):
+        indexes = [index_dir]
+    else:
+        # a sharded index: one Whoosh index per subdirectory
+        indexes = [d for d in sorted(index_dir.iterdir()) if d.is_dir() and whoosh_index.exists_in(str(d))] \
+            if index_dir.is_dir() else []
+    if not indexes:
+        print(f"[migrate] no index at {index_dir}")
+        return
+
+    schema = WhooshIndexer.build_schema()
+    for path in indexes:
+        ix = whoosh_index.open_dir(str(path))
+        outdated = needs_migration(ix.schema, schema)
+        ix.close()
+        if not outdated:
+            print(f"[migrate] {path} is up to date")
+            continue
+        migrate_index(str(path), schema)
+
+
+if __name__ == "__main__":
+    main()
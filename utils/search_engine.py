@@ -1,8 +1,9 @@
 from fastapi import HTTPException
-from .everything_api import call_everything
+from .everything_api import (call_everything, get_everything_client, get_async_everything_client,
+                             EverythingUnavailable)
 from .whoosh_indexer import WhooshIndexer
 from models.search_models import SearchInput
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from pathlib import Path
 from utils.response_helper import success_response
@@ -10,10 +11,126 @@ from utils.storage_helper import read_indexed_folders
 from .query_builder import build_everything_query
 from config.settings import settings
 from utils.abbreviation_ai import expand_abbreviations
+from .query_cache import QueryCache
+from .filename_index import get_filename_index
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+import json
+import base64
+import asyncio
+import hashlib
+import threading
+
+# SearchInput.sort values ("-" prefix = descending) → backend sort field
+EVERYTHING_SORTS = {"name": "name", "path": "path", "size": "size", "date_modified": "date_modified"}
+CONTENT_SORTS = {"path": "path", "size": "size_bytes", "date_modified": "modified_at"}
+# SearchInput.sort values → row field, for ordering fused hybrid results
+HYBRID_SORTS = {"name": "file_name", "path": "path", "size": "size_kb", "date_modified": "modified"}
+
+
+def fuse_rankings(rankings: Dict[str, List[dict]], k: int = 60) -> List[dict]:
+    """
+    Reciprocal rank fusion: every row scores sum(1 / (k + rank)) over the
+    rankings it appears in. Rows are deduplicated by normalized path; a
+    row found by several backends keeps the fields of all of them.
+    """
+    fused: Dict[str, dict] = {}
+    for source, rows in rankings.items():
+        for rank, row in enumerate(rows, 1):
+            if not row.get("path"):
+                continue
+            key = os.path.normcase(os.path.normpath(row["path"]))
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = dict(row, sources=[], rrf_score=0.0)
+            else:
+                entry.update({f: v for f, v in row.items() if entry.get(f) is None})
+            entry["sources"].append(source)
+            entry["rrf_score"] += 1.0 / (k + rank)
+    for entry in fused.values():
+        entry["rrf_score"] = round(entry["rrf_score"], 6)
+        entry.setdefault("file_name", entry.get("filename") or Path(entry["path"]).name)
+    return sorted(fused.values(), key=lambda e: -e["rrf_score"])
+
 
 class SearchEngine:
     def __init__(self, whoosh_indexer: WhooshIndexer):
         self.whoosh = whoosh_indexer
+        self.cache = QueryCache(max_bytes=settings.QUERY_CACHE_MAX_MB * 1024 * 1024,
+                                ttl=settings.QUERY_CACHE_TTL_SECONDS)
+        # blocking work of the async search paths (Whoosh scoring, local filename index)
+        self.executor = ThreadPoolExecutor(max_workers=settings.SEARCH_THREADS, thread_name_prefix="search")
+
+    # -------------------------------
+    # Result cache
+    # -------------------------------
+    @staticmethod
+    def _cache_key(payload: SearchInput, folders: Optional[List[str]] = None) -> tuple:
+        """Normalized SearchInput: inputs that can only produce the same response map to one key."""
+        terms = tuple(" ".join(t.split()) for t in payload.keyword.split(',') if t.strip())
+        if not payload.case_sensitive:
+            terms = tuple(t.lower() for t in terms)
+        types = None
+        if payload.file_types and payload.file_types != ["all"]:
+            types = tuple(sorted({ft.lower().lstrip('.') for ft in payload.file_types}))
+        return (
+            terms, types,
+            payload.date_from or None, payload.date_to or None,
+            payload.size_from, payload.size_to,
+            payload.case_sensitive, payload.whole_word,
+            payload.max_results, payload.sort or None,
+            tuple(folders) if folders is not None else None,
+        )
+
+    # -------------------------------
+    # Paging
+    # -------------------------------
+    @staticmethod
+    def _parse_sort(sort: Optional[str], fields: dict):
+        """'date_modified' / '-size' → (backend field, ascending); (None, True) = backend default."""
+        if not sort:
+            return None, True
+        name = sort.lstrip("-")
+        if name not in fields:
+            raise ValueError(f"sort must be one of: {', '.join(sorted(fields))}")
+        return fields[name], not sort.startswith("-")
+
+    def _cursor_scope(self, payload: SearchInput) -> str:
+        return hashlib.sha1(repr(self._cache_key(payload)).encode()).hexdigest()[:12]
+
+    @staticmethod
+    def _encode_cursor(scope: str, offset: int) -> str:
+        raw = json.dumps({"o": offset, "q": scope}).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def _decode_cursor(self, payload: SearchInput, scope: str) -> int:
+        """Offset encoded in payload.cursor (0 without one); 400 if it belongs to another query."""
+        if not payload.cursor:
+            return 0
+        try:
+            padded = payload.cursor + "=" * (-len(payload.cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded))
+            offset = int(data["o"])
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if data["q"] != scope or offset < 0:
+            raise HTTPException(status_code=400, detail="Cursor does not belong to this query")
+        return offset
+
+    def _filename_snapshot(self):
+        if settings.FILENAME_BACKEND == "local":
+            return ("local", get_filename_index().version)
+        # Everything exposes no change counter: results are reused within one time bucket
+        return int(time.time() // max(settings.FILENAME_CACHE_SECONDS, 1e-3))
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats()
+
+    def filename_backend_stats(self) -> dict:
+        if settings.FILENAME_BACKEND == "local":
+            return {"backend": "local", **get_filename_index().stats()}
+        return {"backend": "everything", **get_everything_client().stats()}
 
     def _parse_filters(self, payload: SearchInput):
         date_from = None
@@ -53,153 +170,391 @@ class SearchEngine:
         return date_from, date_to, size_from_b, size_to_b, file_types
 
 
-    def search_filename(self, query: str, payload: SearchInput):
-        #print(f"[DEBUG] raw user keyword = {query}")
-
-        # --- AI abbreviation expansion ---
-        if settings.ENABLE_ABBREVIATION_AI:
-            expanded = expand_abbreviations(query)
-            if expanded and expanded != query:
-                #print(f"[DEBUG] AI expanded keyword = {expanded}")
-                payload.keyword = expanded    # << CRITICAL FIX
-
+    def _expanded(self, payload: SearchInput, deadline: Optional[float] = None) -> SearchInput:
+        """
+        `payload` with its keyword's abbreviations expanded, as a copy (the
+        caller's object stays as sent). Remote answers are waited on until
+        `deadline` at most; a late one is used from the next search on.
+        Results are cached under the expanded keyword, so a search that
+        missed an expansion never answers for one that has it.
+        """
+        if not settings.ENABLE_ABBREVIATION_AI:
+            return payload
+        expanded = expand_abbreviations(payload.keyword, deadline)
+        if not expanded or expanded == payload.keyword:
+            return payload
+        return payload.model_copy(update={"keyword": expanded})
+
+    def search_filename(self, payload: SearchInput, deadline: Optional[float] = None):
+        # the cursor is bound to the query as the client sent it (before abbreviation expansion)
+        scope = self._cursor_scope(payload)
+        offset = self._decode_cursor(payload, scope)
+        payload = self._expanded(payload, deadline)
+        key, snapshot = self._filename_cache_key(payload)
+        cached = self.cache.get("filename", key, snapshot)
+        if cached is not None:
+            return cached
+        data = self._search_filename(payload, deadline, offset, scope)
+        self.cache.put("filename", key, snapshot, data)
+        return data
+
+    def _filename_cache_key(self, payload: SearchInput):
+        return (self._cache_key(payload, read_indexed_folders()), payload.cursor), self._filename_snapshot()
+
+    def search_content(self, payload: SearchInput, deadline: Optional[float] = None):
+        scope = self._cursor_scope(payload)
+        offset = self._decode_cursor(payload, scope)
+        payload = self._expanded(payload, deadline)
+        key = (self._cache_key(payload), payload.cursor)
+        # a rebuild swaps in another directory whose generations start over
+        generation = (str(self.whoosh.index_dir), self.whoosh.searchers.current_generation())
+        cached = self.cache.get("content", key, generation)
+        if cached is not None:
+            return cached
+        data = self._search_content(payload, offset, scope)
+        self.cache.put("content", key, generation, data)
+        return data
+
+    # -------------------------------
+    # Async paths
+    # -------------------------------
+    async def search_filename_async(self, payload: SearchInput, deadline: Optional[float] = None):
+        """search_filename over the async Everything client; blocking steps run on the search executor."""
+        loop = asyncio.get_running_loop()
+        scope = self._cursor_scope(payload)
+        offset = self._decode_cursor(payload, scope)
+        payload = await loop.run_in_executor(self.executor, self._expanded, payload, deadline)
+        key, snapshot = await loop.run_in_executor(self.executor, self._filename_cache_key, payload)
+        cached = self.cache.get("filename", key, snapshot)
+        if cached is not None:
+            return cached
+        data = await self._search_filename_async(payload, deadline, offset, scope)
+        self.cache.put("filename", key, snapshot, data)
+        return data
+
+    async def search_content_async(self, payload: SearchInput, deadline: Optional[float] = None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.search_content, payload, deadline)
+
+    async def search_hybrid(self, payload: SearchInput, deadline: Optional[float] = None):
+        """
+        Filename and content search run concurrently and fused by
+        reciprocal rank (or ordered by `sort`). Each backend has its own
+        deadline; one that misses it or fails is reported in "backends"
+        and the response holds the other's results ("partial": true).
+        """
+        try:
+            self._parse_sort(payload.sort, HYBRID_SORTS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        scope = self._cursor_scope(payload)
+        offset = self._decode_cursor(payload, scope)
+        page = max(1, payload.max_results)
+
+        # each backend ranks its own top offset + page rows; the fused list is sliced afterwards
+        sub = dict(cursor=None, max_results=offset + page)
+        started = time.monotonic()
+        limits = {"filename": started + settings.HYBRID_FILENAME_SECONDS,
+                  "content": started + settings.HYBRID_CONTENT_SECONDS}
+        if deadline is not None:
+            limits = {name: min(limit, deadline) for name, limit in limits.items()}
+        runs = {
+            "filename": self.search_filename_async(payload.model_copy(update=dict(sub, search_mode="filename")),
+                                                   deadline=limits["filename"]),
+            # Whoosh cannot sort by name: content rows then come by relevance and are ordered below
+            "content": self.search_content_async(payload.model_copy(update=dict(
+                sub, search_mode="content",
+                sort=payload.sort if payload.sort and payload.sort.lstrip("-") in CONTENT_SORTS else None)),
+                deadline=limits["content"]),
+        }
+        outcomes = await asyncio.gather(*(self._bounded(coro, limits[name]) for name, coro in runs.items()))
+        answers = dict(zip(runs, outcomes))
+        if all(data is None for data, _ in outcomes):
+            raise HTTPException(status_code=503, detail="No search backend answered in time")
+
+        fused = fuse_rankings({name: data["results"] for name, (data, _) in answers.items() if data},
+                              k=settings.HYBRID_RRF_K)
+        if payload.sort:
+            field = HYBRID_SORTS[payload.sort.lstrip("-")]
+            descending = payload.sort.startswith("-")
+            # rows without the field go last either way
+            present = sorted((r for r in fused if r.get(field) is not None),
+                             key=lambda r: r[field], reverse=descending)
+            fused = present + [r for r in fused if r.get(field) is None]
+
+        more = len(fused) > offset + page or any(data and data.get("next_cursor") for data, _ in outcomes)
+        results = fused[offset:offset + page]
+        response = {
+            "results_count": len(results),
+            "results": results,
+            "next_cursor": self._encode_cursor(scope, offset + page) if more else None,
+            "partial": any(data is None for data, _ in outcomes),
+            "backends": {name: status for name, (_, status) in answers.items()},
+        }
+        content = answers["content"][0]
+        if content and content.get("did_you_mean"):
+            response["did_you_mean"] = content["did_you_mean"]
+        return response
+
+    @staticmethod
+    async def _bounded(coro, deadline: float):
+        """(response, status) of one hybrid backend; (None, status) when it times out or fails."""
+        started = time.monotonic()
+        try:
+            data = await asyncio.wait_for(coro, timeout=max(0.0, deadline - started))
+            status = {"status": "ok", "count": data["results_count"]}
+        except asyncio.TimeoutError:
+            data, status = None, {"status": "timeout"}
+        except HTTPException as e:
+            if e.status_code < 500:
+                raise   # the request itself is invalid
+            data, status = None, {"status": "error", "detail": e.detail}
+        except Exception as e:
+            data, status = None, {"status": "error", "detail": str(e)}
+        status["ms"] = round((time.monotonic() - started) * 1000, 1)
+        return data, status
+
+    def _search_filename(self, payload: SearchInput, deadline: Optional[float] = None,
+                         offset: int = 0, scope: str = ""):
+        plan = self._filename_plan(payload, deadline, offset, scope)
+        if isinstance(plan, dict):
+            return plan
+        try:
+            request = next(plan)
+            while True:
+                try:
+                    raw = call_everything(deadline=deadline, **request)
+                except EverythingUnavailable as e:
+                    raise HTTPException(status_code=503, detail=str(e))
+                request = plan.send(raw)
+        except StopIteration as done:
+            return done.value
+
+    async def _search_filename_async(self, payload: SearchInput, deadline: Optional[float] = None,
+                                     offset: int = 0, scope: str = ""):
+        loop = asyncio.get_running_loop()
+        plan = await loop.run_in_executor(self.executor, self._filename_plan, payload, deadline, offset, scope)
+        if isinstance(plan, dict):
+            return plan
+        client = get_async_everything_client()
+        try:
+            request = next(plan)
+            while True:
+                try:
+                    raw = await client.search(deadline=deadline, **request)
+                except EverythingUnavailable as e:
+                    raise HTTPException(status_code=503, detail=str(e))
+                request = plan.send(raw)
+        except StopIteration as done:
+            return done.value
+
+    def _filename_plan(self, payload: SearchInput, deadline: Optional[float] = None,
+                       offset: int = 0, scope: str = ""):
+        """
+        The response itself for the local backend; for Everything, a
+        generator that yields call_everything() arguments, is sent each
+        answer and returns the response. The sync and async paths only
+        differ in how they run those requests.
+        """
         folders = read_indexed_folders()
 
-        # build Everything.exe query USING THE UPDATED KEYWORD
+        # payload.keyword is already expanded (see _expanded)
         everything_query = build_everything_query(payload, folders)
-        #(f"[DEBUG] everything_query = {everything_query}")
-
-        # delegate to Everything API
-        raw = call_everything(everything_query)
-        #print("everything raw",raw)
-        items = raw.get("results") or raw.get("items") or raw.get("files") or []
-        #date_from, date_to, size_from_b, size_to_b, file_types = self._parse_filters(payload)
 
         try:
             date_from, date_to, size_from_b, size_to_b, file_types = self._parse_filters(payload)
+            sort_field, ascending = self._parse_sort(payload.sort, EVERYTHING_SORTS)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
-
         # Enforce "current date not exceed logger" — cap date_to to now
         now = datetime.now()
         if date_to and date_to > now:
             date_to = now
 
+        page = max(1, payload.max_results)
+
+        if settings.FILENAME_BACKEND == "local":
+            terms = [t.strip() for t in payload.keyword.split(',') if t.strip()]
+            results, more = get_filename_index().search(
+                terms, case_sensitive=payload.case_sensitive, whole_word=payload.whole_word,
+                exts=file_types, date_from=date_from, date_to=date_to,
+                size_from=size_from_b, size_to=size_to_b,
+                sort=sort_field, ascending=ascending, offset=offset, limit=page,
+            )
+            return {
+                "results_count": len(results),
+                "results": results,
+                "next_cursor": self._encode_cursor(scope, offset + page) if more else None,
+            }
+
+        return self._everything_pages(everything_query, page, offset, scope, sort_field, ascending,
+                                      date_from, date_to, size_from_b, size_to_b, file_types)
+
+    def _everything_pages(self, everything_query: str, page: int, offset: int, scope: str,
+                          sort_field, ascending, date_from, date_to, size_from_b, size_to_b, file_types):
+        # limit/offset/sort/size are pushed down to Everything; only date filters
+        # still drop rows here, so with them the pages are over-fetched
+        batch = page if not (date_from or date_to) else max(page * 4, 200)
+
         results = []
-        for it in items:
-            # build full path
-            full_path = it.get("fullpath") or None
-            if not full_path:
-                folder = it.get("path")
-                file_name = it.get("name")
-                full_path = f"{folder}/{file_name}" if folder and file_name else None
-
-            # size (Everything usually returns bytes)
-            size_b = None
-            try:
-                raw_size = it.get("size")
-                if raw_size is not None:
-                    size_b = int(raw_size)
-            except Exception:
-                size_b = None
+        next_offset = None
+        while True:
+            raw = yield dict(query=everything_query, offset=offset, count=batch,
+                             sort=sort_field, ascending=ascending)
+            items = raw.get("results") or raw.get("items") or raw.get("files") or []
+            total = raw.get("totalResults")
+
+            for i, it in enumerate(items):
+                row = self._everything_row(it, date_from, date_to, size_from_b, size_to_b, file_types)
+                if row is None:
+                    continue
+                results.append(row)
+                if len(results) >= page:
+                    next_offset = offset + i + 1
+                    break
 
-            # size filters
-            if size_from_b and (size_b is None or size_b < size_from_b):
-                continue
-            if size_to_b and (size_b is None or size_b > size_to_b):
-                continue
+            if next_offset is not None:
+                break
+            offset += len(items)
+            if len(items) < batch or (total is not None and offset >= int(total)):
+                break
 
-            # parse modified date robustly into a datetime object (local time)
-            modified_raw = it.get('date_modified') or it.get('modified') or None
-            mod_dt = None
-            mod_str = None
-            if modified_raw:
-                try:
-                    s = str(modified_raw).strip()
-                    # FILETIME numeric (Everything often returns Windows FILETIME)
-                    if s.isdigit():
-                        ft = int(s)
-                        # FILETIME -> seconds since epoch conversion
-                        # (ft - 116444736000000000) / 10_000_000 gives seconds since Unix epoch
-                        mod_dt = datetime.fromtimestamp((ft - 116444736000000000) / 10_000_000)
-                    else:
-                        # Try a few common formats. Prefer ISO first.
+        if next_offset is not None and total is not None and next_offset >= int(total):
+            next_offset = None
+        return {
+            "results_count": len(results),
+            "results": results,
+            "next_cursor": self._encode_cursor(scope, next_offset) if next_offset is not None else None,
+        }
+
+
+    def _everything_row(self, it: dict, date_from, date_to, size_from_b, size_to_b, file_types) -> Optional[dict]:
+        """One Everything result as a response row, or None when the Python-side filters reject it."""
+        # build full path
+        full_path = it.get("fullpath") or None
+        if not full_path:
+            folder = it.get("path")
+            file_name = it.get("name")
+            full_path = f"{folder}/{file_name}" if folder and file_name else None
+
+        # size (Everything usually returns bytes)
+        size_b = None
+        try:
+            raw_size = it.get("size")
+            if raw_size is not None:
+                size_b = int(raw_size)
+        except Exception:
+            size_b = None
+
+        # size filters
+        if size_from_b and (size_b is None or size_b < size_from_b):
+            return None
+        if size_to_b and (size_b is None or size_b > size_to_b):
+            return None
+
+        # parse modified date robustly into a datetime object (local time)
+        modified_raw = it.get('date_modified') or it.get('modified') or None
+        mod_dt = None
+        mod_str = None
+        if modified_raw:
+            try:
+                s = str(modified_raw).strip()
+                # FILETIME numeric (Everything often returns Windows FILETIME)
+                if s.isdigit():
+                    ft = int(s)
+                    # FILETIME -> seconds since epoch conversion
+                    # (ft - 116444736000000000) / 10_000_000 gives seconds since Unix epoch
+                    mod_dt = datetime.fromtimestamp((ft - 116444736000000000) / 10_000_000)
+                else:
+                    # Try a few common formats. Prefer ISO first.
+                    try:
+                        mod_dt = datetime.fromisoformat(s)
+                    except Exception:
                         try:
-                            mod_dt = datetime.fromisoformat(s)
+                            mod_dt = datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
                         except Exception:
                             try:
-                                mod_dt = datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
+                                mod_dt = datetime.strptime(s, "%Y-%m-%d")
                             except Exception:
+                                # fallback: try parsing as timestamp in seconds (float)
                                 try:
-                                    mod_dt = datetime.strptime(s, "%Y-%m-%d")
+                                    ts = float(s)
+                                    mod_dt = datetime.fromtimestamp(ts)
                                 except Exception:
-                                    # fallback: try parsing as timestamp in seconds (float)
-                                    try:
-                                        ts = float(s)
-                                        mod_dt = datetime.fromtimestamp(ts)
-                                    except Exception:
-                                        mod_dt = None
-                    if mod_dt:
-                        mod_str = mod_dt.strftime("%Y-%m-%d %H:%M:%S")
-                    else:
-                        mod_str = s  # keep raw if we couldn't parse to dt
-                except Exception:
-                    mod_dt = None
-                    mod_str = str(modified_raw)
-
-            # Apply date filters (if date_from/to provided, skip if cannot parse timestamp)
-            # Note: date_from/date_to are datetimes (date_to already made inclusive to end-of-day in _parse_filters)
-            if date_from:
-                if not mod_dt or mod_dt < date_from:
-                    continue
-            if date_to:
-                if not mod_dt or mod_dt > date_to:
-                    continue
-
-            # file type
-            ftype = None
-            if it.get('name'):
-                ftype = Path(it.get('name')).suffix.lower().lstrip('.')
-            if file_types and ftype not in file_types:
-                continue
-
-            results.append({
-                "file_name": it.get("name"),
-                "path": full_path,
-                "size_kb": int(size_b/1024) if size_b else None,
-                "modified": mod_str
-            })
-            if payload.max_results and len(results) >= payload.max_results:
-                break
-
-        return {"results_count": len(results), "results": results}
-
-
-    def search_content(self, payload: SearchInput):
-        terms = [t.strip() for t in payload.keyword.split(',') if t.strip()]
-
-        raw_kw = payload.keyword
-        #print(f"[DEBUG] raw user keyword = {raw_kw}")
-
-        # --- AI abbreviation expansion ---
-        if settings.ENABLE_ABBREVIATION_AI:
-            expanded = expand_abbreviations(raw_kw)
-            if expanded and expanded != raw_kw:
-                #print(f"[DEBUG] AI expanded keyword = {expanded}")
-                payload.keyword = expanded
-
-        # REBUILD TERMS **after expansion**
+                                    mod_dt = None
+                if mod_dt:
+                    mod_str = mod_dt.strftime("%Y-%m-%d %H:%M:%S")
+                else:
+                    mod_str = s  # keep raw if we couldn't parse to dt
+            except Exception:
+                mod_dt = None
+                mod_str = str(modified_raw)
+
+        # Apply date filters (if date_from/to provided, skip if cannot parse timestamp)
+        # Note: date_from/date_to are datetimes (date_to already made inclusive to end-of-day in _parse_filters)
+        if date_from:
+            if not mod_dt or mod_dt < date_from:
+                return None
+        if date_to:
+            if not mod_dt or mod_dt > date_to:
+                return None
+
+        # file type
+        ftype = None
+        if it.get('name'):
+            ftype = Path(it.get('name')).suffix.lower().lstrip('.')
+        if file_types and ftype not in file_types:
+            return None
+
+        return {
+            "file_name": it.get("name"),
+            "path": full_path,
+            "size_kb": int(size_b/1024) if size_b else None,
+            "modified": mod_str
+        }
+
+    def _search_content(self, payload: SearchInput, offset: int = 0, scope: str = ""):
+        # payload.keyword is already expanded (see _expanded)
         terms = [t.strip() for t in payload.keyword.split(',') if t.strip()]
-        #print(f"[DEBUG] whoosh_query_terms = {terms}")
 
         if not terms:
-            return {"results_count": 0, "results": []}
+            return {"results_count": 0, "results": [], "next_cursor": None}
         q = " OR ".join([f'"{t}"' for t in terms])
-        #date_from, date_to, size_from_b, size_to_b, file_types = self._parse_filters(payload)
         try:
             date_from, date_to, size_from_b, size_to_b, file_types = self._parse_filters(payload)
+            sortedby, ascending = self._parse_sort(payload.sort, CONTENT_SORTS)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
 
-        hits = self.whoosh.search(q, limit=payload.max_results, date_from=date_from, date_to=date_to, size_from_b=size_from_b, size_to_b=size_to_b, case_sensitive=payload.case_sensitive, whole_word=payload.whole_word, file_types=file_types)
-        return {"results_count": len(hits), "results": hits}
+        # one extra hit tells whether another page exists
+        page = max(1, payload.max_results)
+        hits = self.whoosh.search(q, limit=page + 1, date_from=date_from, date_to=date_to, size_from_b=size_from_b, size_to_b=size_to_b, case_sensitive=payload.case_sensitive, whole_word=payload.whole_word, file_types=file_types,
+                                  offset=offset, sortedby=sortedby, reverse=not ascending)
+        more = len(hits) > page
+        hits = hits[:page]
+        response = {
+            "results_count": len(hits),
+            "results": hits,
+            "next_cursor": self._encode_cursor(scope, offset + page) if more else None,
+        }
+
+        # "did you mean" from the precomputed suggestion dictionary (no index access)
+        if settings.ENABLE_DID_YOU_MEAN:
+            suggestion = self.whoosh.did_you_mean(payload.keyword)
+            if suggestion:
+                response["did_you_mean"] = suggestion
+        return response
+
+
+_engine: Optional[SearchEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_search_engine() -> SearchEngine:
+    """Process-wide SearchEngine over the shared indexer, created on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            from utils.index_manager import get_indexer
+            _engine = SearchEngine(whoosh_indexer=get_indexer())
+        return _engine
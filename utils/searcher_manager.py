@@ -0,0 +1,211 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from whoosh.reading import EmptyReader, MultiReader, SegmentReader
+from whoosh.searching import Searcher
+
+
+class _Lease:
+    __slots__ = ("searcher", "generation")
+
+    def __init__(self, searcher, generation: int):
+        self.searcher = searcher
+        self.generation = generation
+
+
+def reopen_reader(ix, old) -> Tuple[object, int, int]:
+    """
+    A reader of `ix`'s latest generation that takes over `old`'s readers of
+    segments the commits since did not change (same segment id and
+    deletion count; deletions in a segment only grow). `old` must not be
+    used afterwards. Returns (reader, generation, reused segment count).
+
+    This is what Searcher.refresh() is meant to do, but Whoosh 2.7 looks
+    the old readers up by generation instead of segment id, so it reopens
+    every segment.
+    """
+    toc = ix._read_toc()
+    reusable = {r.segment().segment_id(): r for r, _ in old.leaf_readers() if isinstance(r, SegmentReader)}
+    readers = []
+    try:
+        for segment in toc.segments:
+            r = reusable.get(segment.segment_id())
+            if r is not None and r.segment().deleted_count() == segment.deleted_count():
+                del reusable[segment.segment_id()]
+            else:
+                r = SegmentReader(ix.storage, toc.schema, segment, generation=toc.generation)
+            readers.append(r)
+    except Exception:
+        for r in readers:
+            r.close()
+        raise
+    finally:
+        for r in reusable.values():
+            r.close()
+    reused = sum(1 for r in readers if r.generation() != toc.generation)
+    if not readers:
+        return EmptyReader(toc.schema), toc.generation, 0
+    if len(readers) == 1:
+        return readers[0], toc.generation, reused
+    return MultiReader(readers, generation=toc.generation), toc.generation, reused
+
+
+class SearcherManager:
+    """
+    Keeps warm Whoosh searchers for the current index generation.
+
+    Searchers are pooled rather than shared, because a reader's file
+    handles are not safe for concurrent use; each request leases an idle
+    searcher of the current generation (opening one only when none is
+    idle) and hands it back afterwards. The generation on disk is checked
+    at most every `check_interval` seconds, or right after `mark_stale()`
+    (called on in-process commits). When it changes, idle searchers are
+    moved to the new generation by reopen_reader(), which keeps the
+    readers of segments the commit did not touch; leased ones are moved
+    on release, so in-flight queries finish on the snapshot they started
+    with.
+    """
+
+    def __init__(self, ix, check_interval: float = 1.0, max_idle: int = 16):
+        self.ix = ix
+        self.check_interval = check_interval
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: List[_Lease] = []
+        self._leased = 0
+        self._generation = self.ix.latest_generation()
+        self._checked_at = time.monotonic()
+        self._closed = False
+        self._retired = False
+
+        self.opened = 0
+        self.refreshes = 0
+        self.segments_reused = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def current_generation(self) -> int:
+        """The committed generation searches will see (re-checked like acquire does)."""
+        self._check_generation()
+        return self._generation
+
+    def mark_stale(self):
+        """Force a generation check on the next acquire."""
+        self._checked_at = 0.0
+
+    def _check_generation(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        latest = self.ix.latest_generation()
+        if latest == self._generation:
+            return
+        with self._lock:
+            stale, self._idle = self._idle, []
+            self._generation = latest
+            self.refreshes += 1
+        for lease in stale:
+            self._pool(self._refreshed(lease))
+
+    def _refreshed(self, lease: _Lease) -> Optional[_Lease]:
+        """`lease` moved to the latest generation (its old searcher must not be used again)."""
+        old = lease.searcher
+        try:
+            reader, generation, reused = reopen_reader(self.ix, old.reader())
+        except Exception:
+            old.close()
+            return None
+        self.segments_reused += reused
+        return _Lease(Searcher(reader, weighting=old.weighting, fromindex=self.ix), generation)
+
+    def _pool(self, lease: Optional[_Lease]):
+        """Keep `lease` idle if it is of the current generation and there is room; close it otherwise."""
+        if lease is None:
+            return
+        with self._lock:
+            keep = (not self._closed and not self._retired and lease.generation == self._generation
+                    and len(self._idle) < self.max_idle)
+            if keep:
+                self._idle.append(lease)
+        if not keep:
+            lease.searcher.close()
+
+    def acquire(self) -> _Lease:
+        if self._closed:
+            raise RuntimeError("searcher manager is closed")
+        self._check_generation()
+        with self._lock:
+            self._leased += 1
+            if self._idle:
+                return self._idle.pop()
+            generation = self._generation
+        try:
+            searcher = self.ix.searcher()
+        except Exception:
+            with self._lock:
+                self._leased -= 1
+            raise
+        self.opened += 1
+        return _Lease(searcher, generation)
+
+    def release(self, lease: _Lease):
+        with self._lock:
+            self._leased -= 1
+            stale = lease.generation != self._generation and not self._closed and not self._retired
+        self._pool(self._refreshed(lease) if stale else lease)
+
+    @contextmanager
+    def searcher(self):
+        lease = self.acquire()
+        try:
+            yield lease.searcher
+        finally:
+            self.release(lease)
+
+    def warm(self):
+        """Open one searcher ahead of the first query."""
+        self.release(self.acquire())
+
+    @property
+    def leased(self) -> int:
+        return self._leased
+
+    def retire(self):
+        """
+        Stop pooling because another index took over: idle searchers close
+        now, leased ones when their query hands them back.
+        """
+        with self._lock:
+            self._retired = True
+            idle, self._idle = self._idle, []
+        for lease in idle:
+            lease.searcher.close()
+
+    def drain(self, timeout: float) -> bool:
+        """Wait until no searcher is leased. False if `timeout` passed first."""
+        deadline = time.monotonic() + timeout
+        while self._leased and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self._leased
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for lease in idle:
+            lease.searcher.close()
+
+    def stats(self) -> dict:
+        return {
+            "generation": self._generation,
+            "idle": len(self._idle),
+            "leased": self._leased,
+            "opened": self.opened,
+            "refreshes": self.refreshes,
+            "segments_reused": self.segments_reused,
+        }
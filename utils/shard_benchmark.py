@@ -0,0 +1,121 @@
+"""
+Query latency of the sharded index as the shard count grows.
+
+Builds one synthetic corpus into hash-sharded indexes with each shard
+count, runs the same query mix against each and prints build time and
+p50/p95/max search latency per shard count:
+
+    python -m utils.shard_benchmark [--docs N] [--queries N] [--shards 1,2,4,8]
+"""
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+
+def _vocabulary(size: int, rng: random.Random) -> List[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+    return sorted(words)
+
+
+def _corpus(docs: int, words_per_doc: int, vocab: List[str], rng: random.Random):
+    # Zipf-like term frequencies, so some terms are common and most are rare
+    cum_weights, total = [], 0.0
+    for rank in range(len(vocab)):
+        total += 1.0 / (rank + 1)
+        cum_weights.append(total)
+    for n in range(docs):
+        text = " ".join(rng.choices(vocab, cum_weights=cum_weights, k=words_per_doc))
+        yield f"/bench/{n % 50}/doc{n}.txt", text, rng.randint(100, 10_000_000)
+
+
+def _queries(count: int, vocab: List[str], rng: random.Random) -> List[str]:
+    head, tail = vocab[:50], vocab[50:2000]
+    queries = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(rng.choice(head))
+        elif kind < 0.8:
+            queries.append(f"{rng.choice(head)} {rng.choice(tail)}")
+        else:
+            queries.append(f"{rng.choice(tail)} OR {rng.choice(tail)}")
+    return queries
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run(docs: int, queries: int, shard_counts: List[int], limit: int = 50, seed: int = 7) -> List[dict]:
+    from datetime import datetime
+    from utils.sharded_indexer import ShardedIndexer
+    from utils.passages import index_docs
+
+    rng = random.Random(seed)
+    vocab = _vocabulary(20_000, rng)
+    corpus = list(_corpus(docs, 200, vocab, rng))
+    mix = _queries(queries, vocab, rng)
+    modified = datetime(2024, 1, 1)
+
+    rows = []
+    for count in shard_counts:
+        root = Path(tempfile.mkdtemp(prefix=f"shards{count}-"))
+        try:
+            ix = ShardedIndexer(str(root), mode="hash", count=count)
+            started = time.perf_counter()
+            bulk = ix.bulk_writer()
+            for path, text, size in corpus:
+                docs = index_docs(ix.schema, dict(path=path, filename=Path(path).name, filetype="txt",
+                                                  modified=modified.strftime("%Y-%m-%d %H:%M:%S"),
+                                                  modified_at=modified, size_bytes=size), text)
+                bulk.replace(path, docs, source_bytes=len(text))
+            bulk.close()
+            build = time.perf_counter() - started
+            ix.suggester.wait()
+
+            for q in mix[:20]:
+                ix.search(q, limit=limit)   # warm searchers and caches
+            latencies = []
+            for q in mix:
+                t = time.perf_counter()
+                ix.search(q, limit=limit, size_from_b=1000)
+                latencies.append((time.perf_counter() - t) * 1000)
+            ix.close()
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+        rows.append({
+            "shards": count,
+            "build_s": round(build, 2),
+            "p50_ms": round(_percentile(latencies, 0.50), 2),
+            "p95_ms": round(_percentile(latencies, 0.95), 2),
+            "max_ms": round(max(latencies), 2),
+        })
+        print(f"[bench] {rows[-1]}")
+    return rows
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--docs", type=int, default=5_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--shards", default="1,2,4,8")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    rows = run(args.docs, args.queries, [int(n) for n in args.shards.split(",")])
+    print(f"\n{'shards':>6} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for row in rows:
+        print(f"{row['shards']:>6} {row['build_s']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['max_ms']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,613 @@
+import os
+import sys
+import json
+import zlib
+import heapq
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
+from itertools import islice
+from math import log
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from whoosh import index as whoosh_index
+from whoosh.fields import NUMERIC
+from whoosh.reading import MultiReader
+from whoosh.scoring import BM25F, BM25FScorer, WeightScorer
+
+from .schema_migration import file_docs, iter_stored_files
+from .searcher_manager import SearcherManager
+from .suggester import Suggester
+from .whoosh_indexer import WhooshIndexer, BulkWriter, IndexProgress, sort_facet, wait_for_writer
+
+LAYOUT_FILE = "shards.json"
+DEFAULT_SHARD = "default"   # folder layout: files outside every registered folder
+
+
+def is_sharded(index_dir: str) -> bool:
+    return (Path(index_dir) / LAYOUT_FILE).exists()
+
+
+class Shard:
+    """One independent Whoosh index with its own searchers and write lock."""
+
+    def __init__(self, name: str, path: Path, schema, check_interval: float, read_only: bool = False):
+        self.name = name
+        self.path = path
+        self.ix = WhooshIndexer.open_or_create(path, schema, read_only)
+        self.searchers = SearcherManager(self.ix, check_interval=check_interval)
+        self.write_lock = threading.RLock()
+
+
+# ============================================================
+# CORPUS-WIDE SCORING
+# ============================================================
+class _CorpusStats:
+    """Term and field statistics summed over every shard's searcher."""
+
+    def __init__(self, searchers: list, terms, fields):
+        self.doc_count = sum(s.doc_count_all() for s in searchers)
+        self.doc_freq = {t: sum(s.doc_frequency(*t) for s in searchers) for t in terms}
+        self.field_length = {f: sum(s.field_length(f) for s in searchers) for f in fields}
+
+
+class _CorpusView:
+    """
+    What BM25FScorer asks the parent searcher for (idf, average field
+    length), answered from _CorpusStats; everything else goes to the
+    shard's own searcher. Terms only known after a shard expanded them
+    (prefix/wildcard queries) fall back to that shard's statistics.
+    """
+
+    def __init__(self, searcher, corpus: _CorpusStats):
+        self.searcher = searcher
+        self.corpus = corpus
+
+    def get_parent(self):
+        return self
+
+    def idf(self, fieldname, text):
+        # postings hand over the term as bytes, the parsed query held it as text
+        key = text.decode("utf-8") if isinstance(text, bytes) else text
+        n = self.corpus.doc_freq.get((fieldname, key))
+        if n is None:
+            return self.searcher.get_parent().idf(fieldname, text)
+        return log(self.corpus.doc_count / (n + 1)) + 1
+
+    def avg_field_length(self, fieldname, default=None):
+        if not self.searcher.schema[fieldname].scorable:
+            return default
+        return self.corpus.field_length.get(fieldname, 0) / (self.corpus.doc_count or 1)
+
+    def __getattr__(self, name):
+        return getattr(self.searcher, name)
+
+
+class _CorpusBM25F(BM25F):
+    """BM25F scored with corpus-wide statistics, so scores from different shards compare."""
+
+    def __init__(self, corpus: _CorpusStats, **kwargs):
+        super().__init__(**kwargs)
+        self.corpus = corpus
+
+    def scorer(self, searcher, fieldname, text, qf=1):
+        if not searcher.schema[fieldname].scorable:
+            return WeightScorer.for_(searcher, fieldname, text)
+        B = self._field_B.get(fieldname, self.B)
+        return BM25FScorer(_CorpusView(searcher, self.corpus), fieldname, text, B, self.K1, qf=qf)
+
+
+# ============================================================
+# SHARD-WIDE FACADES
+# ============================================================
+class ShardedSearchers:
+    """
+    The parts of SearcherManager that callers outside the indexer use
+    (generation checks, staleness, stats), summed over every shard. Each
+    shard's generation only grows, so the sum changes on every commit.
+    """
+
+    def __init__(self, indexer: "ShardedIndexer"):
+        self.indexer = indexer
+
+    def _managers(self) -> List[SearcherManager]:
+        return [s.searchers for s in self.indexer.shard_list()]
+
+    @property
+    def generation(self) -> int:
+        return sum(m.generation for m in self._managers())
+
+    def current_generation(self) -> int:
+        return sum(m.current_generation() for m in self._managers())
+
+    def mark_stale(self):
+        for m in self._managers():
+            m.mark_stale()
+
+    def warm(self):
+        for m in self._managers():
+            m.warm()
+
+    def close(self):
+        for m in self._managers():
+            m.close()
+
+    def stats(self) -> dict:
+        shards = {s.name: s.searchers.stats() for s in self.indexer.shard_list()}
+        totals = {k: sum(st[k] for st in shards.values()) for k in ("idle", "leased", "opened", "refreshes")}
+        return {"generation": self.generation, **totals, "shards": shards}
+
+
+class _ShardSetView:
+    """All shards read as one index; what the Suggester needs from an `ix`."""
+
+    def __init__(self, indexer: "ShardedIndexer"):
+        self.indexer = indexer
+
+    def latest_generation(self) -> int:
+        return sum(s.ix.latest_generation() for s in self.indexer.shard_list())
+
+    def reader(self):
+        readers = [s.ix.reader() for s in self.indexer.shard_list()]
+        return readers[0] if len(readers) == 1 else MultiReader(readers)
+
+
+class ShardedBulkWriter:
+    """
+    BulkWriter interface over per-shard BulkWriters, routing each
+    document by path. A batch is committed across all the shards it
+    touched at once, so `on_commit` still only runs when everything
+    pending is in the index. A batch only holds the write locks of the
+    shards it writes to, and never waits for a shard's lock while holding
+    another's: it commits what it has first (two writers taking shard
+    locks in different orders could otherwise deadlock).
+    """
+
+    def __init__(self, indexer: "ShardedIndexer", batch_docs: int, batch_bytes: int,
+                 limitmb: int = 128, optimize: bool = False,
+                 on_commit: Optional[Callable[[], None]] = None):
+        self.indexer = indexer
+        self.batch_docs = max(1, batch_docs)
+        self.batch_bytes = max(1, batch_bytes)
+        self.limitmb = limitmb
+        self.optimize = optimize
+        self.on_commit = on_commit
+        self.writers: Dict[str, BulkWriter] = {}
+
+        self._pending_docs = 0
+        self._pending_bytes = 0
+
+        self.docs = 0
+        self.bytes = 0
+        self.deleted = 0
+        self.commits = 0
+
+    def _writer(self, path: str, create: bool = True) -> Optional[BulkWriter]:
+        shard = self.indexer.shard_for(path, create=create)
+        if shard is None:
+            return None
+        w = self.writers.get(shard.name)
+        if w is None:
+            # batching is decided here, across shards
+            w = self.writers[shard.name] = BulkWriter(
+                lambda: shard.ix, batch_docs=sys.maxsize, batch_bytes=sys.maxsize,
+                limitmb=self.limitmb, lock=shard.write_lock, journal=self.indexer._journal_paths)
+        if not w.is_open and any(o.is_open for o in self.writers.values()):
+            if not w.open(blocking=False):
+                self.flush()
+        return w
+
+    def update(self, fields: dict, source_bytes: int = 0):
+        self._writer(fields["path"]).update(fields, source_bytes)
+        self._written(source_bytes)
+
+    def replace(self, path: str, docs: List[dict], source_bytes: int = 0):
+        self._writer(path).replace(path, docs, source_bytes)
+        self._written(source_bytes)
+
+    def _written(self, source_bytes: int):
+        self._pending_docs += 1
+        self._pending_bytes += source_bytes
+        self.docs += 1
+        self.bytes += source_bytes
+
+        if self._pending_docs >= self.batch_docs or self._pending_bytes >= self.batch_bytes:
+            self.flush()
+
+    def delete(self, path: str):
+        w = self._writer(path, create=False)
+        if w is not None:
+            w.delete(path)
+            self._pending_docs += 1
+        self.deleted += 1
+
+    def flush(self, merge: bool = False, optimize: bool = False) -> bool:
+        committed = False
+        for w in self.writers.values():
+            committed = w.flush(merge=merge, optimize=optimize) or committed
+        if not committed:
+            return False
+        self.commits += 1
+        self._pending_docs = 0
+        self._pending_bytes = 0
+        if self.on_commit:
+            self.on_commit()
+        return True
+
+    def close(self):
+        if not self.flush(merge=True, optimize=self.optimize) and self.on_commit and self.commits:
+            self.on_commit()
+
+    def cancel(self):
+        for w in self.writers.values():
+            w.cancel()
+        self._pending_docs = 0
+        self._pending_bytes = 0
+
+
+# ============================================================
+# SHARDED INDEXER
+# ============================================================
+class ShardedIndexer(WhooshIndexer):
+    """
+    WhooshIndexer over several independent Whoosh indexes ("shards") in
+    subdirectories of `index_dir`, described by `shards.json`.
+
+    The "folder" layout gives every indexed folder its own shard (a file
+    belongs to the first registered folder containing it), so reindexing
+    one folder neither grows nor locks the others' segments. The "hash"
+    layout spreads files over `count` shards by path hash. Searches run
+    on every shard in parallel with the same query and filter, each
+    returning its top offset+limit, and the ranked lists are merged into
+    the global page.
+
+    The layout of an existing index wins over the settings; an unsharded
+    index found in `index_dir` is copied into the shards once. A
+    `read_only` instance waits for the writer to lay the shards out and
+    opens the folder shards it adds later in follow_writer().
+    """
+
+    def __init__(self, index_dir: str, mode: Optional[str] = None, count: Optional[int] = None,
+                 read_only: bool = False):
+        from config.settings import settings
+        self.index_dir = Path(index_dir)
+        self.read_only = read_only
+        if not read_only:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.schema = self._get_schema()
+        self.writer_service = None
+        self._check_interval = settings.SEARCHER_REFRESH_SECONDS
+        self._lock = threading.RLock()
+        self.shards: Dict[str, Shard] = {}
+
+        self.layout = self._load_layout(mode or settings.INDEX_SHARDING or "hash",
+                                        count or settings.INDEX_SHARDS)
+        self.mode = self.layout["mode"]
+        if self.mode == "hash":
+            for n in range(self.layout["count"]):
+                self._open_shard(self._hash_name(n))
+        else:
+            self._open_shard(DEFAULT_SHARD)
+            for name, _ in self.layout["folders"]:
+                self._open_shard(name)
+
+        self.searchers = ShardedSearchers(self)
+        self.pool = ThreadPoolExecutor(max_workers=max(1, settings.SHARD_SEARCH_THREADS),
+                                       thread_name_prefix="shard-search")
+        if read_only:
+            self.schema = self.shard_list()[0].ix.schema
+        else:
+            self._migrate_unsharded()
+
+        self.suggester = Suggester(
+            _ShardSetView(self), self.index_dir,
+            max_distance=settings.SUGGEST_MAX_EDIT_DISTANCE,
+            prefix_length=settings.SUGGEST_PREFIX_LENGTH,
+            max_terms=settings.SUGGEST_MAX_TERMS,
+            read_only=read_only,
+        )
+        self.suggester.schedule_rebuild()
+
+    def close(self):
+        super().close()
+        self.pool.shutdown(wait=False)
+
+    # -------------------------------
+    # Layout
+    # -------------------------------
+    def _load_layout(self, mode: str, count: int) -> dict:
+        path = self.index_dir / LAYOUT_FILE
+        if self.read_only:
+            wait_for_writer(path.exists, f"the shard layout {path}")
+        if path.exists():
+            layout = json.loads(path.read_text(encoding="utf-8"))
+            if layout["mode"] != mode or (mode == "hash" and layout["count"] != count):
+                print(f"[shards] {self.index_dir} is laid out as {layout['mode']}"
+                      f"{':' + str(layout['count']) if layout['mode'] == 'hash' else ''};"
+                      f" keeping that layout (rebuild the index to change it)")
+            return layout
+        if mode not in ("hash", "folder"):
+            raise ValueError(f"unknown shard layout {mode!r} (expected 'hash' or 'folder')")
+        layout = {"mode": mode, "count": max(1, count) if mode == "hash" else None, "folders": []}
+        self._save_layout(layout)
+        return layout
+
+    def _save_layout(self, layout: dict):
+        path = self.index_dir / LAYOUT_FILE
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(layout, indent=2), encoding="utf-8")
+        tmp.replace(path)
+
+    @staticmethod
+    def _hash_name(n: int) -> str:
+        return f"h{n:02d}"
+
+    def register_folder(self, folder: str):
+        """Give `folder` its own shard (folder layout) unless a registered folder contains it."""
+        if self.mode != "folder":
+            return
+        self._check_writable()
+        root = os.path.abspath(folder)
+        with self._lock:
+            if self._folder_shard(root) != DEFAULT_SHARD:
+                return
+            name = "f-" + hashlib.sha1(os.path.normcase(root).encode("utf-8")).hexdigest()[:12]
+            self.layout["folders"].append([name, root])
+            self._save_layout(self.layout)
+            self._open_shard(name)
+        print(f"[shards] new shard {name} for {root}")
+
+    def follow_writer(self):
+        """Read-only: open the shards the writer added for new folders, then catch up like one index."""
+        layout = json.loads((self.index_dir / LAYOUT_FILE).read_text(encoding="utf-8"))
+        if layout != self.layout:
+            for name, root in layout["folders"]:
+                if name not in self.shards:
+                    self._open_shard(name)
+                    print(f"[shards] following new shard {name} for {root}")
+            self.layout = layout
+        self.schema = self.shard_list()[0].ix.schema
+        self.suggester.refresh()
+
+    def _folder_shard(self, path: str) -> str:
+        key = os.path.normcase(path)
+        for name, root in self.layout["folders"]:
+            root = os.path.normcase(root)
+            if key == root or key.startswith(root.rstrip(os.sep) + os.sep):
+                return name
+        return DEFAULT_SHARD
+
+    def _open_shard(self, name: str) -> Shard:
+        with self._lock:
+            shard = self.shards.get(name)
+            if shard is None:
+                shard = self.shards[name] = Shard(name, self.index_dir / name, self.schema,
+                                                  self._check_interval, self.read_only)
+            return shard
+
+    def shard_list(self) -> List[Shard]:
+        with self._lock:
+            return list(self.shards.values())
+
+    def shard_for(self, path: str, create: bool = True) -> Optional[Shard]:
+        if self.mode == "hash":
+            n = zlib.crc32(os.path.normcase(path).encode("utf-8")) % self.layout["count"]
+            return self.shards[self._hash_name(n)]
+        name = self._folder_shard(path)
+        return self._open_shard(name) if create else self.shards.get(name)
+
+    def _migrate_unsharded(self):
+        """Copy the documents of a single index left in `index_dir` into the shards."""
+        if not whoosh_index.exists_in(str(self.index_dir)):
+            return
+        print(f"[shards] copying the unsharded index at {self.index_dir} into {self.mode} shards")
+        src = whoosh_index.open_dir(str(self.index_dir))
+        bulk = self.bulk_writer()
+        copied = 0
+        try:
+            with src.reader() as reader:
+                for stored in iter_stored_files(reader):
+                    docs = file_docs(stored, self.schema)
+                    if docs is None:
+                        continue
+                    if self.mode == "folder":
+                        # an index only knows its files, so guess the folder from the folder list
+                        self._register_stored_folder(docs[0]["path"])
+                    bulk.replace(docs[0]["path"], docs)
+                    copied += 1
+            bulk.close()
+        except Exception:
+            bulk.cancel()
+            raise
+        finally:
+            src.close()
+
+        for f in self.index_dir.iterdir():
+            if f.is_file() and ("MAIN_" in f.name or f.name.startswith("suggest_")):
+                f.unlink()
+        print(f"[shards] copied {copied} files")
+
+    def _register_stored_folder(self, path: str):
+        if self._folder_shard(path) != DEFAULT_SHARD:
+            return
+        from utils.storage_helper import read_indexed_folders
+        key = os.path.normcase(os.path.abspath(path))
+        for folder in read_indexed_folders():
+            root = os.path.normcase(os.path.abspath(folder))
+            if key.startswith(root.rstrip(os.sep) + os.sep):
+                self.register_folder(folder)
+                return
+
+    # -------------------------------
+    # Writes
+    # -------------------------------
+    def bulk_writer(self, on_commit: Optional[Callable[[], None]] = None) -> ShardedBulkWriter:
+        from config.settings import settings
+        self._check_writable()
+
+        def committed():
+            self.searchers.mark_stale()
+            if on_commit:
+                on_commit()
+
+        return ShardedBulkWriter(
+            self,
+            batch_docs=settings.INDEX_BATCH_DOCS,
+            batch_bytes=settings.INDEX_BATCH_BYTES,
+            limitmb=settings.INDEX_WRITER_LIMIT_MB,
+            optimize=settings.INDEX_OPTIMIZE_ON_FINISH,
+            on_commit=committed,
+        )
+
+    def add_or_update(self, path: Path, content: str):
+        bulk = self.bulk_writer()
+        try:
+            bulk.replace(os.path.abspath(path), self._index_docs(path, content))
+            bulk.close()
+        except Exception:
+            bulk.cancel()
+            return
+        self.suggester.schedule_rebuild()
+
+    def delete_paths(self, paths: List[str]):
+        bulk = self.bulk_writer()
+        try:
+            for path in paths:
+                bulk.delete(path)
+            bulk.close()
+        except Exception:
+            bulk.cancel()
+            raise
+        self.suggester.schedule_rebuild()
+
+    def index_folder(self, folder: str, allowed_exts: Optional[List[str]] = None,
+                     progress: Optional[IndexProgress] = None) -> dict:
+        self._check_writable()
+        if Path(folder).is_dir():
+            self.register_folder(str(Path(folder).resolve()))
+        return super().index_folder(folder, allowed_exts, progress)
+
+    # -------------------------------
+    # Reads
+    # -------------------------------
+    def _stored_doc(self, path: str) -> Optional[dict]:
+        shard = self.shard_for(path, create=False)
+        if shard is None:
+            return None
+        with shard.searchers.searcher() as s:
+            return s.document(path=path)
+
+    def _stored_docs(self, path: str) -> List[dict]:
+        shard = self.shard_for(path, create=False)
+        if shard is None:
+            return []
+        with shard.searchers.searcher() as s:
+            return list(s.documents(path=path))
+
+    @contextmanager
+    def _ranked(self, q, filter_q, offset: int, limit: int,
+                sortedby: Optional[str] = None, reverse: bool = False,
+                collapse: Optional[str] = None, collapse_limit: int = 1):
+        """
+        Fan `q` out to every shard and merge their ranked lists. Each
+        shard applies the filter itself, so its top offset+limit hits are
+        the best filtered hits it holds and the merged page is exact
+        (collapsing by path is too: every file lives in one shard).
+        Relevance is scored with corpus-wide BM25 statistics, so the
+        merged order matches what a single index would return.
+        """
+        leases = []
+        try:
+            for shard in self.shard_list():
+                leases.append((shard.searchers, shard.searchers.acquire()))
+
+            searchers = [lease.searcher for _, lease in leases]
+            weighting = None
+            if not sortedby and len(searchers) > 1:
+                fields = [name for name, field in self.schema.items() if field.scorable]
+                weighting = _CorpusBM25F(_CorpusStats(searchers, set(q.iter_all_terms()), fields))
+
+            facet = sort_facet(self.schema, sortedby, reverse) if sortedby else None
+
+            def run(searcher):
+                if weighting is None:
+                    return searcher.search(q, limit=offset + limit, filter=filter_q, sortedby=facet,
+                                           collapse=collapse, collapse_limit=collapse_limit)
+                default, searcher.weighting = searcher.weighting, weighting
+                try:
+                    return searcher.search(q, limit=offset + limit, filter=filter_q,
+                                           collapse=collapse, collapse_limit=collapse_limit)
+                finally:
+                    searcher.weighting = default
+
+            if len(searchers) == 1:
+                results = [run(searchers[0])]
+            else:
+                results = list(self.pool.map(run, searchers))
+
+            if sortedby and isinstance(self.schema[sortedby], NUMERIC):
+                # a sorted hit's score is its sort_facet key: hits without a value come last either way
+                merged = heapq.merge(*results, key=lambda h: h.score)
+            elif sortedby:
+                # reversed text keys are per-shard ordinals, so compare the values (every doc has a path)
+                merged = heapq.merge(*results, key=lambda h: h.get(sortedby), reverse=reverse)
+            else:
+                merged = heapq.merge(*results, key=lambda h: h.score, reverse=True)
+            yield list(islice(merged, offset, offset + limit))
+        finally:
+            for manager, lease in leases:
+                manager.release(lease)
+
+    # -------------------------------
+    # Rebuild support
+    # -------------------------------
+    def shadow(self, index_dir: str) -> "ShardedIndexer":
+        shadow = type(self)(index_dir, mode=self.mode, count=self.layout["count"])
+        for _, root in self.layout["folders"]:
+            shadow.register_folder(root)   # same folders, same shard names, same routing
+        return shadow
+
+    def reader(self):
+        return _ShardSetView(self).reader()
+
+    @contextmanager
+    def frozen_writes(self):
+        with ExitStack() as stack:
+            # writers never wait on a shard lock while holding another, so any order is safe here
+            for shard in sorted(self.shard_list(), key=lambda s: s.name):
+                stack.enter_context(shard.write_lock)
+            yield
+
+    def live_parts(self) -> list:
+        return [(s.searchers, s.ix) for s in self.shard_list()]
+
+    def adopt(self, other: "ShardedIndexer") -> list:
+        # Shard objects (and their write locks) stay; writers re-read shard.ix per batch
+        retired = []
+        with self._lock:
+            for name, new in other.shards.items():
+                shard = self.shards.get(name)
+                if shard is None:
+                    self.shards[name] = new
+                    continue
+                retired.append((shard.searchers, shard.ix))
+                shard.path, shard.ix, shard.searchers = new.path, new.ix, new.searchers
+            for name in set(self.shards) - set(other.shards):
+                shard = self.shards.pop(name)
+                retired.append((shard.searchers, shard.ix))
+            self.index_dir = other.index_dir
+            self.layout = other.layout
+            self.mode = other.mode
+        self.suggester = other.suggester
+        self.suggester.ix = _ShardSetView(self)
+        other.pool.shutdown(wait=False)
+        return retired
+
+    def shard_stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "shards": {s.name: s.ix.doc_count() for s in self.shard_list()},
+            "folders": {name: root for name, root in self.layout["folders"]},
+        }
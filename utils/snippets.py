@@ -0,0 +1,193 @@
+"""
+Snippets for indexes that do not store the full document text.
+
+With INDEX_CONTENT_STORE=excerpt|none the text of `content` is not kept
+in the index. Each document gets a `content_offsets` column instead: the
+start character of every token position, delta-encoded and compressed.
+A snippet then needs no re-analysis: the postings of the matched terms
+give their positions in the document, the column turns them into
+character offsets, and only the text around the best cluster of matches
+is cut out of the stored excerpt (or, past the excerpt, out of the
+extraction cache).
+
+With INDEX_CONTENT_STORE=none the extraction cache is the only source of
+text: when it is disabled (EXTRACT_CACHE_MAX_MB=0), or has dropped the
+file, hits come back with an empty snippet. Files are not extracted
+again at search time.
+"""
+import re
+import zlib
+from array import array
+from itertools import accumulate
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+OFFSETS_FIELD = "content_offsets"
+FRAGMENT_CHARS = 200   # same budget as Whoosh's ContextFragmenter
+SURROUND_CHARS = 20
+TOP_FRAGMENTS = 5
+MAX_TERMS = 16         # a wide prefix/wildcard expansion is cut to this many terms per snippet
+
+_WORD = re.compile(r"\w+")
+
+
+# -------------------------------
+# Index side
+# -------------------------------
+def make_excerpt(text: str, max_chars: int) -> bytes:
+    """Compressed leading `max_chars` characters of `text`, for the stored `excerpt` field."""
+    return zlib.compress(text[:max_chars].encode("utf-8"), 6)
+
+
+def read_excerpt(blob: Optional[bytes]) -> str:
+    if not blob:
+        return ""
+    try:
+        return zlib.decompress(blob).decode("utf-8")
+    except (zlib.error, UnicodeDecodeError):
+        return ""
+
+
+def make_offsets(analyzer, text: str) -> bytes:
+    """Start character of each token position the analyzer assigns to `text`, as compressed deltas."""
+    deltas = array("I")
+    last = 0
+    for t in analyzer(text, positions=True, chars=True):
+        # positions are dense: the stop filter renumbers what it keeps
+        deltas.append(t.startchar - last)
+        last = t.startchar
+    return zlib.compress(deltas.tobytes(), 6)
+
+
+def read_offsets(blob: Optional[bytes]) -> List[int]:
+    if not blob:
+        return []
+    deltas = array("I")
+    try:
+        deltas.frombytes(zlib.decompress(blob))
+    except (zlib.error, ValueError):
+        return []
+    return list(accumulate(deltas))
+
+
+def content_fields(schema, text: str) -> dict:
+    """The fields that stand in for the text of `content` in `schema` (none when it is stored)."""
+    fields = {}
+    if "excerpt" in schema:
+        from config.settings import settings
+        fields["excerpt"] = make_excerpt(text, settings.INDEX_EXCERPT_CHARS)
+    if OFFSETS_FIELD in schema:
+        fields[OFFSETS_FIELD] = make_offsets(schema["content"].analyzer, text)
+    return fields
+
+
+# -------------------------------
+# Search side
+# -------------------------------
+class SnippetTerms:
+    """
+    Terms of `fieldname` that query `q` matches (prefixes/wildcards
+    expanded), for the snippets of one page of hits. They are expanded
+    once per searcher the hits come from: shards each have their own terms.
+    """
+
+    def __init__(self, q, fieldname: str = "content"):
+        self.q = q
+        self.fieldname = fieldname
+        self._by_searcher = {}
+
+    def for_hit(self, hit) -> List[bytes]:
+        key = id(hit.searcher)
+        terms = self._by_searcher.get(key)
+        if terms is None:
+            terms = sorted(text for name, text in self.q.existing_terms(hit.searcher.reader(), expand=True)
+                           if name == self.fieldname)[:MAX_TERMS]
+            self._by_searcher[key] = terms
+        return terms
+
+
+def match_positions(reader, docnum: int, fieldname: str, terms: Iterable) -> List[int]:
+    """Token positions of `terms` in one document, from the postings of those terms only."""
+    positions = []
+    for term in terms:
+        postings = reader.postings(fieldname, term)
+        postings.skip_to(docnum)
+        if postings.is_active() and postings.id() == docnum:
+            positions.extend(postings.value_as("positions"))
+    positions.sort()
+    return positions
+
+
+def fragments(text: str, starts: List[int]) -> str:
+    """
+    The TOP_FRAGMENTS windows of `text` holding the most matches, in
+    document order and joined with "...", like Whoosh's highlighter output.
+    """
+    frags = []   # [start, end, matches]
+    for start in starts:
+        word = _WORD.match(text, start)
+        if word is None:
+            break   # past the end of `text`
+        end = word.end()
+        if frags and end - frags[-1][0] <= FRAGMENT_CHARS:
+            frags[-1][1] = end
+            frags[-1][2] += 1
+        else:
+            frags.append([start, end, 1])
+
+    best = sorted(sorted(frags, key=lambda f: -f[2])[:TOP_FRAGMENTS])
+    parts = []
+    for start, end, _ in best:
+        lo = max(0, start - SURROUND_CHARS)
+        hi = min(len(text), end + SURROUND_CHARS)
+        # do not cut words in half
+        if lo > 0:
+            space = text.find(" ", lo, start)
+            lo = space + 1 if space != -1 else lo
+        if hi < len(text):
+            space = text.rfind(" ", end, hi)
+            hi = space if space != -1 else hi
+        parts.append(text[lo:hi])
+    return " ".join("...".join(parts).split())
+
+
+def cached_text(path: str, page: Optional[int] = None) -> Optional[str]:
+    """
+    Full text of an indexed file from the extraction cache, if its current
+    version is there; only passage `page` of it for passage-level documents.
+    """
+    from utils.extraction_cache import cache_key, get_extraction_cache
+    from utils.state_store import get_state_store
+    cache = get_extraction_cache()
+    if cache is None:
+        return None
+    state = get_state_store().get(path)
+    if state is None or not state.content_hash:
+        return None
+    text = cache.get(cache_key(state.content_hash, Path(path).suffix))
+    if text is None or page is None:
+        return text
+    from config.settings import settings
+    from utils.passages import split_passages
+    return dict(split_passages(text, Path(path).suffix.lower(), settings.PASSAGE_CHARS)).get(page)
+
+
+def offsets_snippet(hit, terms: Iterable, fieldname: str = "content") -> str:
+    """Snippet around the `terms` (see SnippetTerms) of `hit`; empty when no text is at hand."""
+    reader = hit.searcher.reader()
+    excerpt = read_excerpt(hit.get("excerpt"))
+    starts = []
+    positions = match_positions(reader, hit.docnum, fieldname, terms)
+    if positions:
+        offsets = read_offsets(reader.column_reader(OFFSETS_FIELD)[hit.docnum])
+        starts = [offsets[p] for p in positions if p < len(offsets)]
+
+    text = excerpt
+    if starts and starts[0] >= len(excerpt):
+        # every match lies past the stored excerpt
+        text = cached_text(hit.get("path"), hit.get("page")) or ""
+    snippet = fragments(text, starts) if starts else ""
+    if not snippet:
+        snippet = " ".join(excerpt[:FRAGMENT_CHARS].split())   # no newlines or page breaks
+        return snippet + "..." if snippet else ""
+    return snippet
@@ -0,0 +1,106 @@
+"""
+Startup timing of the API process, reported by /api/index-metrics.
+
+main_api records when its imports began; the lifespan hook times opening
+the index and starting the job scheduler, then marks the app ready.
+Warm-up steps that a request can do without (spellchecker dictionary,
+parser libraries, the local filename index) run on a background thread
+after that. Each step is timed and its errors are recorded.
+"""
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.lazy_imports import loaded
+
+
+def _ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+class StartupReport:
+    def __init__(self):
+        self.imports_started: Optional[float] = None
+        self.imports_ms: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+        self.ready_ms: Optional[float] = None
+        self.warm: Dict[str, float] = {}
+        self.warm_errors: Dict[str, str] = {}
+        self.warm_status = "off"
+
+    def imported(self, started: float):
+        """main_api finished importing; `started` is perf_counter() from its first line."""
+        self.imports_started = started
+        self.imports_ms = _ms(started)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = _ms(started)
+
+    def ready(self):
+        self.ready_ms = _ms(self.imports_started) if self.imports_started is not None else None
+        steps = ", ".join(f"{name} {ms} ms" for name, ms in self.phases.items())
+        print(f"[startup] ready in {self.ready_ms} ms (imports {self.imports_ms} ms, {steps})")
+
+    def warm_in_background(self, steps: List[Tuple[str, Callable[[], object]]]):
+        self.warm_status = "running"
+
+        def run():
+            started = time.perf_counter()
+            for name, step in steps:
+                t = time.perf_counter()
+                try:
+                    step()
+                except Exception as e:
+                    self.warm_errors[name] = str(e)
+                self.warm[name] = _ms(t)
+            self.warm_status = "done"
+            print(f"[startup] warmed in {_ms(started)} ms"
+                  + (f", failed: {', '.join(self.warm_errors)}" if self.warm_errors else ""))
+
+        threading.Thread(target=run, name="startup-warm", daemon=True).start()
+
+    def to_dict(self) -> dict:
+        return {
+            "imports_ms": self.imports_ms,
+            "phases_ms": dict(self.phases),
+            "ready_ms": self.ready_ms,
+            "warm": {"status": self.warm_status, "steps_ms": dict(self.warm), "errors": dict(self.warm_errors)},
+            "lazy_imports_ms": loaded(),
+        }
+
+
+def warm_steps() -> List[Tuple[str, Callable[[], object]]]:
+    """What the background warm-up loads, in order; each step is also done lazily on first use."""
+    from config.settings import settings
+    from utils.index_manager import get_indexer
+    from utils.search_engine import get_search_engine
+    from utils.whoosh_extractors import warm_extractor_libs
+
+    steps = [
+        # both SearcherManager and ShardedSearchers open their searchers ahead of the first query
+        ("searcher", lambda: get_indexer().searchers.warm()),
+        ("search_engine", get_search_engine),
+        ("spellchecker", lambda: get_indexer().suggester.wait()),
+    ]
+    if settings.FILENAME_BACKEND == "local":
+        from utils.filename_index import get_filename_index
+        steps.append(("filename_index", get_filename_index))
+    if settings.ENABLE_ABBREVIATION_AI:
+        from utils.abbreviation_ai import get_expander
+        steps.append(("abbreviations", get_expander))
+    # show-content extracts in this process on a cache miss
+    steps.append(("extractor_libs", warm_extractor_libs))
+    return steps
+
+
+_report = StartupReport()
+
+
+def get_startup_report() -> StartupReport:
+    return _report
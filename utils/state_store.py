@@ -0,0 +1,284 @@
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from utils.storage_helper import (
+    STATE_DB_FILE, ensure_storage,
+    INDEX_META_FILE, QUARANTINE_FILE, read_index_meta, read_quarantine,
+)
+
+# extraction status of a file
+INDEXED = "indexed"
+EMPTY = "empty"              # extractor returned no text; nothing in the index
+QUARANTINED = "quarantined"  # broke the extraction limits; skipped until it changes
+
+FileState = namedtuple("FileState", "path mtime_ns size content_hash indexed_at status reason")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path         TEXT PRIMARY KEY,
+    mtime_ns     INTEGER NOT NULL,
+    size         INTEGER NOT NULL,
+    content_hash TEXT,
+    indexed_at   REAL,
+    status       TEXT NOT NULL,
+    reason       TEXT
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path     TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id         TEXT PRIMARY KEY,
+    folder     TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    progress   TEXT,
+    error      TEXT
+);
+CREATE TABLE IF NOT EXISTS job_requests (
+    job_id       TEXT NOT NULL,
+    action       TEXT NOT NULL,
+    requested_at REAL NOT NULL
+);
+"""
+
+
+def prefix_range(folder: str):
+    """[lo, hi) bounds selecting every path under `folder` via the primary-key index."""
+    lo = folder.rstrip("\\/") + os.sep
+    hi = lo[:-1] + chr(ord(os.sep) + 1)
+    return lo, hi
+
+
+class StateStore:
+    """
+    Per-file indexing state (path, mtime, size, content hash, indexed-at,
+    extraction status) in an embedded SQLite database in WAL mode.
+
+    Every change is a single-row (or batched) statement, so a watcher event
+    no longer rewrites the state of every other file. Lookups by folder use
+    a range scan on the `path` primary key.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    # -------------------------------
+    # Reads
+    # -------------------------------
+    def get(self, path: str) -> Optional[FileState]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM files WHERE path = ?", (path,)).fetchone()
+        return FileState(*row) if row else None
+
+    def iter_folder(self, folder: str) -> Iterator[FileState]:
+        lo, hi = prefix_range(folder)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM files WHERE path >= ? AND path < ?", (lo, hi)
+            ).fetchall()
+        for row in rows:
+            yield FileState(*row)
+
+    def snapshot(self, folder: str) -> Dict[str, FileState]:
+        return {s.path: s for s in self.iter_folder(folder)}
+
+    def dir_snapshot(self, folder: str) -> Dict[str, int]:
+        """Stored directory mtimes (path → mtime_ns) for `folder` and everything below it."""
+        lo, hi = prefix_range(folder)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, mtime_ns FROM dirs WHERE path = ? OR (path >= ? AND path < ?)",
+                (folder, lo, hi),
+            ).fetchall()
+        return dict(rows)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    # -------------------------------
+    # Writes
+    # -------------------------------
+    def upsert(self, path: str, mtime_ns: int, size: int, content_hash: Optional[str] = None,
+               status: str = INDEXED, reason: Optional[str] = None):
+        self.upsert_many([(path, mtime_ns, size, content_hash, status, reason)])
+
+    def upsert_many(self, rows: Iterable[tuple]):
+        """rows: (path, mtime_ns, size, content_hash, status, reason)"""
+        now = datetime.now().timestamp()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO files (path, mtime_ns, size, content_hash, indexed_at, status, reason) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((p, m, s, h, now, st, r) for p, m, s, h, st, r in rows),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def quarantine(self, path: str, mtime_ns: int, size: int, reason: str):
+        print(f"[quarantine] {reason}: {path}")
+        self.upsert(path, mtime_ns, size, status=QUARANTINED, reason=reason)
+
+    def delete(self, path: str):
+        self.delete_many([path])
+
+    def delete_many(self, paths: Iterable[str]):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("DELETE FROM files WHERE path = ?", ((p,) for p in paths))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def replace_dirs(self, folder: str, dirs: Dict[str, int]):
+        """Replace the stored directory mtimes of `folder` with the ones from the last scan."""
+        lo, hi = prefix_range(folder)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (folder, lo, hi))
+                self._conn.executemany("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)", dirs.items())
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # -------------------------------
+    # Indexing jobs
+    # -------------------------------
+    def save_job(self, job_id: str, folder: str, status: str, created_at: float,
+                 progress: Optional[str] = None, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, folder, status, created_at, updated_at, progress, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, folder, status, created_at, datetime.now().timestamp(), progress, error),
+            )
+
+    def load_jobs(self, status: Optional[str] = None) -> List[tuple]:
+        """(id, folder, status, created_at, updated_at, progress, error), oldest first."""
+        with self._lock:
+            if status is None:
+                return self._conn.execute("SELECT * FROM jobs ORDER BY created_at").fetchall()
+            return self._conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at",
+                                      (status,)).fetchall()
+
+    def request_job(self, job_id: str, action: str):
+        """Ask the process running the jobs to cancel/pause/resume `job_id`."""
+        with self._lock:
+            self._conn.execute("INSERT INTO job_requests (job_id, action, requested_at) VALUES (?, ?, ?)",
+                               (job_id, action, datetime.now().timestamp()))
+
+    def take_job_requests(self) -> List[tuple]:
+        """(job_id, action) requests in the order they were made, removed from the store."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT job_id, action FROM job_requests ORDER BY requested_at").fetchall()
+                self._conn.execute("DELETE FROM job_requests")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def prune_jobs(self, statuses: Iterable[str], keep: int):
+        """Delete all but the newest `keep` jobs in `statuses`."""
+        statuses = list(statuses)
+        marks = ",".join("?" * len(statuses))
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({marks}) AND id NOT IN "
+                f"(SELECT id FROM jobs WHERE status IN ({marks}) ORDER BY created_at DESC LIMIT ?)",
+                (*statuses, *statuses, keep),
+            )
+
+    # -------------------------------
+    # One-time migration from JSON
+    # -------------------------------
+    def _get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def migrate_json(self):
+        """
+        Import index_meta.json and quarantine.json once. Their mtimes are
+        second-resolution strings, so each file is stat'ed: if it still
+        matches, its exact mtime_ns/size are recorded; otherwise it gets
+        mtime_ns=0 so the next index_folder run re-indexes it.
+        """
+        if self._get_meta("json_migrated"):
+            return
+
+        rows = []
+        sources = [(read_index_meta(), INDEXED), (read_quarantine(), QUARANTINED)]
+        for entries, status in sources:
+            for path, value in entries.items():
+                old_mtime = value.get("mtime") if isinstance(value, dict) else value
+                reason = value.get("reason") if isinstance(value, dict) else None
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                current = datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+                mtime_ns = st.st_mtime_ns if current == old_mtime else 0
+                rows.append((str(Path(path).resolve()), mtime_ns, st.st_size, None, status, reason))
+
+        if rows:
+            self.upsert_many(rows)
+            print(f"[state] migrated {len(rows)} entries from JSON metadata")
+        for legacy in (INDEX_META_FILE, QUARANTINE_FILE):
+            try:
+                legacy.replace(legacy.with_suffix(".json.migrated"))
+            except FileNotFoundError:
+                pass   # never written, or another API process moved it first
+        self._set_meta("json_migrated", datetime.now().isoformat())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[StateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    """Process-wide state store, migrated from the JSON files on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            ensure_storage()
+            _store = StateStore(STATE_DB_FILE)
+            _store.migrate_json()
+        return _store
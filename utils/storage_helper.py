@@ -6,6 +6,12 @@ ROOT = Path(__file__).resolve().parents[1]
 STORAGE_DIR = ROOT / "storage"
 INDEX_FILE = STORAGE_DIR / "indexed_folders.json"
 INDEX_META_FILE = STORAGE_DIR / "index_meta.json" 
+QUARANTINE_FILE = STORAGE_DIR / "quarantine.json"
+STATE_DB_FILE = STORAGE_DIR / "index_state.db"
+FILENAME_INDEX_FILE = STORAGE_DIR / "filename_index.pkl"
+EXTRACT_CACHE_FILE = STORAGE_DIR / "extract_cache.db"
+ABBREVIATIONS_FILE = STORAGE_DIR / "abbreviations.csv"
+ABBREVIATIONS_CACHE_FILE = STORAGE_DIR / "abbreviations.db"
 
 def ensure_storage():
     STORAGE_DIR.mkdir(parents=True, exist_ok=True)
@@ -29,7 +35,10 @@ def append_folders(folders: List[str]) -> List[str]:
         f = str(Path(f))
         if f not in current:
             current.append(f)
-    INDEX_FILE.write_text(json.dumps(current, indent=2), encoding="utf-8")
+    # written aside and renamed, so other API processes never read half a file
+    tmp = INDEX_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(current, indent=2), encoding="utf-8")
+    tmp.replace(INDEX_FILE)
     return current
 
 # -----------------------------
@@ -38,6 +47,7 @@ def append_folders(folders: List[str]) -> List[str]:
 def read_index_meta() -> Dict[str, str]:
     """
     Returns a mapping { absolute_path: isoformat_mtime_string }
+    Legacy: only read by the one-time migration into the state store.
     """
     ensure_storage()
     try:
@@ -48,10 +58,20 @@ def read_index_meta() -> Dict[str, str]:
     except Exception:
         return {}
 
-def write_index_meta(meta: Dict[str, str]) -> None:
+# -----------------------------
+# Extraction quarantine helpers
+# -----------------------------
+def read_quarantine() -> Dict[str, Dict[str, str]]:
+    """
+    Returns a mapping { absolute_path: {"mtime": ..., "reason": ..., "at": ...} }
+    for files whose extraction timed out, ran out of memory or crashed.
+    Legacy: only read by the one-time migration into the state store.
+    """
     ensure_storage()
     try:
-        INDEX_META_FILE.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        data = json.loads(QUARANTINE_FILE.read_text(encoding="utf-8"))
+        if isinstance(data, dict):
+            return data
+        return {}
     except Exception:
-        # best-effort — don't crash caller
-        pass
\ No newline at end of file
+        return {}
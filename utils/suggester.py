@@ -0,0 +1,253 @@
+import re
+import pickle
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from whoosh.analysis import StemmingAnalyzer
+
+FILE_PREFIX = "suggest_"
+FILE_SUFFIX = ".pkl"
+_WORD = re.compile(r"\w+")
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment (Damerau-Levenshtein) distance, or max_distance + 1 if larger."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+            row_min = min(row_min, cur[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _deletes(word: str, max_distance: int) -> set:
+    out = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        nxt = set()
+        for w in frontier:
+            if len(w) <= 1:
+                continue
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        out |= nxt
+        frontier = nxt
+    return out
+
+
+class SymSpellDictionary:
+    """
+    SymSpell-style deletion dictionary over the index's content terms.
+
+    Every term's prefix (first `prefix_length` chars) is expanded to all
+    strings reachable by up to `max_distance` deletions; a lookup expands
+    the query the same way and only verifies the few terms that share a
+    deletion, so suggest() costs microseconds regardless of vocabulary size.
+    """
+
+    def __init__(self, generation: int, words: List[str], freqs: List[int],
+                 deletes: Dict[str, List[int]], max_distance: int, prefix_length: int):
+        self.generation = generation
+        self.words = words
+        self.freqs = freqs
+        self.deletes = deletes
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._word_ids = {w: i for i, w in enumerate(words)}
+
+    @classmethod
+    def build(cls, generation: int, terms: Iterable[Tuple[str, int]], max_distance: int = 2,
+              prefix_length: int = 7, max_terms: int = 0) -> "SymSpellDictionary":
+        terms = sorted(terms, key=lambda t: -t[1])
+        if max_terms:
+            terms = terms[:max_terms]
+        words = [t for t, _ in terms]
+        freqs = [f for _, f in terms]
+        deletes: Dict[str, List[int]] = {}
+        for i, word in enumerate(words):
+            for d in _deletes(word[:prefix_length], max_distance):
+                deletes.setdefault(d, []).append(i)
+        return cls(generation, words, freqs, deletes, max_distance, prefix_length)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._word_ids
+
+    def suggest(self, word: str, limit: int = 3) -> List[str]:
+        """Closest known terms by (edit distance, frequency); [] if `word` is itself known."""
+        if not word or word in self._word_ids:
+            return []
+        found = {}
+        for d in _deletes(word[:self.prefix_length], self.max_distance):
+            for i in self.deletes.get(d, ()):
+                if i in found:
+                    continue
+                dist = edit_distance(word, self.words[i], self.max_distance)
+                if dist <= self.max_distance:
+                    found[i] = dist
+        ranked = sorted(found, key=lambda i: (found[i], -self.freqs[i]))
+        return [self.words[i] for i in ranked[:limit]]
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("_word_ids", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._word_ids = {w: i for i, w in enumerate(self.words)}
+
+
+class Suggester:
+    """
+    "Did you mean" engine for one index.
+
+    The dictionary is rebuilt in a background thread after commits (at
+    most one build at a time, coalescing further requests) and persisted
+    as `suggest_<generation>.pkl` inside the index directory, so a restart
+    loads it instead of rebuilding. Queries always use the last finished
+    dictionary and never wait for a build. A `read_only` suggester (in a
+    process that is not the index writer) only loads what the writer
+    persisted and keeps its last dictionary until the next one appears.
+    """
+
+    def __init__(self, ix, index_dir: Path, fieldname: str = "content", max_distance: int = 2,
+                 prefix_length: int = 7, max_terms: int = 0, min_length: int = 3,
+                 read_only: bool = False):
+        self.ix = ix
+        self.read_only = read_only
+        self.index_dir = Path(index_dir)
+        self.fieldname = fieldname
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.max_terms = max_terms
+        self.min_length = min_length
+        self.analyzer = StemmingAnalyzer()
+
+        self._dict: Optional[SymSpellDictionary] = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._thread: Optional[threading.Thread] = None
+
+    # -------------------------------
+    # Building / loading
+    # -------------------------------
+    def _path(self, generation: int) -> Path:
+        return self.index_dir / f"{FILE_PREFIX}{generation}{FILE_SUFFIX}"
+
+    def _terms(self, reader) -> Iterable[Tuple[str, int]]:
+        for text, info in reader.iter_field(self.fieldname):
+            if isinstance(text, bytes):
+                text = text.decode("utf-8", "ignore")
+            if len(text) < self.min_length or not text.isalpha():
+                continue
+            yield text, info.weight()
+
+    def _load_or_build(self) -> SymSpellDictionary:
+        generation = self.ix.latest_generation()
+        path = self._path(generation)
+        if path.exists():
+            try:
+                with open(path, "rb") as f:
+                    return pickle.load(f)
+            except Exception:
+                pass
+        if self.read_only:
+            return self._dict
+
+        with self.ix.reader() as reader:
+            built = SymSpellDictionary.build(generation, self._terms(reader), self.max_distance,
+                                             self.prefix_length, self.max_terms)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(built, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+        for old in self.index_dir.glob(f"{FILE_PREFIX}*{FILE_SUFFIX}"):
+            if old != path:
+                old.unlink(missing_ok=True)
+        return built
+
+    def _build_loop(self):
+        while True:
+            with self._lock:
+                if not self._dirty:
+                    self._thread = None
+                    return
+                self._dirty = False
+            try:
+                self._dict = self._load_or_build()
+            except Exception as e:
+                print(f"[suggest] rebuild failed: {e}")
+
+    def schedule_rebuild(self):
+        """Rebuild for the latest committed generation in the background."""
+        with self._lock:
+            self._dirty = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._build_loop, name="suggest-build", daemon=True)
+                self._thread.start()
+
+    def refresh(self):
+        """Read-only: load the dictionary the writer persisted for the latest generation, once it exists."""
+        generation = self.ix.latest_generation()
+        if generation != self.generation and self._path(generation).exists():
+            self.schedule_rebuild()
+
+    def wait(self, timeout: Optional[float] = None):
+        thread = self._thread
+        if thread:
+            thread.join(timeout)
+
+    @property
+    def generation(self) -> Optional[int]:
+        return self._dict.generation if self._dict else None
+
+    # -------------------------------
+    # Lookup
+    # -------------------------------
+    def suggest_word(self, word: str) -> Optional[str]:
+        """
+        Best correction for one query word, or None if it is known or no
+        close term exists. Index terms are stems, so the suffix the stemmer
+        removed from `word` is put back onto the suggested stem.
+        """
+        d = self._dict
+        if d is None:
+            return None
+        tokens = [(t.text, t.startchar, t.endchar) for t in self.analyzer(word, chars=True)]
+        if len(tokens) != 1:
+            return None
+        stem, start, end = tokens[0]
+        if stem in d or len(stem) < self.min_length or not stem.isalpha():
+            return None
+        best = d.suggest(stem, limit=1)
+        if not best:
+            return None
+        original = word[start:end].lower()
+        return best[0] + original[len(stem):] if original.startswith(stem) else best[0]
+
+    def did_you_mean(self, text: str) -> Optional[str]:
+        """`text` with every unknown word corrected, or None if nothing changed."""
+        changed = False
+
+        def fix(m):
+            nonlocal changed
+            s = self.suggest_word(m.group(0))
+            if s and s != m.group(0).lower():
+                changed = True
+                return s
+            return m.group(0)
+
+        corrected = _WORD.sub(fix, text)
+        return corrected if changed else None
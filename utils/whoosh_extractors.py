@@ -1,85 +1,156 @@
 from pathlib import Path
-from typing import Optional
-import fitz
-from docx import Document
-from zipfile import BadZipFile
+from typing import Callable, Dict, Iterator, Optional
 import csv
-import openpyxl
-import xlrd
-from pptx import Presentation
 
-def extract_txt(path: Path) -> Optional[str]:
-    try:
-        return path.read_text(encoding="utf-8", errors="ignore")
-    except Exception:
-        return None
+from config.settings import settings
+from utils.lazy_imports import lazy_import
 
-def extract_docx(path: Path) -> Optional[str]:
-    try:
-        doc = Document(path)
-        return "\n".join(p.text for p in doc.paragraphs if p.text)
-    except BadZipFile:
-        return None
-    except Exception:
-        return None
+# -------------------------------
+# Streaming extractors
+# -------------------------------
+# Each yields the document text in chunks (a line, a row, a page, a
+# slide) so the whole file never has to be held as one string. Pages,
+# slides and sheets are separated by PAGE_BREAK so show-content can
+# serve them one at a time.
 
-def extract_pdf(path: Path) -> Optional[str]:
-    try:
-        text = []
-        with fitz.open(path) as pdf:
-            for page in pdf:
-                text.append(page.get_text("text"))
-        return "\n".join(text)
-    except Exception:
-        return None
+PAGE_BREAK = "\f"
+PAGED_TYPES = {".pdf", ".pptx", ".xlsx", ".xls"}
 
-def extract_csv(path: Path) -> Optional[str]:
-    try:
-        rows = []
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            reader = csv.reader(f)
-            for row in reader:
-                rows.append(" ".join(row))
-        return "\n".join(rows)
-    except Exception:
-        return None
+def iter_txt(path: Path) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+def iter_docx(path: Path) -> Iterator[str]:
+    doc = lazy_import("docx").Document(path)
+    for p in doc.paragraphs:
+        if p.text:
+            yield p.text
+
+def iter_pdf(path: Path) -> Iterator[str]:
+    with lazy_import("fitz").open(path) as pdf:
+        for page in pdf:
+            yield page.get_text("text")
 
-def extract_xlsx(path: Path) -> Optional[str]:
+def iter_csv(path: Path) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        for row in csv.reader(f):
+            yield " ".join(row)
+
+def iter_xlsx(path: Path) -> Iterator[str]:
+    # read_only streams rows from the sheet XML instead of building the workbook in memory
+    wb = lazy_import("openpyxl").load_workbook(path, read_only=True, data_only=True)
     try:
-        wb = openpyxl.load_workbook(path, data_only=True)
-        text = []
-        for sheet in wb.worksheets:
+        for n, sheet in enumerate(wb.worksheets):
+            if n:
+                yield PAGE_BREAK
             for row in sheet.iter_rows(values_only=True):
-                row_text = " ".join(str(c) for c in row if c is not None)
-                text.append(row_text)
-        return "\n".join(text)
-    except Exception:
-        return None
+                yield " ".join(str(c) for c in row if c is not None)
+    finally:
+        wb.close()
 
-def extract_xls(path: Path) -> Optional[str]:
+def iter_xls(path: Path) -> Iterator[str]:
+    wb = lazy_import("xlrd").open_workbook(path, on_demand=True)
     try:
-        wb = xlrd.open_workbook(path)
-        text = []
-        for sheet in wb.sheets():
+        for i in range(wb.nsheets):
+            if i:
+                yield PAGE_BREAK
+            sheet = wb.sheet_by_index(i)
             for r in range(sheet.nrows):
                 row = sheet.row_values(r)
-                row_text = " ".join(str(c) for c in row if c not in (None, ""))
-                text.append(row_text)
-        return "\n".join(text)
-    except Exception:
-        return None
+                yield " ".join(str(c) for c in row if c not in (None, ""))
+            wb.unload_sheet(i)
+    finally:
+        wb.release_resources()
+
+def iter_pptx(path: Path) -> Iterator[str]:
+    prs = lazy_import("pptx").Presentation(path)
+    for slide in prs.slides:
+        yield "\n".join(shape.text for shape in slide.shapes if getattr(shape, "text", None))
+
+# parser library behind each extractor, imported on first use (see utils.lazy_imports)
+EXTRACTOR_LIBS = {
+    ".docx": "docx",
+    ".pdf": "fitz",
+    ".xlsx": "openpyxl",
+    ".xls": "xlrd",
+    ".pptx": "pptx",
+}
 
-def extract_pptx(path: Path) -> Optional[str]:
+def warm_extractor_libs():
+    """Import every parser library now, e.g. from a background warm-up."""
+    for name in sorted(set(EXTRACTOR_LIBS.values())):
+        lazy_import(name)
+
+STREAM_EXTRACTORS: Dict[str, Callable[[Path], Iterator[str]]] = {
+    ".txt": iter_txt,
+    ".docx": iter_docx,
+    ".pdf": iter_pdf,
+    ".csv": iter_csv,
+    ".xlsx": iter_xlsx,
+    ".xls": iter_xls,
+    ".pptx": iter_pptx,
+}
+
+# -------------------------------
+# Bounded text collection
+# -------------------------------
+def collect_text(chunks: Iterator[str], max_chars: Optional[int] = None, sep: str = "\n") -> Optional[str]:
+    """
+    Join streamed chunks into one string of at most `max_chars` characters
+    (defaults to settings.MAX_DOCUMENT_CHARS, 0 = unlimited). The stream is
+    closed as soon as the cap is reached, so the rest of the file is never read.
+    None on a parse error: partial text would be indexed (and cached) as if
+    it were the whole document.
+    """
+    if max_chars is None:
+        max_chars = settings.MAX_DOCUMENT_CHARS
+
+    parts = []
+    total = 0
     try:
-        prs = Presentation(path)
-        text = []
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text:
-                    text.append(shape.text)
-        return "\n".join(text)
+        for chunk in chunks:
+            if parts:
+                total += len(sep)
+            if max_chars and total + len(chunk) > max_chars:
+                parts.append(chunk[:max(0, max_chars - total)])
+                break
+            parts.append(chunk)
+            total += len(chunk)
+    except MemoryError:
+        raise  # let the extraction pool quarantine the file
     except Exception:
         return None
+    finally:
+        close = getattr(chunks, "close", None)
+        if close:
+            close()
+    return sep.join(parts)
+
+def _bounded(stream: Callable[[Path], Iterator[str]], sep: str = "\n") -> Callable[[Path], Optional[str]]:
+    def extract(path: Path) -> Optional[str]:
+        try:
+            return collect_text(stream(path), sep=sep)
+        except MemoryError:
+            raise
+        except Exception:
+            return None
+    extract.__name__ = stream.__name__.replace("iter_", "extract_")
+    return extract
+
+extract_txt = _bounded(iter_txt, sep="")  # raw 64 KB reads, already contain newlines
+extract_docx = _bounded(iter_docx)
+extract_pdf = _bounded(iter_pdf, sep=PAGE_BREAK)
+extract_csv = _bounded(iter_csv)
+extract_xlsx = _bounded(iter_xlsx)
+extract_xls = _bounded(iter_xls)
+extract_pptx = _bounded(iter_pptx, sep=PAGE_BREAK)
+
+# part of the extraction cache key: bump whenever an extractor's output changes
+EXTRACTOR_VERSION = 3
 
 EXTRACTORS = {
     ".txt": extract_txt,
@@ -1,41 +1,57 @@
 import re
 import os
+import time
+import threading
+from contextlib import contextmanager
+from fnmatch import fnmatch
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List
+from typing import Callable, Optional, List
 
-from whoosh import index as whoosh_index
-from whoosh.fields import Schema, TEXT, ID, NUMERIC
+from whoosh import index as whoosh_index, sorting
+from whoosh.fields import Schema, TEXT, ID, NUMERIC, DATETIME, STORED, COLUMN
+from whoosh.query import And, Or, Term, DateRange, NumericRange
 from whoosh.analysis import StemmingAnalyzer
 from whoosh.qparser import MultifieldParser
-from whoosh.spelling import Corrector
 
-from .whoosh_extractors import EXTRACTORS
+from .whoosh_extractors import EXTRACTORS, PAGED_TYPES
+from .extraction_pool import get_extraction_pool
+from .fs_scanner import FolderScanner, parse_excludes
+from .searcher_manager import SearcherManager
+from .schema_migration import needs_migration
+from .snippets import OFFSETS_FIELD, SnippetTerms, offsets_snippet
+from .passages import PAGES_PER_HIT, index_docs, is_passage_schema
+from .suggester import Suggester
+from .filename_index import get_filename_index
 
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from utils.storage_helper import read_index_meta, write_index_meta
+from utils.index_writer import UPSERT, DELETE
+from utils.state_store import get_state_store, INDEXED, EMPTY, QUARANTINED
 
 
 class IndexWatcher(FileSystemEventHandler):
+    """
+    Turns file system events into upsert/delete requests on the indexer's
+    single-writer service, which debounces and batches them.
+    """
+
     def __init__(self, indexer, folder):
+        from config.settings import settings
         self.indexer = indexer
         self.folder = Path(folder)
+        self.service = indexer.get_writer_service()
+        self.excludes = parse_excludes(settings.SCAN_EXCLUDE)
+        # the local filename index tracks every file, not only extractable ones
+        self.filenames = get_filename_index() if settings.FILENAME_BACKEND == "local" else None
 
-    def _update_cache(self, path: Path):
-        """Update index_meta.json when file is added or modified."""
-        cache = read_index_meta() or {}
-        current_mtime = datetime.fromtimestamp(path.stat().st_mtime).strftime("%Y-%m-%d %H:%M:%S")
-        cache[str(path)] = current_mtime
-        write_index_meta(cache)
-
-    def _remove_from_cache(self, path: Path):
-        """Remove deleted files from index_meta.json."""
-        cache = read_index_meta() or {}
-        path_str = str(path)
-        if path_str in cache:
-            del cache[path_str]
-            write_index_meta(cache)
+    def _excluded(self, path: Path) -> bool:
+        return any(fnmatch(part, pattern) for part in path.parts for pattern in self.excludes)
+
+    def _wanted(self, path: Path) -> bool:
+        if not EXTRACTORS.get(path.suffix.lower()):
+            return False
+        return not self._excluded(path)
 
     # ---------------------------
     # FILE CREATED
@@ -46,15 +62,10 @@ class IndexWatcher(FileSystemEventHandler):
 
         path = Path(event.src_path)
         print(f"[watcher] created: {path}")
-
-        extractor = EXTRACTORS.get(path.suffix.lower())
-        if not extractor:
-            return
-
-        content = extractor(path)
-        if content:
-            self.indexer.add_or_update(path, content)
-            self._update_cache(path)
+        if self.filenames and not self._excluded(path):
+            self.filenames.upsert_path(os.path.abspath(path))
+        if self._wanted(path):
+            self.service.submit(UPSERT, os.path.abspath(path))
 
     # ---------------------------
     # FILE MODIFIED
@@ -65,223 +76,731 @@ class IndexWatcher(FileSystemEventHandler):
 
         path = Path(event.src_path)
         print(f"[watcher] modified: {path}")
+        if self.filenames and not self._excluded(path):
+            self.filenames.upsert_path(os.path.abspath(path))
+        if self._wanted(path):
+            self.service.submit(UPSERT, os.path.abspath(path))
 
-        extractor = EXTRACTORS.get(path.suffix.lower())
-        if not extractor:
+    # ---------------------------
+    # FILE MOVED
+    # ---------------------------
+    def on_moved(self, event):
+        if event.is_directory:
+            if self.filenames:
+                self.filenames.move_dir(os.path.abspath(event.src_path), os.path.abspath(event.dest_path))
             return
 
-        content = extractor(path)
-        if content:
-            self.indexer.add_or_update(path, content)
-            self._update_cache(path)
+        src, dest = Path(event.src_path), Path(event.dest_path)
+        print(f"[watcher] moved: {src} → {dest}")
+        if self.filenames:
+            self.filenames.remove(os.path.abspath(src))
+            if not self._excluded(dest):
+                self.filenames.upsert_path(os.path.abspath(dest))
+        self.service.submit(DELETE, os.path.abspath(src))
+        if self._wanted(dest):
+            self.service.submit(UPSERT, os.path.abspath(dest))
 
     # ---------------------------
     # FILE DELETED
     # ---------------------------
     def on_deleted(self, event):
         if event.is_directory:
+            if self.filenames:
+                self.filenames.remove_dir(os.path.abspath(event.src_path))
             return
 
         path = Path(event.src_path)
         print(f"[watcher] deleted: {path}")
+        if self.filenames:
+            self.filenames.remove(os.path.abspath(path))
+        self.service.submit(DELETE, os.path.abspath(path))
 
-        # Remove from Whoosh index
-        writer = self.indexer.ix.writer()
-        writer.delete_by_term("path", str(path))
-        writer.commit()
-
-        # Remove from JSON cache
-        self._remove_from_cache(path)
-
-def start_watcher(indexer, folder: str):
+def start_watcher(indexer, folder: str, observer: Optional[Observer] = None):
+    """Watch `folder` on `observer`, or on a new observer that is started here."""
     print(f"[watcher] Starting real-time watcher on: {folder}")
 
     handler = IndexWatcher(indexer, folder)
-    observer = Observer()
+    if observer is None:
+        observer = Observer()
+        observer.start()
     observer.schedule(handler, folder, recursive=True)
-    observer.start()
     return observer
 
 
+# ============================================================
+# BULK WRITER
+# ============================================================
+class BulkWriter:
+    """
+    One long-lived Whoosh writer for bulk indexing.
+
+    Documents are buffered in the same writer and committed as a new
+    segment every `batch_docs` documents or `batch_bytes` source bytes,
+    instead of one segment per file. Intermediate commits skip merging;
+    the final `close()` lets Whoosh merge (or fully optimize) segments.
+    `on_commit` runs after every successful commit, so bookkeeping that
+    must not run ahead of the index can be deferred to it. `lock` (the
+    indexer's write lock) is held from the first write of a batch until
+    its commit, so other in-process writers interleave between batches.
+    `ix` may be a callable returning the index, so a batch opened after a
+    rebuild swapped indexes writes to the new one. `journal` receives the
+    paths of every committed batch.
+    """
+
+    def __init__(self, ix, batch_docs: int, batch_bytes: int,
+                 limitmb: int = 128, optimize: bool = False,
+                 on_commit: Optional[Callable[[], None]] = None,
+                 lock: Optional[threading.RLock] = None,
+                 journal: Optional[Callable[[List[str]], None]] = None):
+        self.ix = ix
+        self.journal = journal
+        self.lock = lock
+        self.batch_docs = max(1, batch_docs)
+        self.batch_bytes = max(1, batch_bytes)
+        self.limitmb = limitmb
+        self.optimize = optimize
+        self.on_commit = on_commit
+
+        self._writer = None
+        self._pending_docs = 0
+        self._pending_bytes = 0
+        self._pending_paths: List[str] = []
+
+        self.docs = 0
+        self.bytes = 0
+        self.deleted = 0
+        self.commits = 0
+
+    def open(self, blocking: bool = True) -> bool:
+        """
+        Start a batch (taking `lock`) unless one is open. Returns False
+        without waiting when `blocking` is off and the lock is held elsewhere.
+        """
+        if self._writer is not None:
+            return True
+        if self.lock and not self.lock.acquire(blocking=blocking):
+            return False
+        try:
+            ix = self.ix() if callable(self.ix) else self.ix
+            self._writer = ix.writer(limitmb=self.limitmb)
+        except Exception:
+            if self.lock:
+                self.lock.release()
+            raise
+        return True
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    def _get_writer(self):
+        self.open()
+        return self._writer
+
+    def _release(self):
+        if self.lock:
+            self.lock.release()
+
+    def update(self, fields: dict, source_bytes: int = 0):
+        self._get_writer().update_document(**fields)
+        self._written(fields["path"], source_bytes)
+
+    def replace(self, path: str, docs: List[dict], source_bytes: int = 0):
+        """Swap every document of `path` (the file, or all its passages) for `docs`."""
+        writer = self._get_writer()
+        with writer.searcher() as s:
+            writer.delete_by_term("path", path, searcher=s)
+        for fields in docs:
+            writer.add_document(**fields)
+        self._written(path, source_bytes)
+
+    def _written(self, path: str, source_bytes: int):
+        self._pending_docs += 1
+        if self.journal:
+            self._pending_paths.append(path)
+        self._pending_bytes += source_bytes
+        self.docs += 1
+        self.bytes += source_bytes
+
+        if self._pending_docs >= self.batch_docs or self._pending_bytes >= self.batch_bytes:
+            self.flush()
+
+    def delete(self, path: str):
+        self._get_writer().delete_by_term("path", path)
+        self._pending_docs += 1
+        if self.journal:
+            self._pending_paths.append(path)
+        self.deleted += 1
+
+    def flush(self, merge: bool = False, optimize: bool = False) -> bool:
+        """Commit the current batch as a segment. Returns False when nothing was pending."""
+        if self._writer is None:
+            return False
+        writer, self._writer = self._writer, None
+        try:
+            if self._pending_docs == 0:
+                writer.cancel()
+                return False
+            writer.commit(merge=merge, optimize=optimize)
+            if self.journal:
+                # recorded before the lock is released, so a rebuild swap cannot slip in between
+                paths, self._pending_paths = self._pending_paths, []
+                self.journal(paths)
+        finally:
+            self._release()
+        self.commits += 1
+        self._pending_docs = 0
+        self._pending_bytes = 0
+        if self.on_commit:
+            self.on_commit()
+        return True
+
+    def close(self):
+        if not self.flush(merge=True, optimize=self.optimize) and self.on_commit and self.commits:
+            # bookkeeping queued after the last automatic commit describes documents
+            # that commit already contains
+            self.on_commit()
+
+    def cancel(self):
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            try:
+                writer.cancel()
+            finally:
+                self._release()
+        self._pending_docs = 0
+        self._pending_bytes = 0
+        self._pending_paths = []
+
+
+# ============================================================
+# PROGRESS / CANCELLATION
+# ============================================================
+class IndexCancelled(Exception):
+    """Raised from IndexProgress.checkpoint() to stop an index_folder run early."""
+
+
+class ReadOnlyIndex(RuntimeError):
+    """A write was attempted in a process that is not the elected index writer (see utils.writer_lease)."""
+
+
+class SchemaOutdated(RuntimeError):
+    """The index on disk has another schema than the settings ask for; utils.schema_migration rewrites it."""
+
+
+def wait_for_writer(ready: Callable[[], bool], what: str):
+    """Read-only processes: wait (up to WRITER_WAIT_SECONDS) for the writer to create `what`."""
+    from config.settings import settings
+    deadline = time.monotonic() + settings.WRITER_WAIT_SECONDS
+    while not ready():
+        if time.monotonic() > deadline:
+            raise ReadOnlyIndex(f"the writer process has not created {what}")
+        time.sleep(0.2)
+
+
+class IndexProgress:
+    """
+    Live counters of one index_folder run. The run calls `checkpoint()`
+    between files; a subclass raises IndexCancelled there to stop it, after
+    which the work done so far is committed (so a later run resumes from it).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.scanned = 0         # files with an indexable extension seen by the scan
+        self.changed = 0         # new/modified files sent to extraction
+        self.extracted = 0
+        self.committed = 0       # state rows made durable by an index commit
+        self.removed = 0
+        self.bytes = 0
+        self.errors = 0          # failed or quarantined files
+        self.scan_complete = False
+
+    def checkpoint(self):
+        pass
+
+
+def sort_facet(schema, fieldname: str, reverse: bool = False):
+    """
+    `sortedby` for Searcher.search(): `fieldname` in either direction, with
+    documents that have no value last. A number column stores a missing
+    value as its maximum, so Whoosh's own reverse sort puts them first.
+    Number keys are (missing, +/- column value), which also compare across
+    shards (see ShardedIndexer._ranked).
+    """
+    field = schema[fieldname]
+    if not isinstance(field, NUMERIC):
+        return sorting.FieldFacet(fieldname, reverse=reverse)
+    missing = field.default
+    sign = -1 if reverse else 1
+    return sorting.TranslateFacet(lambda value: (value == missing, sign * value),
+                                  sorting.FieldFacet(fieldname))
+
+
 # ============================================================
 # WHOOSH INDEXER CLASS
 # ============================================================
 class WhooshIndexer:
-    _watcher_started = False   # ensures watcher doesn't start multiple times
+    _observer = None    # one watcher per process (and only the writer process runs one)
+    _watched: set = set()   # the folders it watches
+    _watch_lock = threading.Lock()
+    _journal: Optional[set] = None   # paths committed while a rebuild runs
+    _journal_lock = threading.Lock()
 
-    def __init__(self, index_dir: str):
+    def __init__(self, index_dir: str, read_only: bool = False):
+        from config.settings import settings
         self.index_dir = Path(index_dir)
+        # a read-only process searches what the writer wrote and never commits
+        self.read_only = read_only
         self.schema = self._get_schema()
         self.ix = self._open_or_create()
-        self.spell = None
-        self._ensure_spellchecker()
+        if read_only:
+            # the writer's schema, which can predate (or, mid-migration, follow) these settings
+            self.schema = self.ix.schema
+        self.searchers = SearcherManager(self.ix, check_interval=settings.SEARCHER_REFRESH_SECONDS)
+        # serialises writers inside this process (bulk batches, watcher batches)
+        self.write_lock = threading.RLock()
+        self.writer_service = None
+        self.suggester = Suggester(
+            self.ix, self.index_dir,
+            max_distance=settings.SUGGEST_MAX_EDIT_DISTANCE,
+            prefix_length=settings.SUGGEST_PREFIX_LENGTH,
+            max_terms=settings.SUGGEST_MAX_TERMS,
+            read_only=read_only,
+        )
+        # loads the persisted dictionary for the current generation, or builds it
+        self.suggester.schedule_rebuild()
 
     # -------------------------------
     # Schema
     # -------------------------------
-    def _get_schema(self):
-        return Schema(
+    @staticmethod
+    def build_schema(content_store: Optional[str] = None, passages: Optional[bool] = None):
+        from config.settings import settings
+        content_store = content_store or settings.INDEX_CONTENT_STORE
+        passages = settings.INDEX_PASSAGES if passages is None else passages
+        fields = dict(
             path=ID(stored=True, unique=True),
             filename=TEXT(stored=True, analyzer=StemmingAnalyzer()),
             filetype=ID(stored=True),
             modified=ID(stored=True),
-            size_bytes=NUMERIC(stored=True),
-            content=TEXT(stored=True, analyzer=StemmingAnalyzer()),
+            # filterable/sortable columns (see _build_filter)
+            modified_at=DATETIME(stored=True, sortable=True),
+            size_bytes=NUMERIC(stored=True, sortable=True, bits=64),
         )
+        if content_store in ("excerpt", "none"):
+            # token offsets stand in for the stored text when making snippets (see utils.snippets)
+            fields["content"] = TEXT(analyzer=StemmingAnalyzer())
+            fields[OFFSETS_FIELD] = COLUMN()
+            if content_store == "excerpt":
+                fields["excerpt"] = STORED()
+        else:
+            fields["content"] = TEXT(stored=True, analyzer=StemmingAnalyzer())
+        if passages:
+            # a document per passage (see utils.passages); hits are collapsed by path
+            fields["path"] = ID(stored=True, sortable=True)
+            fields["passage"] = ID(stored=True, unique=True)
+            fields["page"] = NUMERIC(stored=True)
+        return Schema(**fields)
+
+    def _get_schema(self):
+        return self.build_schema()
+
+    def close(self):
+        if self.writer_service:
+            self.writer_service.stop()
+        self.searchers.close()
 
     # -------------------------------
     # Index creation / loading
     # -------------------------------
     def _open_or_create(self):
-        if not self.index_dir.exists():
-            self.index_dir.mkdir(parents=True, exist_ok=True)
-
-        if whoosh_index.exists_in(str(self.index_dir)):
-            return whoosh_index.open_dir(str(self.index_dir))
-
-        return whoosh_index.create_in(str(self.index_dir), self.schema)
-
-    def _ensure_spellchecker(self):
-        try:
-            self.spell = Corrector(self.ix.reader(), fieldname="content")
-        except Exception:
-            self.spell = None
+        return self.open_or_create(self.index_dir, self.schema, self.read_only)
+
+    @staticmethod
+    def open_or_create(index_dir: Path, schema, read_only: bool = False):
+        if read_only:
+            # creating and migrating are the writer's job
+            wait_for_writer(lambda: whoosh_index.exists_in(str(index_dir)), f"an index at {index_dir}")
+            return whoosh_index.open_dir(str(index_dir))
+
+        if not index_dir.exists():
+            index_dir.mkdir(parents=True, exist_ok=True)
+
+        if whoosh_index.exists_in(str(index_dir)):
+            ix = whoosh_index.open_dir(str(index_dir))
+            if not needs_migration(ix.schema, schema):
+                return ix
+            ix.close()
+            # migrating can mean extracting every file again and ends by renaming the index
+            # directory, which other processes may hold open: it is done offline, not at startup
+            raise SchemaOutdated(
+                f"the index at {index_dir} was built with another schema (an older version, or other"
+                f" INDEX_CONTENT_STORE / INDEX_PASSAGES settings); stop the API and run"
+                f" `python -m utils.schema_migration {index_dir}`")
+
+        return whoosh_index.create_in(str(index_dir), schema)
 
     # -------------------------------
-    # Compare mtimes
+    # Stored documents
     # -------------------------------
-    def _indexed_mtime(self, path: Path) -> Optional[str]:
-        with self.ix.searcher() as s:
-            docs = s.documents(path=str(path.resolve()))
-            for d in docs:
-                return d.get("modified")
-        return None
+    def _stored_doc(self, path: str) -> Optional[dict]:
+        with self.searchers.searcher() as s:
+            return s.document(path=path)
 
-    def _current_mtime(self, path: Path) -> str:
-        return datetime.fromtimestamp(path.stat().st_mtime).strftime("%Y-%m-%d %H:%M:%S")
-
-    def _needs_indexing(self, path: Path) -> bool:
-        stored = self._indexed_mtime(path)
-        current = self._current_mtime(path)
-        return stored != current
+    def _stored_docs(self, path: str) -> List[dict]:
+        """Every stored document of `path`: the file's, or one per passage."""
+        with self.searchers.searcher() as s:
+            return list(s.documents(path=path))
 
     # -------------------------------
     # Add or update document
     # -------------------------------
+    def _index_docs(self, path: Path, content: str, st: Optional[os.stat_result] = None) -> List[dict]:
+        st = st or path.stat()
+        modified = datetime.fromtimestamp(st.st_mtime)
+        return index_docs(self.schema, dict(
+            path=os.path.abspath(path),
+            filename=path.name,
+            filetype=path.suffix.lower().lstrip("."),
+            modified=modified.strftime("%Y-%m-%d %H:%M:%S"),
+            modified_at=modified,
+            size_bytes=st.st_size,
+        ), content)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ReadOnlyIndex("this process searches the index read-only; another process is the writer")
+
+    def stores_content(self) -> bool:
+        """False when the index keeps token offsets (and maybe an excerpt) instead of the text."""
+        return bool(self.schema["content"].stored)
+
     def add_or_update(self, path: Path, content: str):
-        writer = self.ix.writer()
+        self._check_writable()
+        with self.write_lock:
+            writer = self.ix.writer()
+            key = os.path.abspath(path)
+            try:
+                writer.delete_by_term("path", key)
+                for fields in self._index_docs(path, content):
+                    writer.add_document(**fields)
+                writer.commit()
+            except Exception:
+                writer.cancel()
+                return
+            self._journal_paths([key])
+        self.searchers.mark_stale()
+        self.suggester.schedule_rebuild()
+
+    def delete_paths(self, paths: List[str]):
+        self._check_writable()
+        with self.write_lock:
+            writer = self.ix.writer()
+            try:
+                for path in paths:
+                    writer.delete_by_term("path", path)
+                writer.commit()
+            except Exception:
+                writer.cancel()
+                raise
+            self._journal_paths(paths)
+        self.searchers.mark_stale()
+        self.suggester.schedule_rebuild()
+
+    def _apply_result(self, bulk: BulkWriter, store, result, pending_rows: list) -> str:
+        """
+        Write one ExtractResult (meta = (stat, previous FileState)) into the
+        open bulk writer. The state row is appended to `pending_rows` to be
+        stored once the batch commits; quarantines are stored right away.
+        Returns the new status, or "failed".
+        """
+        st, state = result.meta
+        key = os.path.abspath(result.path)
+
+        if result.reason:
+            if state and state.status == INDEXED:
+                bulk.delete(key)
+            store.quarantine(key, st.st_mtime_ns, st.st_size, result.reason)
+            return QUARANTINED
+
+        if not result.text:
+            if state and state.status == INDEXED:
+                bulk.delete(key)
+            pending_rows.append((key, st.st_mtime_ns, st.st_size, result.content_hash, EMPTY, None))
+            return EMPTY
+
         try:
-            modified = self._current_mtime(path)
-            size_b = path.stat().st_size
-
-            writer.update_document(
-                path=str(path.resolve()),
-                filename=path.name,
-                filetype=path.suffix.lower().lstrip("."),
-                modified=modified,
-                size_bytes=size_b,
-                content=content,
+            bulk.replace(key, self._index_docs(result.path, result.text, st), source_bytes=st.st_size)
+        except Exception as e:
+            print(f"[index] failed to add {result.path}: {e}")
+            return "failed"
+        pending_rows.append((key, st.st_mtime_ns, st.st_size, result.content_hash, INDEXED, None))
+        return INDEXED
+
+    def get_writer_service(self):
+        """Background single-writer service for watcher events, started on first use."""
+        if self.writer_service is None:
+            self._check_writable()
+            from config.settings import settings
+            from .index_writer import IndexWriterService
+            self.writer_service = IndexWriterService(
+                self,
+                debounce=settings.WATCHER_DEBOUNCE_SECONDS,
+                max_delay=settings.WATCHER_MAX_DELAY_SECONDS,
+                max_batch=settings.WATCHER_MAX_BATCH,
             )
-            writer.commit()
-            self._ensure_spellchecker()
-        except Exception:
-            writer.cancel()
+            self.writer_service.start()
+        return self.writer_service
+
+    def bulk_writer(self, on_commit: Optional[Callable[[], None]] = None) -> BulkWriter:
+        from config.settings import settings
+        self._check_writable()
+
+        def committed():
+            self.searchers.mark_stale()
+            if on_commit:
+                on_commit()
+
+        return BulkWriter(
+            lambda: self.ix,
+            batch_docs=settings.INDEX_BATCH_DOCS,
+            batch_bytes=settings.INDEX_BATCH_BYTES,
+            limitmb=settings.INDEX_WRITER_LIMIT_MB,
+            optimize=settings.INDEX_OPTIMIZE_ON_FINISH,
+            on_commit=committed,
+            lock=self.write_lock,
+            journal=self._journal_paths,
+        )
+
+    def register_folder(self, folder: str):
+        """Hook for layouts that keep indexed folders apart (see ShardedIndexer)."""
+
+    def follow_writer(self):
+        """Read-only: catch up with the schema and spelling dictionary of the writer's latest commit."""
+        self.schema = self.ix.schema
+        self.suggester.refresh()
+
+    # -------------------------------
+    # Rebuild support (see index_rebuild)
+    # -------------------------------
+    def start_journal(self):
+        with self._journal_lock:
+            self._journal = set()
+
+    def take_journal(self) -> set:
+        """Paths committed since the last call; journaling stays on."""
+        with self._journal_lock:
+            paths, self._journal = self._journal or set(), set()
+            return paths
+
+    def stop_journal(self):
+        with self._journal_lock:
+            self._journal = None
+
+    def _journal_paths(self, paths: List[str]):
+        if self._journal is None:
+            return
+        with self._journal_lock:
+            if self._journal is not None:
+                self._journal.update(paths)
+
+    def shadow(self, index_dir: str) -> "WhooshIndexer":
+        """A fresh indexer of the same layout at `index_dir`, for a rebuild to fill."""
+        return type(self)(index_dir)
+
+    def reader(self):
+        return self.ix.reader()
+
+    @contextmanager
+    def frozen_writes(self):
+        """Hold off every in-process writer (between batches) for the duration."""
+        with self.write_lock:
+            yield
+
+    def live_parts(self) -> list:
+        return [(self.searchers, self.ix)]
+
+    def adopt(self, other: "WhooshIndexer") -> list:
+        """
+        Serve and write `other`'s index from now on (call inside
+        frozen_writes). Returns the (SearcherManager, ix) pairs that were
+        live, for the caller to drain and close.
+        """
+        retired = self.live_parts()
+        self.index_dir = other.index_dir
+        self.ix = other.ix
+        self.searchers = other.searchers
+        self.suggester = other.suggester
+        return retired
 
     # ============================================================
     # Incremental indexer with deletion cleanup + watcher support
     # ============================================================
-    def index_folder(self, folder: str, allowed_exts: Optional[List[str]] = None):
+    def index_folder(self, folder: str, allowed_exts: Optional[List[str]] = None,
+                     progress: Optional[IndexProgress] = None) -> dict:
+        """
+        Index new/modified files under `folder` and drop deleted ones.
+
+        All changed files go through a single BulkWriter, and the
+        suggestion dictionary is rebuilt once at the end of the run.
+        Per-file state is written to the state store only after the batch
+        holding the file has been committed. `progress` is updated as the
+        run goes and may cancel it (IndexCancelled propagates after the
+        finished files are committed). Returns run stats (indexed/removed
+        counts, bytes, elapsed seconds, docs/s, MB/s).
+        """
         from config.settings import settings
+        self._check_writable()
         watcher_enabled = settings.ENABLE_WATCHER
 
-        # cache utils
-        try:
-            from utils.storage_helper import read_index_meta, write_index_meta
-        except Exception:
-            read_index_meta = lambda: {}
-            write_index_meta = lambda meta: None
-
         allowed = set([ext.lower() for ext in allowed_exts]) if allowed_exts else set(EXTRACTORS.keys())
 
         p = Path(folder)
         if not p.exists() or not p.is_dir():
-            return 0
+            return self._run_stats(0, 0, 0, 0.0)
+        p = p.resolve()
 
-        cache = read_index_meta() or {}
-        cache_changed = False
+        progress = progress or IndexProgress()
+        started = time.perf_counter()
+        store = get_state_store()
+        known = store.snapshot(str(p))
         count = 0
+        # with the local filename backend the same walk also feeds the filename index
+        local_names = settings.FILENAME_BACKEND == "local"
+        listed = {}
+
+        # state changes wait for the index commit that makes them true
+        pending_rows = []
+        pending_deletes = []
+
+        def flush_state():
+            if pending_rows:
+                store.upsert_many(pending_rows)
+                progress.committed += len(pending_rows)
+                pending_rows.clear()
+            if pending_deletes:
+                store.delete_many(pending_deletes)
+                pending_deletes.clear()
+
+        bulk = self.bulk_writer(on_commit=flush_state)
 
         # -------------------------------------
         # PHASE 1 — Index new and modified files
         # -------------------------------------
-        for file in p.rglob("*"):
-            if not file.is_file():
-                continue
+        scanner = FolderScanner(
+            excludes=parse_excludes(settings.SCAN_EXCLUDE),
+            prune_unchanged_dirs=settings.SCAN_PRUNE_UNCHANGED_DIRS,
+        )
+        # directories holding a file that could not be recorded must be listed again next run
+        dirty_dirs = set()
+
+        def changed_files():
+            entries = scanner.scan(str(p), None if local_names else set(EXTRACTORS.keys()),
+                                   known_files=known.keys(), known_dirs=store.dir_snapshot(str(p)))
+            for entry in entries:
+                if local_names:
+                    listed[entry.path] = (entry.stat.st_size, entry.stat.st_mtime)
+                if entry.ext not in allowed or not EXTRACTORS.get(entry.ext):
+                    continue
+                progress.scanned += 1
+                progress.checkpoint()
 
-            suffix = file.suffix.lower()
-            if suffix not in allowed:
-                continue
+                # skip unchanged (and still-quarantined) files
+                st = entry.stat
+                state = known.get(entry.path)
+                if state and state.mtime_ns == st.st_mtime_ns and state.size == st.st_size:
+                    continue
 
-            try:
-                current_mtime = datetime.fromtimestamp(file.stat().st_mtime).strftime("%Y-%m-%d %H:%M:%S")
-            except Exception:
-                continue
+                progress.changed += 1
+                yield Path(entry.path), (st, state)
+            progress.scan_complete = True
 
-            cached_mtime = cache.get(str(file))
+        # extraction fans out to worker processes; this thread is the only writer
+        try:
+            for result in get_extraction_pool().map(changed_files()):
+                status = self._apply_result(bulk, store, result, pending_rows)
+                progress.extracted += 1
+                progress.bytes = bulk.bytes
+                if status == INDEXED:
+                    count += 1
+                elif status in ("failed", QUARANTINED):
+                    progress.errors += 1
+                    if status == "failed":
+                        dirty_dirs.add(os.path.dirname(str(result.path)))
+                progress.checkpoint()
+
+            # -------------------------------------
+            # PHASE 2 — REMOVE deleted files from index
+            # -------------------------------------
+            removed = 0
+            for del_path in known.keys() - scanner.seen:
+                bulk.delete(del_path)
+                pending_deletes.append(del_path)
+                removed += 1
+                progress.removed = removed
+                print(f"[cleanup] removed missing file: {del_path}")
+
+            bulk.close()
+        except IndexCancelled:
+            # keep what was extracted so far; the next run skips those files
+            bulk.close()
+            if bulk.commits:
+                self.suggester.schedule_rebuild()
+            raise
+        except Exception:
+            bulk.cancel()
+            raise
 
-            # skip unchanged
-            if cached_mtime == current_mtime:
-                continue
+        store.replace_dirs(str(p), {d: m for d, m in scanner.dirs.items() if d not in dirty_dirs})
 
-            extractor = EXTRACTORS.get(suffix)
-            if not extractor:
-                continue
+        if local_names:
+            names = get_filename_index()
+            names.sync_folder(str(p), listed, scanner.dirs.keys(), scanner.pruned_dirs)
+            names.save()
 
-            content = None
-            try:
-                content = extractor(file)
-            except Exception:
-                pass
+        if bulk.commits:
+            self.suggester.schedule_rebuild()
 
-            if content:
-                self.add_or_update(file, content)
-                cache[str(file)] = current_mtime
-                cache_changed = True
-                count += 1
-
-        # -------------------------------------
-        # PHASE 2 — REMOVE deleted files from index
-        # -------------------------------------
-        actual_files = {str(f.resolve()) for f in p.rglob("*") if f.is_file()}
-        cached_files = set(cache.keys())
-
-        deleted_files = cached_files - actual_files
-        if deleted_files:
-            writer = self.ix.writer()
-            for del_path in deleted_files:
-                try:
-                    writer.delete_by_term("path", del_path)
-                    cache.pop(del_path, None)
-                    print(f"[cleanup] removed missing file: {del_path}")
-                except Exception as e:
-                    print(f"[cleanup] failed to remove {del_path}: {e}")
-            writer.commit()
-            cache_changed = True
-
-        if cache_changed:
-            write_index_meta(cache)
+        stats = self._run_stats(count, removed, bulk.bytes, time.perf_counter() - started)
+        stats["commits"] = bulk.commits
+        stats["pruned_dirs"] = scanner.pruned
+        print(f"[index] {folder}: {count} docs, {stats['docs_per_sec']} docs/s, {stats['mb_per_sec']} MB/s")
 
         # -------------------------------------
         # PHASE 3 — Start watcher if enabled
         # -------------------------------------
-        if watcher_enabled and not WhooshIndexer._watcher_started:
-            WhooshIndexer._watcher_started = True
-            print(f"[watcher] ENABLE_WATCHER=true → watching {folder}")
-            start_watcher(self, folder)
-        elif not watcher_enabled:
+        if watcher_enabled:
+            self.start_watching(str(p))
+        else:
             print("[watcher] ENABLE_WATCHER=false → watcher disabled")
 
-        return count
+        return stats
+
+    def start_watching(self, folder: str):
+        """Add `folder` to this process's watcher unless it already covers it."""
+        self._check_writable()
+        folder = os.path.abspath(folder)
+        with WhooshIndexer._watch_lock:
+            if any(folder == w or folder.startswith(w.rstrip(os.sep) + os.sep) for w in WhooshIndexer._watched):
+                return
+            WhooshIndexer._watched.add(folder)
+            print(f"[watcher] ENABLE_WATCHER=true → watching {folder}")
+            WhooshIndexer._observer = start_watcher(self, folder, WhooshIndexer._observer)
+
+    @staticmethod
+    def _run_stats(indexed: int, removed: int, nbytes: int, elapsed: float) -> dict:
+        secs = max(elapsed, 1e-6)
+        return {
+            "indexed": indexed,
+            "removed": removed,
+            "bytes": nbytes,
+            "seconds": round(elapsed, 3),
+            "docs_per_sec": round(indexed / secs, 2),
+            "mb_per_sec": round(nbytes / (1024 * 1024) / secs, 2),
+        }
 
     # -------------------------------
     # Search API
@@ -289,118 +808,124 @@ class WhooshIndexer:
     def _strip_html(self, text):
         return re.sub(r"<[^>]+>", "", text)
 
-    def _format_snippet(self, hit, field="content"):
+    def _format_snippet(self, hit, field="content", terms: Optional[SnippetTerms] = None):
+        if not hit.searcher.schema[field].stored:
+            return offsets_snippet(hit, terms.for_hit(hit) if terms else [], field)
         raw = hit.highlights(field, top=5) or ""
         if not raw:
-            txt = hit.get(field, "")[:200]
-            cleaned = txt.replace("\n", " ").strip()
+            # collapse newlines and the page breaks of paged documents
+            cleaned = " ".join(hit.get(field, "")[:200].split())
             return cleaned + "..." if cleaned else ""
 
         cleaned = " ".join(raw.replace("\n", " ").split())
         return self._strip_html(cleaned)
 
-    def _post_filter(self, docs, date_from=None, date_to=None,
-                     size_from_b=None, size_to_b=None,
-                     case_sensitive=False, whole_word=False,
-                     file_types=None):
-
-        results = []
-        for h in docs:
-            try:
-                modified = h.get("modified")
-                size_b = h.get("size_kb") and int(h.get("size_kb") * 1024)
-                ftype = h.get("filetype")
-            except Exception:
-                continue
-
-            # date filter
-            if date_from or date_to:
-                try:
-                    mod_dt = datetime.strptime(modified, "%Y-%m-%d %H:%M:%S")
-                except:
-                    continue
-                if date_from and mod_dt < date_from:
-                    continue
-                if date_to and mod_dt > date_to:
-                    continue
-
-            # size filter
-            if size_from_b and (size_b is None or size_b < size_from_b):
-                continue
-            if size_to_b and (size_b is None or size_b > size_to_b):
-                continue
-
-            # type filter
-            if file_types and file_types != ["all"]:
-                if ftype.lower() not in [ft.lower() for ft in file_types]:
-                    continue
-
-            results.append(h)
-
-        return results
+    def _build_filter(self, date_from=None, date_to=None,
+                      size_from_b=None, size_to_b=None,
+                      file_types=None):
+        """
+        Date/size/type constraints as a Whoosh filter query, so the
+        searcher only scores matching documents and `limit` applies to
+        the filtered result set.
+        """
+        parts = []
+
+        if date_from or date_to:
+            parts.append(DateRange("modified_at", date_from, date_to))
+
+        if size_from_b is not None or size_to_b is not None:
+            parts.append(NumericRange("size_bytes", size_from_b, size_to_b))
+
+        if file_types and file_types != ["all"]:
+            types = [ft.lower().lstrip(".") for ft in file_types]
+            parts.append(Or([Term("filetype", t) for t in types]))
+
+        if not parts:
+            return None
+        return parts[0] if len(parts) == 1 else And(parts)
+
+    def did_you_mean(self, text: str) -> Optional[str]:
+        """Spelling-corrected `text`, or None when every word is a known term."""
+        return self.suggester.did_you_mean(text)
+
+    def _hit_doc(self, h, scored: bool = True, terms: Optional[SnippetTerms] = None) -> dict:
+        """
+        `scored` is off for sorted searches, where Whoosh puts the sort key
+        in `h.score`. `terms` are the query's terms, for snippets made from
+        token offsets.
+        """
+        return {
+            "path": h.get("path"),
+            "filename": h.get("filename"),
+            "filetype": h.get("filetype"),
+            "modified": h.get("modified"),
+            "size_kb": int(h.get("size_bytes") / 1024) if h.get("size_bytes") else None,
+            "score": float(h.score) if scored and h.score is not None else None,
+            "snippet": self._format_snippet(h, terms=terms),
+        }
+
+    @contextmanager
+    def _ranked(self, q, filter_q, offset: int, limit: int,
+                sortedby: Optional[str] = None, reverse: bool = False,
+                collapse: Optional[str] = None, collapse_limit: int = 1):
+        """Hits `offset` .. `offset + limit` of `q`; usable while the context is open."""
+        with self.searchers.searcher() as searcher:
+            # hits before `offset` are still ranked, but only the page is formatted/highlighted
+            hits = searcher.search(q, limit=offset + limit, filter=filter_q,
+                                   sortedby=sort_facet(self.schema, sortedby, reverse) if sortedby else None,
+                                   collapse=collapse, collapse_limit=collapse_limit)
+            yield hits[offset:]
+
+    def _result_docs(self, q, filter_q, offset: int, limit: int,
+                     sortedby: Optional[str] = None, reverse: bool = False) -> List[dict]:
+        terms = SnippetTerms(q)
+        if not is_passage_schema(self.schema):
+            with self._ranked(q, filter_q, offset, limit, sortedby, reverse) as hits:
+                return [self._hit_doc(h, scored=sortedby is None, terms=terms) for h in hits]
+
+        # Passage-level index: at most PAGES_PER_HIT passages per file are
+        # kept, so the first (offset + limit) * PAGES_PER_HIT hits hold the
+        # best passage of the first offset + limit files, in rank order.
+        n = (offset + limit) * PAGES_PER_HIT
+        with self._ranked(q, filter_q, 0, n, sortedby, reverse,
+                          collapse="path", collapse_limit=PAGES_PER_HIT) as hits:
+            by_file = {}
+            for h in hits:
+                by_file.setdefault(h.get("path"), []).append(h)
+            docs = []
+            for passages in list(by_file.values())[offset:offset + limit]:
+                doc = self._hit_doc(passages[0], scored=sortedby is None, terms=terms)
+                paged = Path(doc["path"] or "").suffix.lower() in PAGED_TYPES
+                doc["page"] = passages[0].get("page") if paged else None
+                doc["pages"] = sorted(p.get("page") for p in passages) if paged else None
+                docs.append(doc)
+            return docs
 
     def search(self, query: str, limit: int = 50,
                date_from=None, date_to=None,
                size_from_b=None, size_to_b=None,
                case_sensitive=False, whole_word=False,
-               file_types=None):
+               file_types=None, offset: int = 0,
+               sortedby: Optional[str] = None, reverse: bool = False):
 
-        with self.ix.searcher() as searcher:
-            parser = MultifieldParser(["content"], schema=self.ix.schema)
-            q = parser.parse(query)
-            hits = searcher.search(q, limit=limit)
+        filter_q = self._build_filter(date_from=date_from, date_to=date_to,
+                                      size_from_b=size_from_b, size_to_b=size_to_b,
+                                      file_types=file_types)
 
-            docs = []
-            for h in hits:
-                docs.append({
-                    "path": h.get("path"),
-                    "filename": h.get("filename"),
-                    "filetype": h.get("filetype"),
-                    "modified": h.get("modified"),
-                    "size_kb": int(h.get("size_bytes") / 1024) if h.get("size_bytes") else None,
-                    "score": float(h.score),
-                    "snippet": self._format_snippet(h),
-                })
-
-            # Spell correction when no result
-            if not docs and self.spell:
-                suggestions = []
-                for term in query.split():
-                    try:
-                        s = self.spell.suggest(term)
-                        if s:
-                            suggestions.append(s[0])
-                    except:
-                        pass
-
-                if suggestions:
-                    sug_q = " | ".join([f'"{s}"' for s in suggestions])
-                    try:
-                        sq = parser.parse(sug_q)
-                        sh = searcher.search(sq, limit=limit)
-                        for h in sh:
-                            docs.append({
-                                "path": h.get("path"),
-                                "filename": h.get("filename"),
-                                "filetype": h.get("filetype"),
-                                "modified": h.get("modified"),
-                                "size_kb": int(h.get("size_bytes") / 1024),
-                                "score": float(h.score),
-                                "snippet": self._format_snippet(h),
-                            })
-                    except:
-                        pass
-
-            filtered = self._post_filter(
-                docs,
-                date_from=date_from,
-                date_to=date_to,
-                size_from_b=size_from_b,
-                size_to_b=size_to_b,
-                case_sensitive=case_sensitive,
-                whole_word=whole_word,
-                file_types=file_types,
-            )
+        parser = MultifieldParser(["content"], schema=self.schema)
+        q = parser.parse(query)
+        docs = self._result_docs(q, filter_q, offset, limit, sortedby, reverse)
+
+        # Spell correction when no result
+        if not docs and not offset:
+            suggestions = [s for s in map(self.suggester.suggest_word, query.split()) if s]
+
+            if suggestions:
+                sug_q = " | ".join([f'"{s}"' for s in suggestions])
+                try:
+                    sq = parser.parse(sug_q)
+                    docs = self._result_docs(sq, filter_q, 0, limit)
+                except:
+                    pass
 
-            return filtered
-            
+        return docs
@@ -0,0 +1,92 @@
+"""
+Election of the one process that writes the index.
+
+With `uvicorn --workers N` every worker opens the same index. The first
+one to take an exclusive, non-blocking OS lock on `<index>.writer.lock`
+becomes the writer. It runs the indexing jobs, the watcher and rebuilds,
+and makes every commit. The other workers serve searches read-only and
+retry the lock now and then (see index_manager). The OS drops the lock
+when its holder exits or dies, so a reader takes over without a lease
+timeout to wait out.
+
+The holder's pid, host and start time are written next to the lock file,
+for /api/index-metrics and for the readers' log line.
+"""
+import os
+import json
+import time
+import socket
+import threading
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+
+class WriterLease:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.info_path = self.path.with_name(self.path.name + ".json")
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """Take the lock unless another process holds it. True if this process holds it now."""
+        with self._lock:
+            if self._fd is not None:
+                return True
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            except OSError:
+                os.close(fd)
+                return False
+            self._fd = fd
+            self._write_info()
+            return True
+
+    def _write_info(self):
+        info = {"pid": os.getpid(), "host": socket.gethostname(), "since": time.time()}
+        tmp = self.info_path.with_name(self.info_path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps(info), encoding="utf-8")
+            os.replace(tmp, self.info_path)
+        except OSError as e:
+            print(f"[writer] cannot record the writer in {self.info_path}: {e}")
+
+    def holder(self) -> Optional[dict]:
+        """pid/host/since of the process that last took the lock (it may have exited since)."""
+        try:
+            return json.loads(self.info_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def describe_holder(self) -> str:
+        info = self.holder()
+        return f"pid {info['pid']} on {info['host']}" if info else "another process"
+
+    def release(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            fd, self._fd = self._fd, None
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(fd)